@@ -0,0 +1,95 @@
+import math
+import numpy as np
+
+# Only NumPy is imported here, so scoring stays cheap to load anywhere (the server, a worker)
+
+# --- Config ---
+MODEL_FILE = "models/amd_classifier.npz"
+FEATURES = [
+    "initial_silence_sec", "first_utterance_sec", "speech_alternations",
+    "mean_amp", "zcr", "duration_sec",
+]
+LABELS = ("human", "machine")
+
+class AmdClassifier:
+    """
+    Logistic regression on standardized recording features, scoring P(machine).
+
+    The model is a handful of floats: feature names, means, scales, weights, bias and the
+    decision threshold, stored in a small .npz file.
+    """
+
+    def __init__(self, features, mean, scale, weights, bias, threshold=0.5):
+        self.features = list(features)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.bias = float(bias)
+        self.threshold = float(threshold)
+        # Standardization folded into the weights: one dot product per recording
+        self._w = self.weights / self.scale
+        self._b = self.bias - float(np.dot(self._w, self.mean))
+        self._w_list = self._w.tolist()
+
+    @classmethod
+    def load(cls, path=MODEL_FILE):
+        with np.load(path, allow_pickle=False) as model:
+            return cls(model["features"].tolist(), model["mean"], model["scale"], model["weights"],
+                       model["bias"], model["threshold"])
+
+    def save(self, path=MODEL_FILE):
+        np.savez(path, features=np.array(self.features), mean=self.mean, scale=self.scale,
+                 weights=self.weights, bias=self.bias, threshold=self.threshold)
+
+    def matrix(self, rows):
+        """(n, k) float array of the model features from a DataFrame, a list of dicts or an array."""
+        if hasattr(rows, "columns"):
+            return rows[self.features].to_numpy(dtype=np.float64)
+        if isinstance(rows, np.ndarray):
+            return rows.astype(np.float64, copy=False)
+        return np.array([[row[f] for f in self.features] for row in rows], dtype=np.float64)
+
+    def predict_proba(self, rows):
+        """P(machine) for every row, vectorized."""
+        z = self.matrix(rows) @ self._w + self._b
+        return 1.0 / (1.0 + np.exp(-np.clip(z, -500, 500)))
+
+    def predict(self, rows):
+        return np.where(self.predict_proba(rows) >= self.threshold, LABELS[1], LABELS[0])
+
+    def predict_one(self, features):
+        """(label, P(machine)) for one feature dict, without building arrays."""
+        z = self._b
+        for weight, name in zip(self._w_list, self.features):
+            z += weight * features[name]
+        z = min(max(z, -500.0), 500.0)
+        p = 1.0 / (1.0 + math.exp(-z))
+        return (LABELS[1] if p >= self.threshold else LABELS[0]), p
+
+def fit_logistic(X, y, l2=1.0, iterations=50, tol=1e-8):
+    """
+    L2-regularized logistic regression by Newton's method (IRLS) on standardized X.
+    Returns (mean, scale, weights, bias).
+    """
+    X = np.asarray(X, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    mean = X.mean(axis=0)
+    scale = X.std(axis=0)
+    scale[scale == 0] = 1.0
+    Z = np.column_stack(((X - mean) / scale, np.ones(len(X))))
+    theta = np.zeros(Z.shape[1])
+    penalty = np.full(Z.shape[1], l2)
+    penalty[-1] = 0.0                  # the bias is not regularized
+    for _ in range(iterations):
+        p = 1.0 / (1.0 + np.exp(-np.clip(Z @ theta, -500, 500)))
+        gradient = Z.T @ (p - y) + penalty * theta
+        hessian = (Z * (p * (1 - p))[:, None]).T @ Z + np.diag(penalty) + 1e-9 * np.eye(Z.shape[1])
+        step = np.linalg.solve(hessian, gradient)
+        theta -= step
+        if np.abs(step).max() < tol:
+            break
+    return mean, scale, theta[:-1], theta[-1]
+
+def train(X, y, features, l2=1.0, threshold=0.5):
+    mean, scale, weights, bias = fit_logistic(X, y, l2)
+    return AmdClassifier(features, mean, scale, weights, bias, threshold)
@@ -0,0 +1,186 @@
+import os
+import json
+import argparse
+import itertools
+import numpy as np
+
+from channel_visualization import find_segments
+from wav_io import WavReader
+
+# --- Config ---
+CONFIG_FILE = "amd_config.json"
+REPORTS_DIR = "reports"
+SIMULATION_CSV = os.path.join(REPORTS_DIR, "amd_simulation.csv")
+SWEEP_CSV = os.path.join(REPORTS_DIR, "amd_sweep.csv")
+
+PARAMS = [
+    "MachineDetectionSpeechThreshold",
+    "MachineDetectionSpeechEndThreshold",
+    "MachineDetectionSilenceTimeout",
+    "MachineDetectionTimeout",
+]
+
+# Valid ranges from the Twilio AMD documentation (ms, except the timeout in seconds)
+DEFAULT_GRID = {
+    "MachineDetectionSpeechThreshold": "1000:6000:200",
+    "MachineDetectionSpeechEndThreshold": "500:5000:250",
+    "MachineDetectionSilenceTimeout": "2000:10000:1000",
+    "MachineDetectionTimeout": "30",
+}
+
+ANSWERED_BY = np.array([
+    "human", "machine_start", "machine_end_silence", "machine_end_other", "unknown"
+])
+HUMAN, MACHINE_START, MACHINE_END_SILENCE, MACHINE_END_OTHER, UNKNOWN = range(len(ANSWERED_BY))
+
+# --- Segments ---
+def load_segments(filepath, threshold=0.03):
+    """Speech intervals (seconds) and duration of one recording, as used by analyze_and_plot."""
+    audio = WavReader(filepath)
+    segments = find_segments(audio.samples(), audio.sample_rate, threshold)
+    return segments["speech"], segments["duration"]
+
+def load_corpus(input_dir, threshold=0.03):
+    wav_files = sorted(f for f in os.listdir(input_dir) if f.lower().endswith(".wav"))
+    corpus = []
+    for wav in wav_files:
+        speech, duration = load_segments(os.path.join(input_dir, wav), threshold)
+        corpus.append((os.path.splitext(wav)[0], speech, duration))
+    return corpus
+
+# --- AMD timing rules ---
+def simulate_grid(speech, speech_threshold, speech_end_threshold, silence_timeout, timeout,
+                  detect_message_end=True):
+    """
+    Apply the AMD timing rules to one recording for every parameter combination at once.
+
+    speech is an (n, 2) array of speech intervals in seconds; the four parameter arrays
+    must broadcast together and use the units of amd_config.json (ms, timeout in seconds).
+    The recording is assumed to start when the call is answered and to be followed by silence.
+    Returns (answered_by codes, decision times in seconds).
+    """
+    S, E, Q, T = np.broadcast_arrays(
+        np.asarray(speech_threshold, dtype=np.float64) / 1000,
+        np.asarray(speech_end_threshold, dtype=np.float64) / 1000,
+        np.asarray(silence_timeout, dtype=np.float64) / 1000,
+        np.asarray(timeout, dtype=np.float64),
+    )
+    codes = np.full(S.shape, UNKNOWN, dtype=np.int8)
+    times = np.minimum(Q, T).astype(np.float64)
+    if len(speech) == 0:
+        return codes, times
+
+    first_start = speech[0, 0]
+    # Silence after each speech interval; the last one never ends
+    gaps = np.append(speech[1:, 0] - speech[:-1, 1], np.inf)
+    # The first utterance ends at the first gap long enough to satisfy SpeechEndThreshold
+    end_idx = np.argmax(gaps >= E[..., None], axis=-1)
+    utterance_end = speech[end_idx, 1]
+    utterance_len = utterance_end - first_start
+
+    is_machine = utterance_len >= S
+    codes = np.where(is_machine, MACHINE_START, HUMAN).astype(np.int8)
+    times = utterance_end + E
+    if detect_message_end:
+        codes[is_machine] = MACHINE_END_SILENCE
+    else:
+        times = np.where(is_machine, first_start + S, times)
+
+    # MachineDetectionTimeout: machines already detected report machine_end_other
+    timed_out = times > T
+    if detect_message_end:
+        detected = is_machine & (first_start + S <= T)
+        codes[timed_out & detected] = MACHINE_END_OTHER
+        codes[timed_out & ~detected] = UNKNOWN
+    else:
+        codes[timed_out] = UNKNOWN
+    times = np.where(timed_out, T, times)
+
+    # MachineDetectionSilenceTimeout: no speech at all within the initial silence window
+    silent = first_start >= Q
+    codes[silent] = UNKNOWN
+    times = np.where(silent, np.minimum(Q, T), times)
+    return codes, times
+
+def simulate(speech, config):
+    """Predicted AnsweredBy and decision time for a single amd_config.json."""
+    code, t = simulate_grid(
+        speech,
+        config.get("MachineDetectionSpeechThreshold", 2400),
+        config.get("MachineDetectionSpeechEndThreshold", 1200),
+        config.get("MachineDetectionSilenceTimeout", 5000),
+        config.get("MachineDetectionTimeout", 30),
+        detect_message_end=config.get("MachineDetection") == "DetectMessageEnd",
+    )
+    return {"AnsweredBy": ANSWERED_BY[code].item(), "decision_time": float(t)}
+
+# --- Parameter sweep ---
+def parse_range(spec):
+    """'start:stop:step' (inclusive) or a comma separated list of values."""
+    if ":" in spec:
+        start, stop, step = (float(v) for v in spec.split(":"))
+        return np.arange(start, stop + step / 2, step)
+    return np.array([float(v) for v in spec.split(",")])
+
+def build_grid(specs):
+    axes = [parse_range(specs[p]) for p in PARAMS]
+    return np.array(list(itertools.product(*axes)))
+
+def sweep(corpus, grid, detect_message_end=True):
+    """Simulate every recording against every row of grid; returns (codes, times) of shape (files, combos)."""
+    codes = np.empty((len(corpus), len(grid)), dtype=np.int8)
+    times = np.empty((len(corpus), len(grid)), dtype=np.float32)
+    for i, (_, speech, _) in enumerate(corpus):
+        codes[i], times[i] = simulate_grid(speech, *grid.T, detect_message_end=detect_message_end)
+    return codes, times
+
+def summarize_sweep(grid, codes, times):
+    import pandas as pd
+    summary = pd.DataFrame(grid, columns=PARAMS)
+    for code, name in enumerate(ANSWERED_BY):
+        summary[name] = (codes == code).sum(axis=0)
+    summary["mean_decision_time"] = times.mean(axis=0)
+    summary["p90_decision_time"] = np.percentile(times, 90, axis=0)
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline AMD simulator over local recordings")
+    parser.add_argument("--input_dir", required=False, default="channel_audio/left", help="Name of input folder with the recordings to analyze")
+    parser.add_argument("--config", required=False, default=CONFIG_FILE, help="AMD configuration to simulate")
+    parser.add_argument("--threshold", required=False, type=float, default=0.03)
+    parser.add_argument("--sweep", action="store_true", help="Sweep a parameter grid instead of the single configuration")
+    for param in PARAMS:
+        parser.add_argument(f"--{param}", required=False, default=DEFAULT_GRID[param],
+                            help="Sweep values as start:stop:step or a comma separated list")
+    parser.add_argument("--top", required=False, type=int, default=20, help="Number of sweep rows to print")
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        config = json.load(f)
+    detect_message_end = config.get("MachineDetection") == "DetectMessageEnd"
+    os.makedirs(REPORTS_DIR, exist_ok=True)
+
+    corpus = load_corpus(args.input_dir, args.threshold)
+    print(f"Loaded segments for {len(corpus)} recordings from {args.input_dir}/")
+
+    if not args.sweep:
+        rows = []
+        for name, speech, duration in corpus:
+            result = simulate(speech, config)
+            rows.append({"recording": name, "duration_sec": duration, **result})
+            print(f"{name}: {result['AnsweredBy']} at {result['decision_time']:.2f}s")
+        import pandas as pd
+        pd.DataFrame(rows).to_csv(SIMULATION_CSV, index=False)
+        print(f"Saved simulation to {SIMULATION_CSV}")
+        return
+
+    grid = build_grid({p: getattr(args, p) for p in PARAMS})
+    codes, times = sweep(corpus, grid, detect_message_end)
+    summary = summarize_sweep(grid, codes, times)
+    summary.to_csv(SWEEP_CSV, index=False)
+    print(f"Simulated {len(grid)} configurations x {len(corpus)} recordings")
+    print(summary.sort_values("mean_decision_time").head(args.top).to_string(index=False))
+    print(f"Saved sweep to {SWEEP_CSV}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import sys
+import argparse
+import importlib
+
+# Subcommand -> (module, description). A module is imported only when its subcommand runs,
+# so `amdkit.py split` never pays for Flask and `amdkit.py serve` never pays for matplotlib.
+COMMANDS = {
+    "split": ("split_audio_channels", "Split the stereo call recordings into left/right channel files"),
+    "features": ("feature_engine", "Extract per-recording audio features into the Parquet dataset"),
+    "render": ("channel_visualization", "Render waveform plots of the channel recordings"),
+    "serve": ("server", "Run the webhook server and place the batch of test calls"),
+    "call": ("automated_amd_call", "Place a single AMD test call"),
+    "analyze": ("results_analytics", "Update the call analytics and write the reports"),
+    "simulate": ("amd_simulator", "Run the offline AMD simulator over the recordings"),
+    "cache": ("recording_cache", "Fetch, verify or evict the downloaded recordings"),
+    "experiment": ("experiment_scheduler", "Create an AMD experiment or show its progress"),
+    "train": ("train_classifier", "Train the human/machine classifier"),
+    "pipeline": ("pipeline", "Rebuild the stale split, segment, feature and plot artifacts"),
+    "greetings": ("greeting_fingerprint", "Fingerprint the greetings and write a deduplicated test list"),
+    "overlap": ("overlap_analysis", "Measure overlap and talk-over between the two channels of every call"),
+}
+
+def run(command, args):
+    """Import the module of `command` and run its main() with `args` as its command line."""
+    module_name = COMMANDS[command][0]
+    module = importlib.import_module(module_name)
+    sys.argv = [f"amdkit.py {command}"] + list(args)
+    return module.main()
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Twilio AMD toolkit: one entry point for the scripts of this repository",
+        epilog="Run `amdkit.py <command> --help` for the options of a command.")
+    subparsers = parser.add_subparsers(dest="command", metavar="command")
+    for name, (module_name, help_text) in COMMANDS.items():
+        subparsers.add_parser(name, help=f"{help_text} ({module_name}.py)", add_help=False)
+    args, rest = parser.parse_known_args()
+    if not args.command:
+        parser.print_help()
+        return 1
+    return run(args.command, rest)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,55 +1,41 @@
-import os
 import pandas as pd
-import numpy as np
-import librosa
-import requests
+
+import segmentation
+from wav_io import WavReader
+from recording_cache import RecordingCache, recording_key
+from results_analytics import load_ground_truth
 
 # CONFIG
 CSV_FILE = "recording_urls.csv"
 AUDIO_COL = "Audio"
-OUTPUT_DIR = "downloads"
 FEATURES_OUT = "machine_features.csv"
 
-os.makedirs(OUTPUT_DIR, exist_ok=True)
-
-def download_wav(url, output_path):
-    if os.path.exists(output_path):
-        return
-    r = requests.get(url)
-    with open(output_path, "wb") as f:
-        f.write(r.content)
-
 def extract_features(file_path):
-    y, sr = librosa.load(file_path, sr=None)
-    y = y / np.max(np.abs(y))
-    abs_y = np.abs(y)
+    audio = WavReader(file_path)
+    y, sr = audio.samples(), audio.sample_rate
+    # Peak, mean amplitude and zero crossings in one chunked pass, without a normalized copy of y
+    stats = audio.stats()
+    peak = stats["peak"]
     threshold = 0.03
 
+    # Speech segments, threshold relative to the peak amplitude
+    speech = segmentation.segment(y, sr, threshold=threshold)
+
     # Initial silence
-    first_voice_idx = np.argmax(abs_y > threshold)
-    initial_silence = first_voice_idx / sr
+    initial_silence = speech[0, 0] if len(speech) else 0.0
 
     # Speech/silence alternations
-    voiced = abs_y > threshold
-    changes = np.diff(voiced.astype(int))
-    starts = np.where(changes == 1)[0]
-    ends = np.where(changes == -1)[0]
-    speech_alternations = min(len(starts), len(ends))
+    speech_alternations = len(speech)
 
     # First utterance length
-    if len(starts) > 0 and len(ends) > 0:
-        utterance_start = starts[0]
-        utterance_end = ends[ends > utterance_start][0] if np.any(ends > utterance_start) else len(y)
-        first_utterance_len = (utterance_end - utterance_start) / sr
-    else:
-        first_utterance_len = 0.0
+    first_utterance_len = speech[0, 1] - speech[0, 0] if len(speech) else 0.0
 
-    # Mean/max amplitude
-    mean_amp = np.mean(abs_y)
-    max_amp = np.max(abs_y)
+    # Mean/max amplitude of the peak-normalized signal
+    mean_amp = stats["mean_abs"] / peak if peak else 0.0
+    max_amp = 1.0 if peak else 0.0
 
-    # Zero crossing rate
-    zcr = np.mean(librosa.feature.zero_crossing_rate(y)[0])
+    # Zero crossing rate (not affected by normalization)
+    zcr = stats["zcr"]
 
     duration = len(y) / sr
 
@@ -65,17 +51,21 @@ def extract_features(file_path):
 
 def main():
     df = pd.read_csv(CSV_FILE)
+    urls = [str(url) for url in df[AUDIO_COL]]
+    paths = RecordingCache().fetch_all(urls)
+    # Labels come from the ground truth file; recordings without one are left unlabelled
+    labels = load_ground_truth()
+
     features = []
-    for idx, row in df.iterrows():
-        url = row[AUDIO_COL]
-        filename = os.path.basename(url.split("?")[0])
-        local_path = os.path.join(OUTPUT_DIR, filename)
-        print(f"Downloading {url} ...")
-        download_wav(url, local_path)
+    for url in dict.fromkeys(urls):
+        if url not in paths:
+            continue
+        filename = recording_key(url) + ".wav"
+        local_path = paths[url]
         print(f"Extracting features for {filename} ...")
         feats = extract_features(local_path)
         feats['filename'] = filename
-        feats['label'] = "machine"
+        feats['label'] = labels.get(recording_key(url))
         features.append(feats)
     pd.DataFrame(features).to_csv(FEATURES_OUT, index=False)
     print(f"Saved features to {FEATURES_OUT}")
@@ -0,0 +1,165 @@
+import os
+import time
+import hashlib
+import argparse
+import threading
+import concurrent.futures
+from collections import OrderedDict
+
+from wav_io import WAVE_FORMAT_MULAW, WavReader, wav_header, ulaw_encode
+
+# --- Config ---
+ULAW_DIR = "ulaw_audio"               # transcoded copies, one sub-folder per source folder
+ULAW_RATE = 8000                      # what Twilio plays on the call anyway
+CACHE_BYTES = 256 * 1024 * 1024       # hot files kept in memory
+FILE_LOCKS = 64                       # transcodes of recordings hashing to different locks run in parallel
+
+def ulaw_dir_for(audio_dir, root=ULAW_DIR):
+    """ulaw_audio/left for channel_audio/left."""
+    return os.path.join(root, os.path.basename(os.path.normpath(audio_dir)))
+
+def is_up_to_date(src, dst):
+    return os.path.exists(dst) and os.path.getmtime(dst) >= os.path.getmtime(src)
+
+def transcode_ulaw(src, dst):
+    """Mono 8 kHz mu-law copy of a recording, written under a temporary name and renamed."""
+    audio = WavReader(src)
+    if audio.sample_rate == ULAW_RATE:
+        y = audio.float32()
+    else:
+        import librosa
+        y, _ = librosa.load(src, sr=ULAW_RATE, mono=True)
+    data = ulaw_encode(y).tobytes()
+    tmp_path = dst + ".part"
+    with open(tmp_path, "wb") as f:
+        f.write(wav_header(WAVE_FORMAT_MULAW, 1, ULAW_RATE, 8, len(data)))
+        f.write(data)
+        if len(data) % 2:
+            f.write(b"\0")
+    os.replace(tmp_path, dst)
+    return dst
+
+def _transcode_job(paths):
+    src, dst = paths
+    try:
+        if not is_up_to_date(src, dst):
+            transcode_ulaw(src, dst)
+        return None
+    except Exception as e:
+        return f"{src}: {e}"
+
+class AudioEntry:
+    __slots__ = ("data", "etag", "last_modified", "path")
+
+    def __init__(self, data, etag, last_modified, path):
+        self.data = data
+        self.etag = etag
+        self.last_modified = last_modified
+        self.path = path
+
+class AudioLibrary:
+    """
+    Recordings of one folder as served to Twilio's <Play>.
+
+    Each recording is transcoded once to 8 kHz mu-law (about 1/4 of 16 kHz PCM, 1/8 of stereo),
+    on demand or for the whole folder up front, and the hottest files are kept in memory in an
+    LRU bounded to `cache_bytes`. The ETag is derived from the served bytes.
+    """
+
+    def __init__(self, audio_dir, transcode=True, cache_bytes=CACHE_BYTES, ulaw_root=ULAW_DIR):
+        self.audio_dir = audio_dir
+        self.transcode = transcode
+        self.ulaw_dir = ulaw_dir_for(audio_dir, ulaw_root)
+        self.cache_bytes = cache_bytes
+        self.cache = OrderedDict()            # recording -> AudioEntry
+        self.cached_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.file_locks = [threading.Lock() for _ in range(FILE_LOCKS)]
+        if transcode:
+            os.makedirs(self.ulaw_dir, exist_ok=True)
+
+    def source_path(self, recording):
+        # Only plain file names, never a path out of the audio folder
+        if not recording or os.path.basename(recording) != recording:
+            return None
+        path = os.path.join(self.audio_dir, f"{recording}.wav")
+        return path if os.path.isfile(path) else None
+
+    def served_path(self, recording):
+        src = self.source_path(recording)
+        if src is None or not self.transcode:
+            return src
+        dst = os.path.join(self.ulaw_dir, f"{recording}.wav")
+        if not is_up_to_date(src, dst):
+            # Concurrent fetches of the same recording transcode it once
+            with self.file_locks[hash(recording) % len(self.file_locks)]:
+                if not is_up_to_date(src, dst):
+                    transcode_ulaw(src, dst)
+        return dst
+
+    def get(self, recording):
+        """(AudioEntry or None if there is no such recording, cache hit)."""
+        with self.lock:
+            entry = self.cache.get(recording)
+            if entry is not None:
+                self.cache.move_to_end(recording)
+        if entry is not None:
+            # A recording replaced on disk invalidates its cached copy
+            src = self.source_path(recording)
+            if src and os.path.getmtime(src) <= entry.last_modified:
+                with self.lock:
+                    self.hits += 1
+                return entry, True
+            self._evict(recording)
+
+        path = self.served_path(recording)
+        if path is None:
+            return None, False
+        with open(path, "rb") as f:
+            data = f.read()
+        entry = AudioEntry(data, hashlib.blake2b(data, digest_size=16).hexdigest(), os.path.getmtime(path), path)
+        with self.lock:
+            self.misses += 1
+            if len(data) <= self.cache_bytes:
+                if recording in self.cache:
+                    self.cached_bytes -= len(self.cache.pop(recording).data)
+                self.cache[recording] = entry
+                self.cached_bytes += len(data)
+                while self.cached_bytes > self.cache_bytes:
+                    _, old = self.cache.popitem(last=False)
+                    self.cached_bytes -= len(old.data)
+        return entry, False
+
+    def _evict(self, recording):
+        with self.lock:
+            entry = self.cache.pop(recording, None)
+            if entry is not None:
+                self.cached_bytes -= len(entry.data)
+
+    def transcode_all(self, workers=None):
+        """Transcode every recording of the folder that has no up-to-date mu-law copy."""
+        if not self.transcode:
+            return
+        jobs = [
+            (os.path.join(self.audio_dir, f), os.path.join(self.ulaw_dir, f))
+            for f in sorted(os.listdir(self.audio_dir)) if f.lower().endswith(".wav")
+        ]
+        todo = [job for job in jobs if not is_up_to_date(*job)]
+        start = time.perf_counter()
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            for error in executor.map(_transcode_job, todo, chunksize=8):
+                if error:
+                    print(f"[ERROR] {error}")
+        print(f"[OK] {len(jobs)} recordings in {self.ulaw_dir}/, {len(todo)} transcoded in {time.perf_counter() - start:.1f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Transcode recordings to the 8 kHz mu-law copies served by server.py")
+    parser.add_argument("--audio_dir", required=False, default="channel_audio/left", help="Name of input folder with the recordings to transcode")
+    parser.add_argument("--workers", required=False, type=int, default=None, help="Number of worker processes (default: one per CPU)")
+    args = parser.parse_args()
+    AudioLibrary(args.audio_dir).transcode_all(args.workers)
+
+if __name__ == "__main__":
+    main()
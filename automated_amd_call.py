@@ -1,6 +1,7 @@
 import os
 import json
-from twilio.rest import Client
+import argparse
+from urllib.parse import urlparse
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -8,6 +9,8 @@ ACCOUNT_SID = os.getenv('TWILIO_ACCOUNT_SID')
 AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN')
 FROM_NUMBER = os.getenv('OUTBOUND_PHONE_NUMBER')
 TO_NUMBER = os.getenv('INBOUND_PHONE_NUMBER')
+# Optional local stand-in for api.twilio.com, e.g. http://localhost:5005 (see twilio_fake.py)
+API_BASE = os.getenv('TWILIO_API_BASE')
 
 
 CONFIG_FILE = "amd_config.json"
@@ -15,6 +18,37 @@ def load_config(filename):
     with open(filename, "r") as f:
         return json.load(f)
 
+def config_label(config):
+    """Short label of the AMD timing parameters, e.g. S2400-E1200-Q5000-T30."""
+    if not config:
+        return "unknown"
+    return "S{}-E{}-Q{}-T{}".format(
+        config.get("MachineDetectionSpeechThreshold", 2400),
+        config.get("MachineDetectionSpeechEndThreshold", 1200),
+        config.get("MachineDetectionSilenceTimeout", 5000),
+        config.get("MachineDetectionTimeout", 30),
+    )
+
+def local_api_http_client(api_base, **kwargs):
+    """HTTP client that sends the REST requests to api_base instead of api.twilio.com."""
+    from twilio.http.http_client import TwilioHttpClient
+
+    class LocalApiHttpClient(TwilioHttpClient):
+        def request(self, method, url, *args, **kwargs):
+            parts = urlparse(url)
+            return super().request(method, api_base.rstrip("/") + parts.path, *args, **kwargs)
+
+    return LocalApiHttpClient(**kwargs)
+
+def create_client():
+    # The Twilio SDK is imported here so modules that only need the config load fast
+    from twilio.rest import Client
+    from twilio.http.http_client import TwilioHttpClient
+    # One pooled HTTP session, safe to share across all calls of a batch
+    if API_BASE:
+        return Client(ACCOUNT_SID or "ACfake", AUTH_TOKEN or "fake", http_client=local_api_http_client(API_BASE, pool_connections=True))
+    return Client(ACCOUNT_SID, AUTH_TOKEN, http_client=TwilioHttpClient(pool_connections=True))
+
 def build_call_kwargs(config):
     return {
         "from_": FROM_NUMBER,
@@ -38,8 +72,11 @@ def build_call_kwargs(config):
     }
 
 def main():
-    config = load_config(CONFIG_FILE)
-    client = Client(ACCOUNT_SID, AUTH_TOKEN)
+    parser = argparse.ArgumentParser(description="Place a single AMD test call with the configured parameters")
+    parser.add_argument("--config", required=False, default=CONFIG_FILE, help="AMD configuration JSON")
+    args = parser.parse_args()
+    config = load_config(args.config)
+    client = create_client()
     call_kwargs = build_call_kwargs(config)
     call_kwargs = {k: v for k, v in call_kwargs.items() if v is not None}
     print(f"Placing call to {TO_NUMBER}")
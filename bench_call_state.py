@@ -0,0 +1,125 @@
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+
+from call_state import MemoryCallState, SqliteCallState
+
+# --- Config ---
+WORK_DIR = "bench_data/call_state"
+RESULTS_JSON = "reports/bench_call_state.json"
+WORKERS = "1,2,4,8"
+STATUSES = ("initiated", "ringing", "in-progress", "completed")
+RETRIES = 2                   # every callback is delivered this many times, to different workers
+HANDLER_US = 200              # CPU time of the rest of a webhook (parsing, logging, TwiML) per callback
+
+def callbacks(calls):
+    """(call_sid, source, sequence, status) of every delivery, retries included, in arrival order."""
+    deliveries = []
+    for i in range(calls):
+        call_sid = f"CA{i:032d}"
+        for sequence, status in enumerate(STATUSES):
+            deliveries.extend([(call_sid, "call-progress-events", sequence, status)] * RETRIES)
+    return deliveries
+
+def busy(us):
+    end = time.perf_counter() + us / 1e6
+    while time.perf_counter() < end:
+        pass
+
+def handle(state, deliveries, handler_us):
+    """What /incoming-call and /webhook do with the call state; returns (first callbacks, completions claimed)."""
+    first = claimed = 0
+    for call_sid, source, sequence, status in deliveries:
+        if status == "initiated":
+            state.assign(call_sid, f"https://example.com/audio.wav?recording={call_sid}")
+        state.audio_for(call_sid)
+        busy(handler_us)
+        if not state.first_callback(call_sid, source, sequence):
+            continue
+        first += 1
+        if status == "completed" and state.complete(call_sid):
+            claimed += 1
+    return first, claimed
+
+def worker(args):
+    backend, db_path, deliveries, handler_us, start_at = args
+    state = SqliteCallState(db_path) if backend == "sqlite" else MemoryCallState()
+    # Start together, so the workers really overlap
+    while time.time() < start_at:
+        time.sleep(0.001)
+    started = time.perf_counter()
+    first, claimed = handle(state, deliveries, handler_us)
+    state.close()
+    return first, claimed, time.perf_counter() - started
+
+def run(backend, workers, calls, handler_us, work_dir):
+    """
+    Deliver the callbacks of `calls` calls round-robin over `workers` processes (so the
+    retries of a callback land on different workers) and check that every callback was
+    accepted once and every call completed once.
+    """
+    db_path = os.path.join(work_dir, f"call_state_{backend}_{workers}.db")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    if backend == "sqlite":
+        SqliteCallState(db_path).close()
+    deliveries = callbacks(calls)
+    shares = [deliveries[i::workers] for i in range(workers)]
+    start_at = time.time() + 0.5
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(workers) as pool:
+        started = time.time()
+        results = pool.map(worker, [(backend, db_path, share, handler_us, start_at) for share in shares])
+        seconds = time.time() - max(started, start_at)
+    first = sum(r[0] for r in results)
+    claimed = sum(r[1] for r in results)
+    return {
+        "backend": backend,
+        "workers": workers,
+        "callbacks": len(deliveries),
+        "seconds": seconds,
+        "callbacks_per_sec": len(deliveries) / seconds,
+        "duplicates_accepted": first - calls * len(STATUSES),
+        "completions_claimed": claimed,
+        "correct": first == calls * len(STATUSES) and claimed == calls,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Callback throughput and correctness of the call state backends across worker processes")
+    parser.add_argument("--workers", required=False, default=WORKERS, help="Comma separated numbers of worker processes")
+    parser.add_argument("--calls", required=False, type=int, default=2000, help="Calls whose callbacks are delivered")
+    parser.add_argument("--handler_us", required=False, type=int, default=HANDLER_US, help="Simulated CPU time of the rest of each webhook")
+    parser.add_argument("--backends", required=False, default="memory,sqlite", help="Comma separated backends (memory, sqlite)")
+    parser.add_argument("--work_dir", required=False, default=WORK_DIR, help="Where to put the SQLite databases")
+    parser.add_argument("--json", required=False, default=RESULTS_JSON, help="Where to write the results")
+    args = parser.parse_args()
+
+    os.makedirs(args.work_dir, exist_ok=True)
+    print(f"{args.calls} calls, {len(STATUSES) * RETRIES} deliveries each, {args.handler_us}us of handler work per callback, {os.cpu_count()} CPUs")
+    results = []
+    for backend in args.backends.split(","):
+        for workers in (int(n) for n in args.workers.split(",")):
+            result = run(backend, workers, args.calls, args.handler_us, args.work_dir)
+            results.append(result)
+            print(f"  {backend:7s} {workers:2d} workers  {result['callbacks_per_sec']:9.0f} callbacks/s  "
+                  f"duplicates accepted {result['duplicates_accepted']:5d}  completions {result['completions_claimed']:5d}  "
+                  f"{'ok' if result['correct'] else 'WRONG'}")
+
+    # The in-process state is only expected to be right with a single worker
+    wrong = [r for r in results if not r["correct"] and (r["backend"] == "sqlite" or r["workers"] == 1)]
+    os.makedirs(os.path.dirname(args.json) or ".", exist_ok=True)
+    with open(args.json, "w") as f:
+        json.dump({"calls": args.calls, "handler_us": args.handler_us, "cpus": os.cpu_count(), "results": results}, f, indent=2)
+    print(f"Saved results to {args.json}")
+    if wrong:
+        names = ", ".join(f"{r['backend']} x{r['workers']}" for r in wrong)
+        print(f"[ERROR] Wrong dedupe or completion counts: {names}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import numpy as np
+
+from amd_classifier import AmdClassifier, FEATURES, MODEL_FILE, train
+
+def synthetic_features(n, seed=0):
+    """Feature rows in realistic ranges, for timing only."""
+    rng = np.random.default_rng(seed)
+    return np.column_stack([
+        rng.exponential(1.0, n),          # initial_silence_sec
+        rng.exponential(2.0, n),          # first_utterance_sec
+        rng.integers(1, 20, n),           # speech_alternations
+        rng.uniform(0.01, 0.3, n),        # mean_amp
+        rng.uniform(0.02, 0.3, n),        # zcr
+        rng.uniform(5, 60, n),            # duration_sec
+    ]).astype(np.float64)
+
+def percentiles_us(samples_ns):
+    samples = np.asarray(samples_ns, dtype=np.float64) / 1000
+    return {"p50_us": float(np.percentile(samples, 50)), "p99_us": float(np.percentile(samples, 99)),
+            "mean_us": float(samples.mean())}
+
+def import_check():
+    """Import time of the inference module in a fresh interpreter, and whether it pulled in a heavy dependency."""
+    code = ("import sys, time; t = time.perf_counter(); import amd_classifier; "
+            "print(time.perf_counter() - t); print(','.join(m for m in ('sklearn', 'librosa', 'pandas', 'scipy') if m in sys.modules))")
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    lines = out.stdout.splitlines()
+    return {"import_ms": float(lines[0]) * 1000, "heavy_modules": lines[1] if len(lines) > 1 else ""}
+
+def main():
+    parser = argparse.ArgumentParser(description="Predict latency and throughput of the NumPy AMD classifier")
+    parser.add_argument("--model", required=False, default=MODEL_FILE, help="Model file; a model fitted on synthetic data is used if it does not exist")
+    parser.add_argument("--single", required=False, type=int, default=20000, help="Single-recording predictions to time")
+    parser.add_argument("--batch", required=False, type=int, default=1000000, help="Rows of the vectorized batch")
+    parser.add_argument("--json", required=False, default=None, help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    if os.path.exists(args.model):
+        model = AmdClassifier.load(args.model)
+        source = args.model
+    else:
+        X = synthetic_features(2000, seed=1)
+        model = train(X, (X[:, 1] > 2.0).astype(float), FEATURES)
+        source = "synthetic model (no model file)"
+    print(f"Model: {source}, {len(model.features)} features")
+
+    rows = synthetic_features(args.single)
+    dicts = [dict(zip(FEATURES, row.tolist())) for row in rows]
+    for row in dicts[:100]:
+        model.predict_one(row)
+    single_ns = []
+    for row in dicts:
+        start = time.perf_counter_ns()
+        model.predict_one(row)
+        single_ns.append(time.perf_counter_ns() - start)
+    single = percentiles_us(single_ns)
+    print(f"predict_one: p50 {single['p50_us']:.2f}us, p99 {single['p99_us']:.2f}us ({args.single} recordings)")
+
+    batch = synthetic_features(args.batch, seed=2)
+    model.predict_proba(batch[:1000])
+    start = time.perf_counter()
+    model.predict_proba(batch)
+    batch_sec = time.perf_counter() - start
+    print(f"predict_proba: {args.batch} rows in {batch_sec * 1000:.1f}ms ({args.batch / batch_sec / 1e6:.1f}M rows/s)")
+
+    imports = import_check()
+    heavy = imports["heavy_modules"] or "none"
+    print(f"import amd_classifier: {imports['import_ms']:.1f}ms, heavy modules loaded: {heavy}")
+
+    results = {"model": source, "predict_one": single, "batch_rows": args.batch,
+               "batch_rows_per_sec": args.batch / batch_sec, **imports}
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved results to {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+from greeting_fingerprint import GreetingIndex, BITS, MAX_DISTANCE, distance
+
+# --- Config ---
+WORK_DIR = "bench_data/greeting_index"
+RESULTS_JSON = "reports/bench_greeting_index.json"
+SIZES = "1000,10000,100000"
+GREETING_SHARE = 0.3          # share of the corpus that is copies of a few carrier greetings
+LOOKUPS = 500
+
+def flip(signature, bits, rng):
+    """signature with `bits` random bits flipped: a re-recording of the same greeting."""
+    value = int.from_bytes(signature, "big")
+    for bit in rng.choice(BITS, bits, replace=False):
+        value ^= 1 << int(bit)
+    return value.to_bytes(BITS // 8, "big")
+
+def corpus(size, rng, carriers=20, noise_bits=MAX_DISTANCE // 2):
+    """
+    {recording: signature}: unique greetings plus near-copies of `carriers` carrier greetings,
+    up to noise_bits from their carrier, so two copies can be up to MAX_DISTANCE apart.
+    """
+    bases = [rng.bytes(BITS // 8) for _ in range(carriers)]
+    signatures, truth = {}, {}
+    for i in range(size):
+        if rng.random() < GREETING_SHARE:
+            carrier = int(rng.integers(carriers))
+            signatures[f"rec_{i:06d}"] = flip(bases[carrier], int(rng.integers(noise_bits + 1)), rng)
+            truth[f"rec_{i:06d}"] = carrier
+        else:
+            signatures[f"rec_{i:06d}"] = rng.bytes(BITS // 8)
+    return signatures, truth, bases
+
+def run(size, work_dir, lookups, rng):
+    db_path = os.path.join(work_dir, f"index_{size}.db")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    signatures, truth, bases = corpus(size, rng)
+    index = GreetingIndex(db_path)
+    start = time.perf_counter()
+    index.add([(r, s, 0.0, 0, 0) for r, s in signatures.items()])
+    build_sec = time.perf_counter() - start
+
+    # Look up fresh re-recordings of the carrier greetings and of unseen greetings
+    queries = [(flip(bases[c], int(rng.integers(MAX_DISTANCE // 2 + 1)), rng), c) for c in rng.integers(len(bases), size=lookups // 2)]
+    queries += [(rng.bytes(BITS // 8), None) for _ in range(lookups - len(queries))]
+    members = {c: [r for r, v in truth.items() if v == c] for c in range(len(bases))}
+    found = wanted = false_matches = matches_returned = 0
+    seconds = {"new": 0.0, "dup": 0.0}
+    for signature, carrier in queries:
+        start = time.perf_counter()
+        matches = index.lookup(signature, MAX_DISTANCE)
+        seconds["dup" if carrier is not None else "new"] += time.perf_counter() - start
+        hits = sum(1 for _, r in matches if truth.get(r) == carrier) if carrier is not None else 0
+        found += hits
+        # Copies of the carrier that really are within MAX_DISTANCE of this query
+        wanted += sum(1 for r in members[carrier] if distance(signature, signatures[r]) <= MAX_DISTANCE) if carrier is not None else 0
+        false_matches += len(matches) - hits
+        matches_returned += len(matches)
+    dup_lookups = sum(1 for _, carrier in queries if carrier is not None)
+
+    # The worst case the threshold accepts: a copy exactly MAX_DISTANCE bits from an indexed greeting
+    stored = list(signatures)
+    at_max = [stored[i] for i in rng.integers(len(stored), size=lookups)]
+    found_at_max = sum(1 for r in at_max if r in {m for _, m in index.lookup(flip(signatures[r], MAX_DISTANCE, rng), MAX_DISTANCE)})
+
+    start = time.perf_counter()
+    clusters = index.clusters(MAX_DISTANCE)
+    cluster_sec = time.perf_counter() - start
+    index.close()
+    return {
+        "recordings": size,
+        "build_sec": build_sec,
+        # A greeting not in the index: the cost of the LSH lookup itself
+        "lookup_new_ms": seconds["new"] / (len(queries) - dup_lookups) * 1000,
+        # A carrier greeting: also reads every near-duplicate, so it grows with the size of its cluster
+        "lookup_dup_ms": seconds["dup"] / dup_lookups * 1000,
+        "matches_per_dup_lookup": matches_returned / dup_lookups,
+        "recall": found / wanted if wanted else 1.0,
+        "recall_at_max_distance": found_at_max / len(at_max),
+        "false_matches": false_matches,
+        "cluster_sec": cluster_sec,
+        "clusters": len(set(clusters.values())),
+        "db_mb": os.path.getsize(db_path) / 2**20,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Lookup and clustering time of the greeting index as the corpus grows")
+    parser.add_argument("--sizes", required=False, default=SIZES, help="Comma separated corpus sizes")
+    parser.add_argument("--lookups", required=False, type=int, default=LOOKUPS, help="Lookups timed per size")
+    parser.add_argument("--work_dir", required=False, default=WORK_DIR, help="Where to put the indexes")
+    parser.add_argument("--json", required=False, default=RESULTS_JSON, help="Where to write the results")
+    args = parser.parse_args()
+
+    os.makedirs(args.work_dir, exist_ok=True)
+    rng = np.random.default_rng(0)
+    results = []
+    for size in (int(n) for n in args.sizes.split(",")):
+        result = run(size, args.work_dir, args.lookups, rng)
+        results.append(result)
+        print(f"  {size:7d} recordings  build {result['build_sec']:6.1f}s  lookup {result['lookup_new_ms']:5.2f}ms new, "
+              f"{result['lookup_dup_ms']:6.2f}ms for {result['matches_per_dup_lookup']:5.0f} duplicates  "
+              f"recall {result['recall']:.3f} ({result['recall_at_max_distance']:.3f} at {MAX_DISTANCE} bits)  false matches {result['false_matches']:4d}  "
+              f"cluster {result['cluster_sec']:6.1f}s ({result['clusters']} clusters)  {result['db_mb']:6.1f} MB")
+
+    # Sublinear: lookups must grow much slower than the corpus
+    first, last = results[0], results[-1]
+    growth = last["lookup_new_ms"] / first["lookup_new_ms"] if first["lookup_new_ms"] else 0
+    scale = last["recordings"] / first["recordings"]
+    print(f"Lookup time of a new greeting x{growth:.1f} for a corpus x{scale:.0f}")
+    os.makedirs(os.path.dirname(args.json) or ".", exist_ok=True)
+    with open(args.json, "w") as f:
+        json.dump({"results": results, "lookup_growth": growth, "corpus_growth": scale}, f, indent=2)
+    print(f"Saved results to {args.json}")
+    if scale > 1 and growth > scale ** 0.5:
+        print("[REGRESSION] Lookup time grows faster than the square root of the corpus")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
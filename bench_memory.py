@@ -0,0 +1,107 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+from synth_recordings import generate
+
+# --- Config ---
+WORK_DIR = "bench_data/memory"
+RESULTS_JSON = "reports/bench_memory.json"
+
+# Each case runs in a fresh interpreter; SETUP is imported before the baseline is taken,
+# so only the memory of loading and analyzing the recording is counted.
+SETUP = "import resource, numpy as np, segmentation; from wav_io import WavReader"
+CASES = {
+    # What the analysis scripts did before: librosa float32 copy, |y| copies for peak and mean
+    "librosa.load + normalize": (
+        "import librosa, librosa.core.audio, soundfile",
+        "y, sr = librosa.load(PATH, sr=None); peak = np.max(np.abs(y)); "
+        "mean_amp = np.mean(np.abs(y)) / peak; segmentation.segment(y, sr, peak=peak)"),
+    "WavReader + stats": (
+        "",
+        "audio = WavReader(PATH); y = audio.samples(); stats = audio.stats(); "
+        "mean_amp = stats['mean_abs'] / stats['peak']; segmentation.segment(y, audio.sample_rate)"),
+    # waveform_mapping_tool.read_audio before: float64 mean of the channels, then a float32 copy
+    "wavfile.read + mean(axis=1)": (
+        "from scipy.io import wavfile",
+        "sr, data = wavfile.read(PATH_STEREO); data = data.mean(axis=1); data = data.astype(np.float32) / 32767"),
+    "WavReader stereo mix": (
+        "",
+        "audio = WavReader(PATH_STEREO); y = audio.samples()"),
+    "extract_features": (
+        "from audio_feature_extractor import extract_features",
+        "extract_features(PATH)"),
+    "analyze_and_plot": (
+        "import io, contextlib; from channel_visualization import analyze_and_plot",
+        "with contextlib.redirect_stdout(io.StringIO()): analyze_and_plot(PATH, PNG)"),
+}
+# (old, new) pairs that must show a lower peak for the new loader
+COMPARISONS = [("librosa.load + normalize", "WavReader + stats"), ("wavfile.read + mean(axis=1)", "WavReader stereo mix")]
+
+def peak_rss_mb(case, paths):
+    """Growth of the peak RSS (MB) of a fresh interpreter while it runs one case."""
+    imports, body = CASES[case]
+    code = "\n".join([
+        SETUP, imports,
+        f"PATH, PATH_STEREO, PNG = {paths['mono']!r}, {paths['stereo']!r}, {paths['png']!r}",
+        "before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss",
+        body,
+        "print((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before) / 1024)",
+    ])
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                         cwd=os.path.dirname(os.path.abspath(__file__)))
+    if out.returncode != 0:
+        print(f"[ERROR] {case}: {out.stderr.strip().splitlines()[-1] if out.stderr.strip() else out.returncode}")
+        return None
+    return float(out.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak memory of loading and analyzing a long recording, librosa/scipy against WavReader")
+    parser.add_argument("--minutes", required=False, type=float, default=30, help="Length of the synthetic recording")
+    parser.add_argument("--work_dir", required=False, default=WORK_DIR, help="Where to write the recordings")
+    parser.add_argument("--cases", required=False, default=None, help="Comma separated cases to run (default: all)")
+    parser.add_argument("--json", required=False, default=RESULTS_JSON, help="Where to write the results")
+    args = parser.parse_args()
+
+    os.makedirs(args.work_dir, exist_ok=True)
+    duration = args.minutes * 60
+    name = f"memory_{args.minutes:g}min"
+    paths = {
+        "mono": os.path.abspath(os.path.join(args.work_dir, f"{name}.wav")),
+        "stereo": os.path.abspath(os.path.join(args.work_dir, f"{name}_stereo.wav")),
+        "png": os.path.abspath(os.path.join(args.work_dir, f"{name}.png")),
+    }
+    if not os.path.exists(paths["mono"]):
+        generate(name, "human", duration, args.work_dir, stereo=False)
+    if not os.path.exists(paths["stereo"]):
+        generate(f"{name}_stereo", "human", duration, args.work_dir, stereo=True)
+    print(f"Recording: {args.minutes:g} minutes, {os.path.getsize(paths['mono']) / 2**20:.1f} MB mono, "
+          f"{os.path.getsize(paths['stereo']) / 2**20:.1f} MB stereo")
+
+    cases = args.cases.split(",") if args.cases else list(CASES)
+    results = {}
+    for case in cases:
+        results[case] = peak_rss_mb(case, paths)
+        if results[case] is not None:
+            print(f"  {case:30s} peak RSS +{results[case]:7.1f} MB")
+
+    worse = []
+    for old, new in COMPARISONS:
+        if results.get(old) is not None and results.get(new) is not None:
+            print(f"{new} vs {old}: {results[new]:.1f} MB vs {results[old]:.1f} MB")
+            if results[new] >= results[old]:
+                worse.append(new)
+
+    os.makedirs(os.path.dirname(args.json) or ".", exist_ok=True)
+    with open(args.json, "w") as f:
+        json.dump({"minutes": args.minutes, "peak_rss_mb": results}, f, indent=2)
+    print(f"Saved results to {args.json}")
+    if worse:
+        print(f"[REGRESSION] No memory saved by: {', '.join(worse)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
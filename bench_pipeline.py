@@ -0,0 +1,182 @@
+import io
+import os
+import sys
+import json
+import glob
+import time
+import shutil
+import platform
+import argparse
+import contextlib
+from pathlib import Path
+
+from synth_recordings import generate_corpus
+
+# --- Config ---
+STAGES = ("split", "segment", "features", "render")
+SIZES = "10,100"                          # up to 10000; files beyond --unique are hard links to the same recordings
+WORK_DIR = "bench_data"
+RESULTS_JSON = "reports/bench_pipeline.json"
+THRESHOLD = 0.25                          # a stage regresses when it is this much slower per file than the baseline
+POOL_FILE = "pool.json"
+
+def build_corpus(work_dir, count, duration, unique):
+    """
+    `count` stereo recordings in <work_dir>/recordings. Only `unique` of them are synthesized
+    (once, and kept between runs); the rest are hard links, so 10,000 files cost no extra disk.
+    """
+    pool_dir = os.path.join(work_dir, "pool")
+    params = {"unique": unique, "duration": duration}
+    pool_file = os.path.join(pool_dir, POOL_FILE)
+    if not os.path.exists(pool_file) or json.load(open(pool_file)) != params:
+        shutil.rmtree(pool_dir, ignore_errors=True)
+        generate_corpus(unique, pool_dir, duration=duration, prefix="bench")
+        with open(pool_file, "w") as f:
+            json.dump(params, f)
+    pool = sorted(glob.glob(os.path.join(pool_dir, "*.wav")))
+
+    source_dir = os.path.join(work_dir, "recordings")
+    shutil.rmtree(source_dir, ignore_errors=True)
+    os.makedirs(source_dir)
+    paths = []
+    for i in range(count):
+        path = os.path.join(source_dir, f"rec_{i:05d}.wav")
+        try:
+            os.link(pool[i % len(pool)], path)
+        except OSError:
+            shutil.copyfile(pool[i % len(pool)], path)
+        paths.append(path)
+    return paths
+
+def run_split(paths, work_dir):
+    import split_audio_channels
+    split_audio_channels.OUTPUT_DIR_LEFT = Path(work_dir) / "channel_audio" / "left"
+    split_audio_channels.OUTPUT_DIR_RIGHT = Path(work_dir) / "channel_audio" / "right"
+    split_audio_channels.OUTPUT_DIR_LEFT.mkdir(parents=True, exist_ok=True)
+    split_audio_channels.OUTPUT_DIR_RIGHT.mkdir(parents=True, exist_ok=True)
+    for path in paths:
+        split_audio_channels.process_wav(path, force=True)
+
+def run_segment(paths, work_dir):
+    from wav_io import WavReader
+    from channel_visualization import find_segments
+    for path in paths:
+        audio = WavReader(path)
+        find_segments(audio.samples(), audio.sample_rate)
+
+def run_features(paths, work_dir):
+    from audio_feature_extractor import extract_features
+    for path in paths:
+        extract_features(path)
+
+def run_render(paths, work_dir):
+    from channel_visualization import analyze_and_plot
+    output_dir = os.path.join(work_dir, "analysis")
+    os.makedirs(output_dir, exist_ok=True)
+    for path in paths:
+        analyze_and_plot(path, os.path.join(output_dir, f"analysis_{Path(path).stem}.png"))
+
+# split works on the stereo recordings, the other stages on the left channels it writes
+RUNNERS = {"split": run_split, "segment": run_segment, "features": run_features, "render": run_render}
+
+def time_stage(stage, paths, work_dir):
+    """Seconds to run `stage` over paths, after one untimed warm-up file (imports, font cache)."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        RUNNERS[stage](paths[:1], work_dir)
+        start = time.perf_counter()
+        RUNNERS[stage](paths, work_dir)
+        return time.perf_counter() - start
+
+def audio_seconds(paths):
+    from wav_io import read_wav_info
+    return sum(read_wav_info(path).duration for path in paths)
+
+def run_size(count, stages, work_dir, duration, unique):
+    paths = build_corpus(work_dir, count, duration, unique)
+    audio_sec = audio_seconds(paths)
+    results = {}
+    left_paths = []
+    for stage in STAGES:
+        if stage not in stages and not (stage == "split" and set(stages) - {"split"}):
+            continue
+        inputs = paths if stage == "split" else left_paths
+        seconds = time_stage(stage, inputs, work_dir)
+        if stage == "split":
+            left_paths = sorted(glob.glob(os.path.join(work_dir, "channel_audio", "left", "*.wav")))
+        if stage in stages:
+            results[stage] = {
+                "files": len(inputs),
+                "seconds": seconds,
+                "per_file_ms": seconds / len(inputs) * 1000,
+                "files_per_sec": len(inputs) / seconds,
+                "realtime_factor": audio_sec / seconds,
+            }
+    for name in ("channel_audio", "analysis"):
+        shutil.rmtree(os.path.join(work_dir, name), ignore_errors=True)
+    return results
+
+def find_regressions(results, baseline, threshold=THRESHOLD):
+    """(stage, size, baseline ms, current ms) for every per-file time more than `threshold` slower."""
+    regressions = []
+    for stage, sizes in results.items():
+        for size, current in sizes.items():
+            before = baseline.get(stage, {}).get(size)
+            if before and current["per_file_ms"] > before["per_file_ms"] * (1 + threshold):
+                regressions.append((stage, size, before["per_file_ms"], current["per_file_ms"]))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the audio pipeline on synthetic recordings")
+    parser.add_argument("--sizes", required=False, default=SIZES, help="Comma separated numbers of files (10 to 10000)")
+    parser.add_argument("--stages", required=False, default=",".join(STAGES), help=f"Comma separated stages ({', '.join(STAGES)})")
+    parser.add_argument("--duration", required=False, default="10:30", help="Seconds per recording, or a min:max range")
+    parser.add_argument("--unique", required=False, type=int, default=40, help="Distinct recordings to synthesize; the rest are links to them")
+    parser.add_argument("--work_dir", required=False, default=WORK_DIR, help="Scratch folder for the recordings and the outputs")
+    parser.add_argument("--json", required=False, default=RESULTS_JSON, help="Where to write the results")
+    parser.add_argument("--baseline", required=False, default=None, help="Results JSON of an earlier run to compare against")
+    parser.add_argument("--threshold", required=False, type=float, default=THRESHOLD, help="Allowed slowdown per file before failing, e.g. 0.25 for 25%%")
+    args = parser.parse_args()
+
+    stages = args.stages.split(",")
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        raise SystemExit(f"Unknown stages: {', '.join(unknown)}")
+    sizes = [int(n) for n in args.sizes.split(",")]
+
+    results = {stage: {} for stage in stages}
+    for count in sizes:
+        print(f"[INFO] {count} files")
+        for stage, result in run_size(count, stages, args.work_dir, args.duration, args.unique).items():
+            results[stage][str(count)] = result
+            print(f"  {stage:9s} {result['seconds']:8.2f}s  {result['per_file_ms']:8.2f}ms/file  "
+                  f"{result['files_per_sec']:8.1f} files/s  {result['realtime_factor']:8.0f}x realtime")
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "duration": args.duration,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = find_regressions(results, baseline, args.threshold)
+        report["baseline"] = args.baseline
+        report["regressions"] = [dict(zip(("stage", "files", "baseline_ms", "current_ms"), r)) for r in regressions]
+
+    os.makedirs(os.path.dirname(args.json) or ".", exist_ok=True)
+    with open(args.json, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved results to {args.json}")
+
+    for stage, size, before, current in regressions:
+        print(f"[REGRESSION] {stage} on {size} files: {before:.2f}ms -> {current:.2f}ms per file (+{(current / before - 1) * 100:.0f}%)")
+    if regressions:
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
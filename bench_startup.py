@@ -0,0 +1,121 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+from amdkit import COMMANDS
+
+# --- Config ---
+# Import budget (ms) of `amdkit.py <command> --help`; "" is the bare `amdkit.py --help`.
+# About three times the times of an idle single-CPU machine, and above the times measured
+# with that CPU busy: they catch a heavy import (pandas, matplotlib, Flask) landing in the
+# wrong command, not load or noise. Finer regressions are caught against a stored baseline
+# of the same machine.
+BUDGETS_MS = {
+    "": 200,
+    "split": 600,
+    "features": 600,
+    "render": 600,
+    "serve": 1500,
+    "call": 300,
+    "analyze": 2000,
+    "simulate": 600,
+    "cache": 600,
+    "experiment": 300,
+    "train": 300,
+    "pipeline": 300,
+    "greetings": 600,
+    "overlap": 600,
+}
+REPEATS = 5
+BASELINE_JSON = os.path.join("reports", "bench_startup_baseline.json")
+TOLERANCE = 0.5               # slower than the baseline by more than this share...
+MIN_SLACK_MS = 25             # ...and by more than this many ms counts as a regression
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+def parse_importtime(stderr):
+    """(total import µs, {top-level module: cumulative µs}) from `python -X importtime` output."""
+    top = {}
+    for line in stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match and len(match.group(3)) == 1:
+            top[match.group(4)] = top.get(match.group(4), 0) + int(match.group(2))
+    return sum(top.values()), top
+
+def measure(command, repeats=REPEATS):
+    """Best of `repeats` fresh interpreters running `amdkit.py <command> --help`."""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "amdkit.py")
+    argv = [sys.executable, "-X", "importtime", script] + ([command] if command else []) + ["--help"]
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        out = subprocess.run(argv, capture_output=True, text=True, cwd=os.path.dirname(script))
+        wall_ms = (time.perf_counter() - start) * 1000
+        total_us, top = parse_importtime(out.stderr)
+        if best is None or total_us < best["import_ms"] * 1000:
+            slowest = sorted(top.items(), key=lambda item: -item[1])[:5]
+            best = {"import_ms": total_us / 1000, "wall_ms": wall_ms,
+                    "slowest": [(name, us / 1000) for name, us in slowest]}
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup time of every amdkit.py command, checked against an import budget")
+    parser.add_argument("--commands", required=False, default=None, help="Comma separated commands to measure (default: all)")
+    parser.add_argument("--repeats", required=False, type=int, default=REPEATS, help="Runs per command; the fastest counts")
+    parser.add_argument("--json", required=False, default=None, help="Also write the results to this JSON file")
+    parser.add_argument("--baseline", required=False, default=BASELINE_JSON, help="Import times of this machine to compare against, if the file exists")
+    parser.add_argument("--save_baseline", action="store_true", help="Store the measured import times as the baseline instead of checking them")
+    args = parser.parse_args()
+
+    commands = args.commands.split(",") if args.commands else [""] + list(COMMANDS)
+    baseline = {}
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    results = {}
+    over = []
+    for command in commands:
+        name = command or "--help"
+        result = measure(command, args.repeats)
+        budget = BUDGETS_MS.get(command)
+        base = baseline.get(name)
+        result["budget_ms"] = budget
+        result["baseline_ms"] = base
+        results[name] = result
+        status = "ok"
+        if budget is not None and result["import_ms"] > budget:
+            status = "OVER BUDGET"
+        elif base is not None and result["import_ms"] > base + max(base * TOLERANCE, MIN_SLACK_MS):
+            status = "SLOWER THAN BASELINE"
+        if status != "ok":
+            over.append(name)
+        slowest = ", ".join(f"{module} {ms:.0f}ms" for module, ms in result["slowest"][:3])
+        reference = f" (baseline {base:.0f}ms)" if base is not None else ""
+        print(f"{name:11s} imports {result['import_ms']:6.1f}ms / {budget}ms{reference}  wall {result['wall_ms']:6.1f}ms  "
+              f"[{status}]  {slowest}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved results to {args.json}")
+    if args.save_baseline:
+        # Commands left out of --commands keep their stored times
+        stored = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                stored = json.load(f)
+        stored.update((name, result["import_ms"]) for name, result in results.items())
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(stored, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+    if over:
+        print(f"Over the import budget or the baseline: {', '.join(over)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
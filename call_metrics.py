@@ -0,0 +1,225 @@
+import json
+import time
+import bisect
+import threading
+from collections import OrderedDict, defaultdict, deque
+import numpy as np
+
+from automated_amd_call import config_label
+
+# --- Config ---
+MAX_CALLS = 10000             # timelines kept in memory, the oldest are dropped first
+MAX_SAMPLES = 10000           # raw samples kept per series for the batch summary percentiles
+AMD_BUCKETS = (0.5, 1, 1.5, 2, 2.5, 3, 4, 5, 6, 8, 10, 15, 20, 30, 45, 60)
+CALL_BUCKETS = (5, 10, 15, 20, 30, 45, 60, 90, 120, 180, 300, 600)
+STAGE_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60)
+HANDLER_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+
+STAGES = ("placed", "initiated", "ringing", "answered", "amd", "completed")
+# CallStatus values that mark each stage; the "answered" event arrives as in-progress
+STATUS_STAGES = {"initiated": "initiated", "ringing": "ringing", "in-progress": "answered", "answered": "answered",
+                 "completed": "completed", "busy": "completed", "no-answer": "completed", "failed": "completed",
+                 "canceled": "completed"}
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, rendered in the Prometheus text format."""
+
+    def __init__(self, name, help, buckets, labels=()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.label_names = tuple(labels)
+        self.series = {}           # label values -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value, *label_values):
+        counts = self.series.get(label_values)
+        if counts is None:
+            counts = self.series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, counts in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts[:-1]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.label_names + ('le',), values + (bound,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, values)} {counts[-1]:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, values)} {cumulative}")
+        return lines
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.series = defaultdict(int)
+
+    def inc(self, *label_values):
+        self.series[label_values] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for values, count in sorted(self.series.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, values)} {count}")
+        return lines
+
+class CallMetrics:
+    """
+    Per-call timelines (placed, initiated, ringing, answered, AnsweredBy, completed) built
+    from the callbacks, with bounded retention, feeding histograms of AMD time-to-decision
+    and end-to-end call duration per AMD config, plus callback and outcome counters.
+
+    Times are taken when the server receives each callback: the Timestamp sent by Twilio
+    only has one-second resolution.
+    """
+
+    def __init__(self, default_config=None, max_calls=MAX_CALLS):
+        self.default_config = config_label(default_config)
+        self.max_calls = max_calls
+        self.lock = threading.Lock()
+        self.timelines = OrderedDict()     # call_sid -> {"config", "audio_url", stage: time}
+        self.samples = defaultdict(lambda: deque(maxlen=MAX_SAMPLES))
+        self.started = time.time()
+
+        self.amd_decision = Histogram(
+            "amd_time_to_decision_seconds", "Seconds from answer to the AMD verdict",
+            AMD_BUCKETS, ("config", "source"))
+        self.call_duration = Histogram(
+            "call_duration_seconds", "Seconds from placing the call to the completed callback",
+            CALL_BUCKETS, ("config",))
+        self.stage_latency = Histogram(
+            "call_stage_seconds", "Seconds between consecutive call stages",
+            STAGE_BUCKETS, ("stage",))
+        self.handler_time = Histogram(
+            "webhook_handler_seconds", "Time spent handling a webhook request",
+            HANDLER_BUCKETS, ("endpoint",))
+        self.callbacks = Counter("callbacks_total", "Callbacks received", ("source", "status"))
+        self.outcomes = Counter("amd_outcomes_total", "AMD verdicts", ("config", "source", "answered_by"))
+
+    def _timeline(self, call_sid, config=None):
+        timeline = self.timelines.get(call_sid)
+        if timeline is None:
+            timeline = self.timelines[call_sid] = {"config": config or self.default_config}
+            if len(self.timelines) > self.max_calls:
+                self.timelines.popitem(last=False)
+        elif config:
+            timeline["config"] = config
+        return timeline
+
+    def call_placed(self, call_sid, audio_url=None, config=None, at=None):
+        with self.lock:
+            timeline = self._timeline(call_sid, config_label(config) if config else None)
+            timeline["audio_url"] = audio_url
+            if "placed" in timeline:
+                return
+            timeline["placed"] = at = at or time.time()
+            # Callbacks can beat calls.create returning
+            later = [stage for stage in STAGES[1:] if stage in timeline]
+            if later:
+                self.stage_latency.observe(timeline[later[0]] - at, f"placed->{later[0]}")
+            if "completed" in timeline:
+                self._observe_duration(timeline, timeline["completed"] - at)
+            if "amd" in timeline and "answered" not in timeline:
+                self._observe_decision(timeline, "twilio", timeline["amd"] - at)
+
+    def _mark(self, timeline, stage, at):
+        """Record the first time a stage is reached; duplicates and late retries are ignored."""
+        if stage in timeline:
+            return False
+        timeline[stage] = at
+        # Latency from the closest earlier stage that was seen (callbacks can arrive out of order)
+        index = STAGES.index(stage)
+        for previous in reversed(STAGES[:index]):
+            if previous in timeline and timeline[previous] <= at:
+                self.stage_latency.observe(at - timeline[previous], f"{previous}->{stage}")
+                break
+        return True
+
+    def callback(self, call_sid, call_status=None, answered_by=None, source=None, at=None):
+        at = at or time.time()
+        with self.lock:
+            self.callbacks.inc(source or "", call_status or ("amd" if answered_by else ""))
+            if not call_sid:
+                return
+            timeline = self._timeline(call_sid)
+            stage = STATUS_STAGES.get(call_status)
+            if stage and self._mark(timeline, stage, at) and stage == "completed" and "placed" in timeline:
+                self._observe_duration(timeline, at - timeline["placed"])
+            if answered_by and self._mark(timeline, "amd", at):
+                timeline["answered_by"] = answered_by
+                self.outcomes.inc(timeline["config"], "twilio", answered_by)
+                reference = timeline.get("answered", timeline.get("placed"))
+                if reference is not None:
+                    self._observe_decision(timeline, "twilio", at - reference)
+
+    def stream_verdict(self, call_sid, answered_by, decision_time):
+        """Verdict of the streaming predictor, decision_time in seconds of call audio."""
+        with self.lock:
+            timeline = self._timeline(call_sid) if call_sid else {"config": self.default_config}
+            timeline["stream_answered_by"] = answered_by
+            self.outcomes.inc(timeline["config"], "media-stream", answered_by)
+            self._observe_decision(timeline, "media-stream", decision_time)
+
+    def _observe_decision(self, timeline, source, seconds):
+        self.amd_decision.observe(seconds, timeline["config"], source)
+        self.samples[("amd_time_to_decision", timeline["config"], source)].append(seconds)
+
+    def _observe_duration(self, timeline, seconds):
+        self.call_duration.observe(seconds, timeline["config"])
+        self.samples[("call_duration", timeline["config"])].append(seconds)
+
+    def observe_handler(self, endpoint, seconds):
+        with self.lock:
+            self.handler_time.observe(seconds, endpoint)
+
+    def render_prometheus(self):
+        with self.lock:
+            lines = []
+            for metric in (self.amd_decision, self.call_duration, self.stage_latency,
+                           self.handler_time, self.callbacks, self.outcomes):
+                lines.extend(metric.render())
+            lines += ["# HELP calls_tracked Call timelines held in memory", "# TYPE calls_tracked gauge",
+                      f"calls_tracked {len(self.timelines)}"]
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """Percentiles of every series and the outcome counts, as a JSON-ready dict."""
+        def percentiles(values):
+            values = np.asarray(values, dtype=np.float64)
+            return {"count": len(values), "mean": float(values.mean()),
+                    **{f"p{q}": float(np.percentile(values, q)) for q in (50, 90, 99)}}
+
+        with self.lock:
+            series = {}
+            for key, values in sorted(self.samples.items()):
+                if values:
+                    series.setdefault(key[0], {})[" ".join(key[1:])] = percentiles(values)
+            outcomes = defaultdict(dict)
+            for (config, source, answered_by), count in sorted(self.outcomes.series.items()):
+                outcomes[f"{config} {source}"][answered_by] = count
+            handler = {endpoint: {"count": sum(counts[:-1]), "mean": counts[-1] / max(1, sum(counts[:-1]))}
+                       for (endpoint,), counts in self.handler_time.series.items()}
+            return {
+                "started": time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started)),
+                "finished": time.strftime('%Y-%m-%d %H:%M:%S'),
+                "calls": len(self.timelines),
+                **series,
+                "outcomes": dict(outcomes),
+                "webhook_handler_seconds": handler,
+            }
+
+    def write_summary(self, path):
+        summary = self.summary()
+        with open(path, "w") as f:
+            json.dump(summary, f, indent=2)
+        return summary
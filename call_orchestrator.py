@@ -0,0 +1,197 @@
+import threading
+import time
+from collections import deque, OrderedDict
+from urllib.parse import urlencode, urlparse, urlunparse, parse_qsl
+from colorama import Fore, Style
+
+from automated_amd_call import build_call_kwargs
+from call_state import MemoryCallState
+
+def with_query(url, **params):
+    """Return url with params added to its query string."""
+    if not url:
+        return url
+    parts = urlparse(url)
+    query = parse_qsl(parts.query) + [(k, v) for k, v in params.items() if v is not None]
+    return urlunparse(parts._replace(query=urlencode(query)))
+
+class RateLimiter:
+    """Token bucket limiting call creation to `rate` calls per second."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+class CallJob:
+    """One call to place: the audio to play, with an optional per-call AMD config and tags for the callbacks."""
+
+    def __init__(self, audio_url, config=None, tags=None):
+        self.audio_url = audio_url
+        self.config = config
+        self.tags = tags or {}
+
+    def __repr__(self):
+        return f"CallJob({self.audio_url}, {self.tags})"
+
+class CallOrchestrator:
+    """
+    Places the test calls of a batch from a single process and a single REST client,
+    keeping at most `max_in_flight` calls open and creating at most `cps` calls per second.
+
+    Jobs are audio urls or CallJobs. on_placed(call_sid, job, placed_at) is called for every
+    call created, with the wall-clock time calls.create was sent; on_done() once the batch
+    has been processed.
+
+    Every call carries its audio assignment in the query string of its status callback URLs,
+    so overlapping calls never share state through a file. With a shared call_state,
+    completions recorded by other server processes free their slots too.
+
+    The inbound leg that plays the audio reaches /incoming-call through the voice URL of
+    the called number, with its own CallSid and nothing linking it to the outbound call.
+    Placed calls queue their audio in call_state (push_inbound), and the leg gets the oldest
+    one from whichever server process answers it (claim_inbound). That is only the right one
+    when a single call is open, so max_in_flight is lowered to 1 unless tagged_inbound says
+    the inbound legs carry their audio (e.g. the local stand-in).
+    """
+
+    def __init__(self, client, config, max_in_flight=1, cps=1.0, call_timeout=600, on_placed=None, on_done=None, call_state=None,
+                 tagged_inbound=False):
+        self.client = client
+        self.config = config
+        if max_in_flight > 1 and not tagged_inbound:
+            print(Fore.YELLOW + f"[WARN] Inbound legs cannot be matched to their call, placing 1 call at a time instead of {max_in_flight}" + Style.RESET_ALL)
+            max_in_flight = 1
+        self.max_in_flight = max_in_flight
+        self.call_timeout = call_timeout
+        self.on_placed = on_placed
+        self.on_done = on_done
+        self.call_state = call_state if call_state is not None else MemoryCallState()
+        self.limiter = RateLimiter(cps)
+        self.pending = deque()
+        self.in_flight = {}                  # call_sid -> (job, placed_at)
+        self.finished_early = OrderedDict()  # completed callbacks that beat calls.create returning
+        self.placed = 0
+        self.failed = 0
+        self.cond = threading.Condition()
+        self.thread = None
+
+    def submit(self, jobs):
+        with self.cond:
+            self.pending.extend(job if isinstance(job, CallJob) else CallJob(job) for job in jobs)
+            self.cond.notify_all()
+
+    def start(self):
+        self.thread = threading.Thread(target=self._dispatch, name="call-orchestrator", daemon=True)
+        self.thread.start()
+
+    def join(self, timeout=None):
+        if self.thread:
+            self.thread.join(timeout)
+
+    def is_done(self):
+        with self.cond:
+            return not self.pending and not self.in_flight
+
+    def call_finished(self, call_sid):
+        """Free the slot of a completed call; completions that beat calls.create returning are remembered."""
+        with self.cond:
+            entry = self.in_flight.pop(call_sid, None)
+            if entry is not None:
+                self._forget_inbound(entry[0])
+                self.cond.notify_all()
+            else:
+                self.finished_early[call_sid] = True
+                if len(self.finished_early) > 1024:
+                    self.finished_early.popitem(last=False)
+
+    def _forget_inbound(self, job):
+        # A finished call whose inbound leg never came must not hand its audio to the next call
+        self.call_state.discard_inbound(job.audio_url)
+
+    def build_call(self, job):
+        if not isinstance(job, CallJob):
+            job = CallJob(job)
+        call_kwargs = build_call_kwargs(job.config or self.config)
+        for key in ("status_callback", "async_amd_status_callback"):
+            call_kwargs[key] = with_query(call_kwargs.get(key), audio=job.audio_url, **job.tags)
+        return {k: v for k, v in call_kwargs.items() if v is not None}
+
+    def place_call(self, job):
+        call = self.client.calls.create(**self.build_call(job))
+        tags = "".join(f", {k}: {v}" for k, v in job.tags.items())
+        print(Fore.BLUE + f"[INFO] Placed call {call.sid} for audio: {job.audio_url}{tags}" + Style.RESET_ALL)
+        return call.sid
+
+    def _reap_stale(self):
+        now = time.monotonic()
+        for call_sid, (job, placed_at) in list(self.in_flight.items()):
+            if now - placed_at > self.call_timeout:
+                print(Fore.RED + f"[WARN] No completed callback for {call_sid} after {self.call_timeout}s, releasing slot" + Style.RESET_ALL)
+                del self.in_flight[call_sid]
+                self._forget_inbound(job)
+
+    def _collect_finished(self):
+        call_sids = [sid for sid in self.in_flight if isinstance(sid, str)]
+        if not call_sids:
+            return
+        for call_sid in self.call_state.completed(call_sids):
+            job, _ = self.in_flight.pop(call_sid)
+            self._forget_inbound(job)
+
+    def _dispatch(self):
+        self._place_all()
+        if self.on_done:
+            self.on_done()
+
+    def _place_all(self):
+        while True:
+            with self.cond:
+                while True:
+                    self._reap_stale()
+                    self._collect_finished()
+                    if not self.pending and not self.in_flight:
+                        print(Fore.GREEN + f"[INFO] All test calls have been placed and processed. Placed: {self.placed}, failed: {self.failed}" + Style.RESET_ALL)
+                        return
+                    if self.pending and len(self.in_flight) < self.max_in_flight:
+                        break
+                    self.cond.wait(timeout=1.0)
+                job = self.pending.popleft()
+                # Reserve the slot before releasing the lock
+                reservation = object()
+                self.in_flight[reservation] = (job, time.monotonic())
+
+            self.limiter.wait()
+            placed_at = time.time()
+            try:
+                call_sid = self.place_call(job)
+            except Exception as e:
+                print(Fore.RED + f"[ERROR] Could not place call for {job.audio_url}: {e}" + Style.RESET_ALL)
+                call_sid = None
+
+            with self.cond:
+                self.in_flight.pop(reservation, None)
+                if call_sid is None:
+                    self.failed += 1
+                else:
+                    self.placed += 1
+                    if self.finished_early.pop(call_sid, None) is None:
+                        self.in_flight[call_sid] = (job, time.monotonic())
+                        self.call_state.push_inbound(job.audio_url)
+                self.cond.notify_all()
+            if call_sid and self.on_placed:
+                self.on_placed(call_sid, job, placed_at)
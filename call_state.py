@@ -0,0 +1,325 @@
+import os
+import time
+import sqlite3
+import threading
+from collections import deque
+
+# --- Config ---
+CALL_STATE_DB = os.path.join("reports", "call_state.db")
+TTL_SEC = 3600                # finished calls are forgotten this long after their completed callback
+MAX_CALL_AGE_SEC = 86400      # calls that never completed are forgotten after a day
+EVICT_EVERY_SEC = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS calls (
+    call_sid TEXT PRIMARY KEY,
+    audio_url TEXT,
+    created_at REAL NOT NULL,
+    completed_at REAL
+);
+CREATE TABLE IF NOT EXISTS callbacks (
+    call_sid TEXT NOT NULL,
+    source TEXT NOT NULL,
+    sequence TEXT NOT NULL,
+    received_at REAL NOT NULL,
+    PRIMARY KEY (call_sid, source, sequence)
+);
+CREATE TABLE IF NOT EXISTS claims (
+    key TEXT PRIMARY KEY,
+    owner TEXT,
+    claimed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS inbound (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    audio_url TEXT NOT NULL,
+    queued_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_calls_completed_at ON calls (completed_at);
+CREATE INDEX IF NOT EXISTS idx_calls_created_at ON calls (created_at);
+"""
+
+class MemoryCallState:
+    """
+    Per-call state of the webhook server (audio assignment, callbacks seen, completion)
+    for a single server process.
+
+    assign() and audio_for() map a call to the audio it plays. first_callback() is True only
+    for the first delivery of a (call, callback source, SequenceNumber), so retried callbacks
+    are logged once. complete() is True for exactly one completed callback of a call, which is
+    the one allowed to free its slot and place the next call; claim() is the same for any key.
+    Finished calls are evicted `ttl` seconds after completing, and calls that never complete
+    after `max_age`, so the state stays bounded over long batches. Claims are never evicted
+    (one per server start), so a claimed key stays claimed however long the server runs.
+
+    push_inbound() queues the audio of a placed call until its inbound leg arrives, and
+    claim_inbound() hands it to whichever server process answers that leg.
+    """
+
+    def __init__(self, ttl=TTL_SEC, max_age=MAX_CALL_AGE_SEC, evict_every=EVICT_EVERY_SEC):
+        self.ttl = ttl
+        self.max_age = max_age
+        self.evict_every = evict_every
+        self.lock = threading.Lock()
+        self.calls = {}              # call_sid -> [audio_url, created_at, completed_at]
+        self.callbacks = {}          # call_sid -> {(source, sequence)}
+        self.claims = {}             # key -> claimed_at
+        self.inbound = deque()       # (audio_url, queued_at) of placed calls awaiting their inbound leg
+        self.evicted_at = time.time()
+
+    def _call(self, call_sid, now):
+        return self.calls.setdefault(call_sid, [None, now, None])
+
+    def assign(self, call_sid, audio_url):
+        now = time.time()
+        with self.lock:
+            self._call(call_sid, now)[0] = audio_url
+            self._maybe_evict(now)
+
+    def audio_for(self, call_sid):
+        with self.lock:
+            call = self.calls.get(call_sid)
+            return call[0] if call else None
+
+    def first_callback(self, call_sid, source, sequence):
+        # Callbacks without a SequenceNumber (e.g. AMD results) cannot be told apart from a retry
+        if sequence is None or sequence == "":
+            return True
+        now = time.time()
+        with self.lock:
+            self._call(call_sid, now)
+            seen = self.callbacks.setdefault(call_sid, set())
+            if (source, str(sequence)) in seen:
+                return False
+            seen.add((source, str(sequence)))
+            return True
+
+    def complete(self, call_sid):
+        now = time.time()
+        with self.lock:
+            call = self._call(call_sid, now)
+            if call[2] is not None:
+                return False
+            call[2] = now
+            self._maybe_evict(now)
+            return True
+
+    def completed(self, call_sids):
+        """The calls of call_sids that have had their completed callback."""
+        with self.lock:
+            return {sid for sid in call_sids if sid in self.calls and self.calls[sid][2] is not None}
+
+    def claim(self, key, owner=None):
+        now = time.time()
+        with self.lock:
+            if key in self.claims:
+                return False
+            self.claims[key] = now
+            return True
+
+    def push_inbound(self, audio_url):
+        with self.lock:
+            self.inbound.append((audio_url, time.time()))
+
+    def claim_inbound(self, audio_url=None):
+        """
+        Audio for an inbound leg. A leg that carries its own audio takes it off the queue;
+        the others get the oldest queued audio, or "" when none is waiting.
+        """
+        with self.lock:
+            if audio_url:
+                self._discard_inbound(audio_url)
+                return audio_url
+            return self.inbound.popleft()[0] if self.inbound else ""
+
+    def discard_inbound(self, audio_url):
+        """Drop a queued audio whose call ended without its inbound leg."""
+        with self.lock:
+            self._discard_inbound(audio_url)
+
+    def _discard_inbound(self, audio_url):
+        for i, (queued, _) in enumerate(self.inbound):
+            if queued == audio_url:
+                del self.inbound[i]
+                return
+
+    def _maybe_evict(self, now):
+        if now - self.evicted_at >= self.evict_every:
+            self._evict(now)
+
+    def _evict(self, now):
+        self.evicted_at = now
+        stale = [sid for sid, (_, created_at, completed_at) in self.calls.items()
+                 if (completed_at is not None and now - completed_at > self.ttl) or now - created_at > self.max_age]
+        for sid in stale:
+            del self.calls[sid]
+            self.callbacks.pop(sid, None)
+        while self.inbound and now - self.inbound[0][1] > self.max_age:
+            self.inbound.popleft()
+        return len(stale)
+
+    def evict(self):
+        """Forget the expired calls now; returns how many were dropped."""
+        with self.lock:
+            return self._evict(time.time())
+
+    def stats(self):
+        with self.lock:
+            return {
+                "calls": len(self.calls),
+                "completed": sum(1 for call in self.calls.values() if call[2] is not None),
+                "callbacks": sum(len(seen) for seen in self.callbacks.values()),
+                "awaiting_inbound": len(self.inbound),
+            }
+
+    def close(self):
+        pass
+
+class SqliteCallState:
+    """
+    The MemoryCallState interface over a SQLite database shared by every server process.
+
+    Each check-and-set is a single INSERT OR IGNORE or conditional UPDATE, so when several
+    workers get the same callback exactly one of them sees True. Each process opens its own
+    connection (also after a fork), and WAL mode lets readers run while a worker writes.
+    """
+
+    def __init__(self, db_path=CALL_STATE_DB, ttl=TTL_SEC, max_age=MAX_CALL_AGE_SEC, evict_every=EVICT_EVERY_SEC):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_age = max_age
+        self.evict_every = evict_every
+        self.lock = threading.Lock()
+        self.conn = None
+        self.pid = None
+        self.evicted_at = time.time()
+        with self.lock:
+            self._connection()
+
+    def _connection(self):
+        if self.pid != os.getpid():
+            # A connection must not be shared with a forked worker
+            self.conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.executescript(SCHEMA)
+            self.pid = os.getpid()
+        return self.conn
+
+    def _execute(self, sql, params=()):
+        with self.lock:
+            return self._connection().execute(sql, params)
+
+    def assign(self, call_sid, audio_url):
+        now = time.time()
+        self._execute("INSERT INTO calls (call_sid, audio_url, created_at) VALUES (?, ?, ?) "
+                      "ON CONFLICT (call_sid) DO UPDATE SET audio_url = excluded.audio_url", (call_sid, audio_url, now))
+        self._maybe_evict(now)
+
+    def audio_for(self, call_sid):
+        row = self._execute("SELECT audio_url FROM calls WHERE call_sid = ?", (call_sid,)).fetchone()
+        return row[0] if row else None
+
+    def first_callback(self, call_sid, source, sequence):
+        if sequence is None or sequence == "":
+            return True
+        cursor = self._execute("INSERT OR IGNORE INTO callbacks VALUES (?, ?, ?, ?)",
+                               (call_sid, source or "", str(sequence), time.time()))
+        return cursor.rowcount == 1
+
+    def complete(self, call_sid):
+        now = time.time()
+        # One statement either creates the call as completed or completes it if no one has yet
+        cursor = self._execute(
+            "INSERT INTO calls (call_sid, created_at, completed_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (call_sid) DO UPDATE SET completed_at = excluded.completed_at WHERE completed_at IS NULL",
+            (call_sid, now, now))
+        self._maybe_evict(now)
+        return cursor.rowcount == 1
+
+    def completed(self, call_sids):
+        call_sids = list(call_sids)
+        done = set()
+        for i in range(0, len(call_sids), 500):
+            chunk = call_sids[i:i + 500]
+            rows = self._execute(
+                f"SELECT call_sid FROM calls WHERE completed_at IS NOT NULL AND call_sid IN ({', '.join('?' * len(chunk))})",
+                chunk).fetchall()
+            done.update(row[0] for row in rows)
+        return done
+
+    def claim(self, key, owner=None):
+        cursor = self._execute("INSERT OR IGNORE INTO claims VALUES (?, ?, ?)",
+                               (key, owner or str(os.getpid()), time.time()))
+        return cursor.rowcount == 1
+
+    def push_inbound(self, audio_url):
+        self._execute("INSERT INTO inbound (audio_url, queued_at) VALUES (?, ?)", (audio_url, time.time()))
+
+    def claim_inbound(self, audio_url=None):
+        if audio_url:
+            self.discard_inbound(audio_url)
+            return audio_url
+        # Read and delete in one write transaction, so two workers never pop the same row
+        with self.lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT id, audio_url FROM inbound ORDER BY id LIMIT 1").fetchone()
+                if row is not None:
+                    conn.execute("DELETE FROM inbound WHERE id = ?", (row[0],))
+                conn.execute("COMMIT")
+            except sqlite3.Error:
+                conn.execute("ROLLBACK")
+                raise
+        return row[1] if row else ""
+
+    def discard_inbound(self, audio_url):
+        self._execute("DELETE FROM inbound WHERE id = (SELECT MIN(id) FROM inbound WHERE audio_url = ?)", (audio_url,))
+
+    def _maybe_evict(self, now):
+        if now - self.evicted_at >= self.evict_every:
+            self.evict()
+
+    def evict(self):
+        now = time.time()
+        self.evicted_at = now
+        with self.lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                stale = "SELECT call_sid FROM calls WHERE completed_at < ? OR created_at < ?"
+                params = (now - self.ttl, now - self.max_age)
+                conn.execute(f"DELETE FROM callbacks WHERE call_sid IN ({stale})", params)
+                dropped = conn.execute("DELETE FROM calls WHERE completed_at < ? OR created_at < ?", params).rowcount
+                conn.execute("DELETE FROM inbound WHERE queued_at < ?", (now - self.max_age,))
+                conn.execute("COMMIT")
+            except sqlite3.Error:
+                conn.execute("ROLLBACK")
+                raise
+        return dropped
+
+    def stats(self):
+        with self.lock:
+            conn = self._connection()
+            calls, completed = conn.execute("SELECT COUNT(*), COUNT(completed_at) FROM calls").fetchone()
+            callbacks = conn.execute("SELECT COUNT(*) FROM callbacks").fetchone()[0]
+            inbound = conn.execute("SELECT COUNT(*) FROM inbound").fetchone()[0]
+        return {"calls": calls, "completed": completed, "callbacks": callbacks, "awaiting_inbound": inbound}
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None and self.pid == os.getpid():
+                self.conn.close()
+            self.conn = None
+            self.pid = None
+
+BACKENDS = {"memory": MemoryCallState, "sqlite": SqliteCallState}
+
+def open_call_state(backend="memory", db_path=CALL_STATE_DB, ttl=TTL_SEC):
+    """The call state of the server: "memory" for one process, "sqlite" to share it between worker processes."""
+    if backend == "sqlite":
+        return SqliteCallState(db_path, ttl=ttl)
+    if backend == "memory":
+        return MemoryCallState(ttl=ttl)
+    raise ValueError(f"Unknown call state backend: {backend} (expected {', '.join(BACKENDS)})")
@@ -0,0 +1,168 @@
+import os
+import json
+import time
+import random
+import threading
+import concurrent.futures
+import requests
+
+# --- Config ---
+CHUNK_SIZE = 1 << 16
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+class DownloadResult:
+    def __init__(self, url, path, status, nbytes=0, seconds=0.0, error=None):
+        self.url = url
+        self.path = path
+        self.status = status      # downloaded, resumed, not_modified, cached or failed
+        self.nbytes = nbytes
+        self.seconds = seconds
+        self.error = error
+
+    def __repr__(self):
+        return f"DownloadResult({self.status}, {self.path}, {self.nbytes} bytes)"
+
+def create_session(concurrency=8):
+    """One pooled session shared by all download threads."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+_default_session = None
+_default_session_lock = threading.Lock()
+
+def default_session():
+    global _default_session
+    with _default_session_lock:
+        if _default_session is None:
+            _default_session = create_session()
+        return _default_session
+
+def _meta_path(path):
+    return path + ".meta.json"
+
+def _read_meta(path):
+    try:
+        with open(_meta_path(path)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def _write_meta(path, meta):
+    tmp = _meta_path(path) + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, _meta_path(path))
+
+def _validators(resp):
+    return {k: resp.headers[h] for k, h in (("etag", "ETag"), ("last_modified", "Last-Modified")) if h in resp.headers}
+
+def _fetch(session, url, path, revalidate, timeout):
+    """One attempt; returns (status, bytes written). Raises on retryable failures."""
+    part_path = path + ".part"
+    meta = _read_meta(path)
+    headers = {}
+
+    if os.path.exists(path):
+        if not revalidate or not meta:
+            return "cached", 0
+        if "etag" in meta:
+            headers["If-None-Match"] = meta["etag"]
+        if "last_modified" in meta:
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    if offset and meta.get("partial"):
+        headers["Range"] = f"bytes={offset}-"
+        # Only resume if the remote file is still the one the partial download came from
+        if "etag" in meta:
+            headers["If-Range"] = meta["etag"]
+        elif "last_modified" in meta:
+            headers["If-Range"] = meta["last_modified"]
+    else:
+        offset = 0
+
+    with session.get(url, headers=headers, stream=True, timeout=timeout) as resp:
+        if resp.status_code == 304:
+            return "not_modified", 0
+        if resp.status_code in RETRY_STATUS:
+            raise requests.HTTPError(f"{resp.status_code} {resp.reason}", response=resp)
+        if resp.status_code == 416:
+            # Range not satisfiable: the partial file is unusable, start over next attempt
+            os.remove(part_path)
+            raise requests.HTTPError("416 Range Not Satisfiable", response=resp)
+        resp.raise_for_status()
+
+        resumed = resp.status_code == 206
+        if not resumed:
+            offset = 0
+        _write_meta(path, {**_validators(resp), "url": url, "partial": True})
+
+        written = 0
+        with open(part_path, "ab" if resumed else "wb") as f:
+            for chunk in resp.iter_content(chunk_size=CHUNK_SIZE):
+                f.write(chunk)
+                written += len(chunk)
+
+        expected = resp.headers.get("Content-Length")
+        if expected is not None and written < int(expected):
+            raise requests.ConnectionError(f"Connection closed after {written} of {expected} bytes")
+
+    os.replace(part_path, path)
+    _write_meta(path, {**_validators(resp), "url": url, "size": offset + written})
+    return ("resumed" if resumed else "downloaded"), written
+
+def download(url, path, session=None, retries=4, backoff=0.5, revalidate=True, timeout=60):
+    """
+    Download url to path through a temporary .part file and an atomic rename.
+
+    Interrupted downloads resume with an HTTP Range request, existing files are revalidated
+    with their ETag/Last-Modified, and network errors or 429/5xx answers are retried with
+    exponential backoff.
+    """
+    session = session or default_session()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    start = time.perf_counter()
+    for attempt in range(retries + 1):
+        try:
+            status, nbytes = _fetch(session, url, path, revalidate, timeout)
+            return DownloadResult(url, path, status, nbytes, time.perf_counter() - start)
+        except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
+            response = getattr(e, "response", None)
+            retryable = response is None or response.status_code in RETRY_STATUS or response.status_code == 416
+            if attempt == retries or not retryable:
+                return DownloadResult(url, path, "failed", 0, time.perf_counter() - start, error=str(e))
+            time.sleep(backoff * 2 ** attempt * (1 + random.random()))
+
+def download_all(jobs, concurrency=8, **kwargs):
+    """Download (url, path) pairs with bounded concurrency over one pooled session and report throughput."""
+    jobs = list(jobs)
+    # Two jobs writing the same path would race on its .part file, fetch it once
+    urls = {}
+    for url, path in jobs:
+        if urls.setdefault(path, url) != url:
+            raise ValueError(f"{path} is the download path of both {urls[path]} and {url}")
+    unique = list(urls.items())
+    session = create_session(concurrency)
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        by_path = dict(zip(
+            (path for path, _ in unique),
+            executor.map(lambda job: download(job[1], job[0], session=session, **kwargs), unique),
+        ))
+    session.close()
+    results = [by_path[path] for _, path in jobs]
+    elapsed = time.perf_counter() - start
+
+    counts = {}
+    for result in by_path.values():
+        counts[result.status] = counts.get(result.status, 0) + 1
+        if result.status == "failed":
+            print(f"[ERROR] Could not download {result.url}: {result.error}")
+    total_bytes = sum(r.nbytes for r in by_path.values())
+    rate = total_bytes / elapsed / 1e6 if elapsed else 0.0
+    summary = ", ".join(f"{status}: {count}" for status, count in sorted(counts.items()))
+    print(f"[INFO] {len(by_path)} downloads in {elapsed:.2f}s ({summary}), {total_bytes / 1e6:.1f} MB at {rate:.2f} MB/s")
+    return results
@@ -0,0 +1,204 @@
+import os
+import struct
+import argparse
+import threading
+from collections import OrderedDict
+import numpy as np
+
+import segmentation
+from wav_io import WavReader
+
+# --- Config ---
+ENVELOPE_DIR = "envelopes"           # pyramids, one sub-folder per source folder
+MAGIC = b"AMDENV01"
+BASE_LEVEL = 4                       # finest stored level: min/max of 2**4 = 16 samples (2 ms at 8 kHz)
+TILE_BINS = 1024                     # min/max pairs per tile, whatever the level
+OPEN_PYRAMIDS = 64                   # pyramids kept open by a PyramidStore
+FILE_LOCKS = 64                      # builds of recordings hashing to different locks run in parallel
+
+# Header: magic, sample rate, frames, base level, number of stored levels;
+# then (offset, bins) of every stored level, then the levels as int16 (min, max) pairs
+HEADER = struct.Struct("<8sIQII")
+LEVEL_ENTRY = struct.Struct("<QQ")
+
+def envelope_dir_for(audio_dir, root=ENVELOPE_DIR):
+    """envelopes/left for channel_audio/left."""
+    return os.path.join(root, os.path.basename(os.path.normpath(audio_dir)))
+
+def quantize(y):
+    return np.round(np.clip(y, -1.0, 1.0) * 32767).astype(np.int16)
+
+def block_minmax(y, block):
+    """(ceil(len(y) / block), 2) float32 min and max of consecutive blocks of y."""
+    n = -(-len(y) // block)
+    padded = y
+    if n * block != len(y):
+        # The last partial block repeats its final sample, which changes neither its min nor its max
+        padded = np.concatenate((y, np.full(n * block - len(y), y[-1], dtype=y.dtype)))
+    frames = padded.reshape(n, block)
+    return np.column_stack((frames.min(axis=1), frames.max(axis=1)))
+
+def halve(level):
+    """Next coarser level: min of mins and max of maxes of pairs of bins."""
+    if len(level) % 2:
+        level = np.concatenate((level, level[-1:]))
+    pairs = level.reshape(-1, 2, 2)
+    return np.column_stack((pairs[:, :, 0].min(axis=1), pairs[:, :, 1].max(axis=1)))
+
+def build_pyramid(wav_path, out_path, base_level=BASE_LEVEL):
+    """
+    Write the envelope pyramid of a recording (channels mixed to mono): min/max of every
+    2**base_level samples, then of twice as many at each level up to a single tile.
+    """
+    audio = WavReader(wav_path)
+    block = 1 << base_level
+    chunk_frames = block << 16
+    base = [block_minmax(chunk, block) for chunk in audio.chunks(chunk_frames=chunk_frames) if len(chunk)]
+    levels = [quantize(np.concatenate(base)) if base else np.zeros((0, 2), dtype=np.int16)]
+    while len(levels[-1]) > TILE_BINS:
+        levels.append(halve(levels[-1]))
+
+    offset = HEADER.size + LEVEL_ENTRY.size * len(levels)
+    table = []
+    for level in levels:
+        table.append((offset, len(level)))
+        offset += level.nbytes
+    tmp_path = out_path + ".part"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, audio.sample_rate, audio.frames, base_level, len(levels)))
+        for entry in table:
+            f.write(LEVEL_ENTRY.pack(*entry))
+        for level in levels:
+            level.astype("<i2").tofile(f)
+    os.replace(tmp_path, out_path)
+    return out_path
+
+class EnvelopePyramid:
+    """
+    Memory-mapped envelope pyramid of one recording, served as tiles of TILE_BINS bins.
+
+    Level L has one (min, max) bin per 2**L samples. The levels from base_level up are read
+    from the pyramid file; the finer ones (down to single samples) are computed from the WAV
+    on demand, which is cheap since a tile then covers at most TILE_BINS * 2**base_level samples.
+    """
+
+    def __init__(self, path, wav_path):
+        self.path = path
+        self.wav_path = wav_path
+        with open(path, "rb") as f:
+            magic, self.sample_rate, self.frames, self.base_level, n_levels = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not an envelope pyramid")
+            table = [LEVEL_ENTRY.unpack(f.read(LEVEL_ENTRY.size)) for _ in range(n_levels)]
+        self.levels = [
+            np.memmap(path, dtype="<i2", mode="r", offset=offset, shape=(bins, 2)) if bins else np.zeros((0, 2), dtype="<i2")
+            for offset, bins in table
+        ]
+        self.version = f"{os.path.getmtime(path):.6f}-{os.path.getsize(path)}"
+        self.segments = None
+
+    @property
+    def max_level(self):
+        return self.base_level + len(self.levels) - 1
+
+    def info(self):
+        return {
+            "sample_rate": self.sample_rate,
+            "frames": self.frames,
+            "duration": self.frames / self.sample_rate if self.sample_rate else 0.0,
+            "base_level": self.base_level,
+            "max_level": self.max_level,
+            "tile_bins": TILE_BINS,
+        }
+
+    def bins(self, level):
+        return -(-self.frames // (1 << level))
+
+    def tile(self, level, index):
+        """(n, 2) int16 (min, max) bins [index * TILE_BINS, (index + 1) * TILE_BINS) of a level."""
+        if not 0 <= level <= self.max_level or index < 0:
+            raise ValueError(f"no level {level} tile {index}")
+        start = index * TILE_BINS
+        if level >= self.base_level:
+            return np.asarray(self.levels[level - self.base_level][start:start + TILE_BINS])
+        block = 1 << level
+        y = WavReader(self.wav_path).read(start * block, TILE_BINS * block)
+        if not len(y):
+            return np.zeros((0, 2), dtype=np.int16)
+        return quantize(block_minmax(y, block))
+
+    def speech_segments(self, threshold=0.03):
+        """segmentation.describe() of the recording, computed once."""
+        if self.segments is None:
+            audio = WavReader(self.wav_path)
+            y = audio.samples()
+            described = segmentation.describe(segmentation.segment(y, audio.sample_rate, threshold=threshold), audio.duration)
+            self.segments = {
+                "speech": [[float(s), float(e)] for s, e in described["speech"]],
+                "silence_gaps": [[float(s), float(e)] for s, e in described["silence_gaps"]],
+                "initial_silence": [float(t) for t in described["initial_silence"]],
+                "final_silence": [float(t) for t in described["final_silence"]],
+            }
+        return self.segments
+
+class PyramidStore:
+    """Pyramids of the recordings of audio_dir, built on first use and rebuilt when a recording changes."""
+
+    def __init__(self, audio_dir, envelope_dir=None, max_open=OPEN_PYRAMIDS):
+        self.audio_dir = audio_dir
+        self.envelope_dir = envelope_dir or envelope_dir_for(audio_dir)
+        self.max_open = max_open
+        self.open = OrderedDict()
+        self.lock = threading.Lock()
+        self.file_locks = [threading.Lock() for _ in range(FILE_LOCKS)]
+        os.makedirs(self.envelope_dir, exist_ok=True)
+
+    def recordings(self):
+        return sorted(os.path.splitext(f)[0] for f in os.listdir(self.audio_dir) if f.lower().endswith(".wav"))
+
+    def source_path(self, recording):
+        # Only plain file names, never a path out of the audio folder
+        if not recording or os.path.basename(recording) != recording:
+            return None
+        path = os.path.join(self.audio_dir, f"{recording}.wav")
+        return path if os.path.isfile(path) else None
+
+    def get(self, recording):
+        """EnvelopePyramid of a recording, or None when there is no such recording."""
+        src = self.source_path(recording)
+        if src is None:
+            return None
+        dst = os.path.join(self.envelope_dir, f"{recording}.env")
+        with self.lock:
+            pyramid = self.open.get(recording)
+            if pyramid is not None and os.path.getmtime(src) <= os.path.getmtime(pyramid.path):
+                self.open.move_to_end(recording)
+                return pyramid
+        # Concurrent requests for a new recording build its pyramid once
+        with self.file_locks[hash(recording) % len(self.file_locks)]:
+            if not os.path.exists(dst) or os.path.getmtime(dst) < os.path.getmtime(src):
+                build_pyramid(src, dst)
+            pyramid = EnvelopePyramid(dst, src)
+        with self.lock:
+            self.open[recording] = pyramid
+            self.open.move_to_end(recording)
+            while len(self.open) > self.max_open:
+                self.open.popitem(last=False)
+        return pyramid
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the envelope pyramids used by the waveform viewer")
+    parser.add_argument("--audio_dir", required=False, default="channel_audio/left", help="Folder with the recordings")
+    parser.add_argument("--envelope_dir", required=False, default=None, help="Where to write the pyramids (default: envelopes/<folder name>)")
+    args = parser.parse_args()
+
+    store = PyramidStore(args.audio_dir, args.envelope_dir)
+    total = 0
+    for recording in store.recordings():
+        pyramid = store.get(recording)
+        total += os.path.getsize(pyramid.path)
+        print(f"[OK] {recording}: levels {pyramid.base_level}-{pyramid.max_level}, {os.path.getsize(pyramid.path)} bytes")
+    print(f"Built {len(store.recordings())} pyramids in {store.envelope_dir}/ ({total / 2**20:.1f} MB)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+import os
+import csv
+import time
+import queue
+import sqlite3
+import argparse
+import threading
+
+# --- Config ---
+REPORTS_DIR = "reports"
+EVENTS_DB = os.path.join(REPORTS_DIR, "call_results.db")
+CALL_RESULTS_CSV = os.path.join(REPORTS_DIR, "call_results.csv")
+RETRY_MIN_SEC = 0.1           # backoff between attempts to commit a batch, doubled up to RETRY_MAX_SEC
+RETRY_MAX_SEC = 5.0
+CLOSE_RETRIES = 5             # attempts left once closing; then the batch is saved to the .unwritten.csv next to the database
+
+COLUMNS = [
+    "timestamp", "call_sid", "audio_url", "event_sequence",
+    "call_status", "answered_by", "callback_source", "variant"
+]
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS call_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    {", ".join(f"{c} TEXT" for c in COLUMNS)},
+    received_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_call_events_call_sid ON call_events (call_sid);
+CREATE INDEX IF NOT EXISTS idx_call_events_audio_url ON call_events (audio_url);
+"""
+
+def connect(db_path):
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    migrate(conn)
+    return conn
+
+def migrate(conn):
+    """Add the columns introduced after a database was created (e.g. variant)."""
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(call_events)")}
+    for column in COLUMNS:
+        if column not in existing:
+            conn.execute(f"ALTER TABLE call_events ADD COLUMN {column} TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_call_events_variant ON call_events (variant)")
+    conn.commit()
+
+class EventStore:
+    """
+    Call events backed by SQLite in WAL mode.
+
+    log() only enqueues the event, so request threads never touch the disk; a background
+    writer drains the bounded queue and commits the events in batches. When the queue is
+    full log() blocks instead of dropping events, and close() commits everything still queued.
+    A batch that fails to commit (e.g. the database is locked) is retried with backoff; if
+    it still fails while closing, it is appended to spill_path instead of being lost.
+    """
+
+    def __init__(self, db_path=EVENTS_DB, max_queue=10000, batch_size=500):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.spill_path = os.path.splitext(db_path)[0] + ".unwritten.csv"
+        self.conn = connect(db_path)
+        self.closed = False
+        self.lock = threading.Lock()          # no event can be queued after the closing sentinel
+        self.writer = threading.Thread(target=self._write_loop, name="event-store-writer", daemon=True)
+        self.writer.start()
+
+    def log(self, **event):
+        row = tuple(None if event.get(c) is None else str(event.get(c)) for c in COLUMNS)
+        with self.lock:
+            if self.closed:
+                raise RuntimeError("EventStore is closed")
+            self.queue.put(row + (time.time(),))
+
+    def flush(self):
+        """Block until every event logged so far is committed."""
+        self.queue.join()
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.queue.put(None)
+        self.writer.join()
+        self.conn.close()
+
+    def _write_loop(self):
+        insert = f"INSERT INTO call_events ({', '.join(COLUMNS)}, received_at) VALUES ({', '.join('?' * (len(COLUMNS) + 1))})"
+        while True:
+            batch = [self.queue.get()]
+            # Gather whatever else is already waiting, up to one batch
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            rows = [row for row in batch if row is not None]
+            try:
+                if rows:
+                    self._write(insert, rows)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+            if len(rows) < len(batch):
+                return
+
+    def _write(self, insert, rows):
+        delay = RETRY_MIN_SEC
+        attempts = 0
+        while True:
+            try:
+                with self.conn:
+                    self.conn.executemany(insert, rows)
+                return
+            except sqlite3.Error as e:
+                attempts += 1
+                if self.closed and attempts >= CLOSE_RETRIES:
+                    self._spill(rows)
+                    print(f"[ERROR] Could not write {len(rows)} call events: {e}; saved them to {self.spill_path}")
+                    return
+                print(f"[WARN] Could not write {len(rows)} call events: {e}; retrying in {delay:.1f}s")
+                time.sleep(delay)
+                delay = min(delay * 2, RETRY_MAX_SEC)
+
+    def _spill(self, rows):
+        new = not os.path.exists(self.spill_path)
+        with open(self.spill_path, "a", newline='') as csvfile:
+            writer = csv.writer(csvfile)
+            if new:
+                writer.writerow(COLUMNS + ["received_at"])
+            writer.writerows(rows)
+
+def export_csv(db_path=EVENTS_DB, csv_path=CALL_RESULTS_CSV):
+    """Write the events in the legacy reports/call_results.csv layout."""
+    conn = connect(db_path)
+    try:
+        cursor = conn.execute(f"SELECT {', '.join(COLUMNS)} FROM call_events ORDER BY id")
+        with open(csv_path, "w", newline='') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(COLUMNS)
+            count = 0
+            while True:
+                rows = cursor.fetchmany(10000)
+                if not rows:
+                    break
+                writer.writerows(rows)
+                count += len(rows)
+    finally:
+        conn.close()
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description="Call event store utilities")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export = subparsers.add_parser("export", help="Export the events to the call_results.csv layout")
+    export.add_argument("--db", required=False, default=EVENTS_DB, help="SQLite event database")
+    export.add_argument("--out", required=False, default=CALL_RESULTS_CSV, help="CSV file to write")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        count = export_csv(args.db, args.out)
+        print(f"Exported {count} events from {args.db} to {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+import os
+import csv
+import json
+import time
+import random
+import sqlite3
+import argparse
+import itertools
+import threading
+
+from automated_amd_call import CONFIG_FILE, load_config, config_label
+from call_orchestrator import CallJob
+
+# --- Config ---
+REPORTS_DIR = "reports"
+EXPERIMENTS_DB = os.path.join(REPORTS_DIR, "experiments.db")
+AUDIO_CSV = "recording_urls.csv"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS experiments (
+    name TEXT PRIMARY KEY,
+    spec TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS variants (
+    experiment TEXT NOT NULL,
+    variant TEXT NOT NULL,
+    config TEXT NOT NULL,
+    PRIMARY KEY (experiment, variant)
+);
+CREATE TABLE IF NOT EXISTS trials (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    experiment TEXT NOT NULL,
+    variant TEXT NOT NULL,
+    audio_url TEXT NOT NULL,
+    repeat INTEGER NOT NULL DEFAULT 0,
+    position INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    call_sid TEXT,
+    answered_by TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    placed_at REAL,
+    finished_at REAL,
+    UNIQUE (experiment, variant, audio_url, repeat)
+);
+CREATE INDEX IF NOT EXISTS idx_trials_queue ON trials (experiment, status, position);
+CREATE INDEX IF NOT EXISTS idx_trials_call_sid ON trials (call_sid);
+"""
+
+def load_audio_urls(csv_file=AUDIO_CSV):
+    with open(csv_file, newline='') as f:
+        return [row["Audio"] for row in csv.DictReader(f)]
+
+def expand_variants(spec, base_config):
+    """
+    {variant name: full AMD config} from an experiment spec, which lists its variants
+    explicitly ({"variants": {"fast": {...overrides}}}) and/or as a parameter matrix
+    ({"matrix": {"MachineDetectionSpeechThreshold": [2400, 3000], ...}}).
+    """
+    variants = {}
+    for name, overrides in spec.get("variants", {}).items():
+        variants[name] = {**base_config, **overrides}
+    matrix = spec.get("matrix", {})
+    if matrix:
+        keys = sorted(matrix)
+        for values in itertools.product(*(matrix[k] for k in keys)):
+            config = {**base_config, **dict(zip(keys, values))}
+            variants[config_label(config)] = config
+    if not variants:
+        variants[config_label(base_config)] = dict(base_config)
+    return variants
+
+def interleave(audio_urls, variants, repeats=1, seed=0):
+    """
+    (variant, audio_url, repeat) in call order. Each recording is run under every variant
+    back to back, in a random variant order, so slow drift of the network or the carrier
+    affects all the variants alike.
+    """
+    rng = random.Random(seed)
+    order = []
+    for repeat in range(repeats):
+        urls = list(audio_urls)
+        rng.shuffle(urls)
+        for audio_url in urls:
+            names = list(variants)
+            rng.shuffle(names)
+            order.extend((name, audio_url, repeat) for name in names)
+    return order
+
+class ExperimentScheduler:
+    """
+    Matrix of AMD variants x recordings persisted in SQLite.
+
+    Every (variant, recording) pair is a trial that moves from pending to placed to done.
+    The queue and the checkpoints survive a crash or a restart: trials that were placed by a
+    process that is gone are put back in the queue, and a restarted run resumes with the first
+    trial that is not done. Calls carry their experiment, variant and trial id in the query
+    string of their callback URLs.
+    """
+
+    def __init__(self, db_path=EXPERIMENTS_DB):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def create(self, spec, audio_urls, base_config):
+        """Register an experiment; adding variants or recordings to an existing one only adds their trials."""
+        name = spec["name"]
+        variants = expand_variants(spec, base_config)
+        order = interleave(audio_urls, variants, spec.get("repeats", 1), spec.get("seed", 0))
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR IGNORE INTO experiments VALUES (?, ?, ?)", (name, json.dumps(spec), time.time()))
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO variants VALUES (?, ?, ?)",
+                [(name, variant, json.dumps(config)) for variant, config in variants.items()])
+            start = self.conn.execute("SELECT COALESCE(MAX(position) + 1, 0) FROM trials WHERE experiment = ?", (name,)).fetchone()[0]
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO trials (experiment, variant, audio_url, repeat, position) VALUES (?, ?, ?, ?, ?)",
+                [(name, variant, audio_url, repeat, start + i) for i, (variant, audio_url, repeat) in enumerate(order)])
+        return variants
+
+    def resume(self, experiment):
+        """Put the trials left placed by a previous run back in the queue; returns how many."""
+        with self.lock, self.conn:
+            return self.conn.execute(
+                "UPDATE trials SET status = 'pending' WHERE experiment = ? AND status = 'placed'", (experiment,)).rowcount
+
+    def pending_jobs(self, experiment):
+        """CallJobs of the trials still to run, in call order."""
+        with self.lock:
+            configs = {variant: json.loads(config) for variant, config in self.conn.execute(
+                "SELECT variant, config FROM variants WHERE experiment = ?", (experiment,))}
+            rows = self.conn.execute(
+                "SELECT id, variant, audio_url FROM trials WHERE experiment = ? AND status = 'pending' ORDER BY position",
+                (experiment,)).fetchall()
+        return [
+            CallJob(audio_url, configs[variant], {"experiment": experiment, "variant": variant, "trial": trial_id})
+            for trial_id, variant, audio_url in rows
+        ]
+
+    def placed(self, trial_id, call_sid, placed_at=None):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE trials SET status = 'placed', call_sid = ?, placed_at = ?, attempts = attempts + 1 "
+                "WHERE id = ? AND status != 'done'", (call_sid, placed_at or time.time(), trial_id))
+
+    def answered(self, trial_id, answered_by):
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE trials SET answered_by = ? WHERE id = ?", (answered_by, trial_id))
+
+    def completed(self, trial_id):
+        """Checkpoint a finished trial; duplicate completed callbacks are harmless."""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE trials SET status = 'done', finished_at = ? WHERE id = ? AND status != 'done'", (time.time(), trial_id))
+
+    def progress(self, experiment):
+        """{variant: {status: count}} plus the AnsweredBy counts of the finished trials."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT variant, status, answered_by, COUNT(*) FROM trials WHERE experiment = ? GROUP BY variant, status, answered_by",
+                (experiment,)).fetchall()
+        summary = {}
+        for variant, status, answered_by, count in rows:
+            entry = summary.setdefault(variant, {"pending": 0, "placed": 0, "done": 0, "answered_by": {}})
+            entry[status] += count
+            if status == "done" and answered_by:
+                entry["answered_by"][answered_by] = entry["answered_by"].get(answered_by, 0) + count
+        return summary
+
+    def export_csv(self, experiment, csv_path):
+        """One row per trial, tagged with its variant and AMD parameters."""
+        with self.lock:
+            configs = {variant: json.loads(config) for variant, config in self.conn.execute(
+                "SELECT variant, config FROM variants WHERE experiment = ?", (experiment,))}
+            rows = self.conn.execute(
+                "SELECT id, variant, audio_url, repeat, status, call_sid, answered_by, attempts, placed_at, finished_at "
+                "FROM trials WHERE experiment = ? ORDER BY position", (experiment,)).fetchall()
+        params = ["MachineDetectionSpeechThreshold", "MachineDetectionSpeechEndThreshold",
+                  "MachineDetectionSilenceTimeout", "MachineDetectionTimeout"]
+        with open(csv_path, "w", newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(["trial", "variant", "audio_url", "repeat", "status", "call_sid", "answered_by",
+                             "attempts", "placed_at", "finished_at"] + params)
+            for row in rows:
+                writer.writerow(list(row) + [configs.get(row[1], {}).get(p) for p in params])
+        return len(rows)
+
+def load_spec(path):
+    with open(path) as f:
+        spec = json.load(f)
+    spec.setdefault("name", os.path.splitext(os.path.basename(path))[0])
+    return spec
+
+def print_progress(scheduler, experiment):
+    for variant, entry in sorted(scheduler.progress(experiment).items()):
+        total = entry["pending"] + entry["placed"] + entry["done"]
+        outcomes = ", ".join(f"{k}: {v}" for k, v in sorted(entry["answered_by"].items()))
+        print(f"  {variant}: {entry['done']}/{total} done, {entry['placed']} placed  {outcomes}")
+
+def main():
+    parser = argparse.ArgumentParser(description="AMD experiment matrix: variants x recordings, resumable")
+    parser.add_argument("command", choices=["init", "status", "export"])
+    parser.add_argument("spec", help="Experiment JSON: name, variants and/or matrix, repeats, seed")
+    parser.add_argument("--audio_csv", required=False, default=AUDIO_CSV, help="Recordings to run under every variant")
+    parser.add_argument("--config", required=False, default=CONFIG_FILE, help="Base AMD configuration the variants override")
+    parser.add_argument("--db", required=False, default=EXPERIMENTS_DB)
+    args = parser.parse_args()
+
+    spec = load_spec(args.spec)
+    scheduler = ExperimentScheduler(args.db)
+    if args.command == "init":
+        variants = scheduler.create(spec, load_audio_urls(args.audio_csv), load_config(args.config))
+        print(f"Experiment {spec['name']}: {len(variants)} variants ({', '.join(variants)})")
+    elif args.command == "export":
+        out = os.path.join(REPORTS_DIR, f"experiment_{spec['name']}.csv")
+        count = scheduler.export_csv(spec["name"], out)
+        print(f"Exported {count} trials to {out}")
+    print_progress(scheduler, spec["name"])
+    scheduler.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+import os
+import uuid
+import time
+import argparse
+import concurrent.futures
+import numpy as np
+
+import segmentation
+from wav_io import WavReader, sample_scale
+
+# --- Config ---
+INPUT_DIR = "channel_audio/left"
+OUTPUT_DIR = "features"
+FRAME_MS = 20                 # analysis frame for the fused pass
+CHUNK_FRAMES = 3000           # frames processed at once (one minute at 20 ms)
+THRESHOLD = 0.03              # speech threshold, relative to the recording peak
+
+# Beep/tone detection: a single dominant frequency held for a while, as in voicemail beeps
+TONE_RATIO = 0.6              # share of the frame power in the dominant bin and its neighbours
+TONE_MIN_HZ = 300
+TONE_MAX_HZ = 3000
+TONE_MIN_SEC = 0.15
+TONE_MAX_DRIFT_HZ = 60        # frequency change allowed between frames of the same tone
+
+def fused_frame_pass(y, sr, frame_length, chunk_frames=CHUNK_FRAMES):
+    """
+    One pass over the float32 frames of y computing, for every frame: peak, mean absolute
+    amplitude, energy, zero crossings, spectral flatness, dominant frequency and tone ratio.
+    An integer view of a WAV file is converted to float32 one chunk at a time.
+    """
+    scale = np.float32(sample_scale(y))
+    frames = segmentation.frame_view(y, frame_length)
+    n = len(frames)
+    out = {name: np.zeros(n, dtype=np.float32) for name in
+           ("peak", "mean_abs", "energy", "zero_crossings", "flatness", "dominant_hz", "tone_ratio")}
+    window = np.hanning(frame_length).astype(np.float32)
+    freqs = np.fft.rfftfreq(frame_length, 1 / sr).astype(np.float32)
+    eps = np.float32(1e-12)
+
+    for start in range(0, n, chunk_frames):
+        chunk = frames[start:start + chunk_frames]
+        if chunk.dtype != np.float32:
+            chunk = chunk.astype(np.float32) * scale
+        sl = slice(start, start + len(chunk))
+        abs_chunk = np.abs(chunk)
+        out["peak"][sl] = abs_chunk.max(axis=1)
+        out["mean_abs"][sl] = abs_chunk.mean(axis=1)
+        out["energy"][sl] = np.einsum("ij,ij->i", chunk, chunk) / frame_length
+        out["zero_crossings"][sl] = np.count_nonzero(np.diff(np.signbit(chunk), axis=1), axis=1)
+
+        power = np.abs(np.fft.rfft(chunk * window, axis=1)) ** 2 + eps
+        total = power.sum(axis=1)
+        out["flatness"][sl] = np.exp(np.log(power).mean(axis=1)) / (total / power.shape[1])
+        dominant = power.argmax(axis=1)
+        # Window leakage spreads a pure tone over the neighbouring bins
+        padded = np.pad(power, ((0, 0), (1, 1)))
+        rows = np.arange(len(chunk))
+        peak_power = padded[rows, dominant] + padded[rows, dominant + 1] + padded[rows, dominant + 2]
+        out["tone_ratio"][sl] = peak_power / total
+        out["dominant_hz"][sl] = freqs[dominant]
+    return out
+
+def detect_tones(frame_stats, frame_sec, voiced):
+    """Runs of voiced frames holding one dominant frequency; returns (start sec, duration sec, freq hz) tuples."""
+    hz = frame_stats["dominant_hz"]
+    tonal = (voiced & (frame_stats["tone_ratio"] > TONE_RATIO)
+             & (hz >= TONE_MIN_HZ) & (hz <= TONE_MAX_HZ))
+    # Split runs wherever the frequency jumps
+    steady = np.concatenate(([True], np.abs(np.diff(hz)) <= TONE_MAX_DRIFT_HZ))
+    starts_run = tonal & ~(np.concatenate(([False], tonal[:-1])) & steady)
+    run_ids = np.cumsum(starts_run) * tonal
+    tones = []
+    if run_ids.max(initial=0) == 0:
+        return tones
+    lengths = np.bincount(run_ids)[1:]
+    first = np.flatnonzero(starts_run)
+    for run_start, length in zip(first, lengths):
+        if length * frame_sec >= TONE_MIN_SEC:
+            tones.append((run_start * frame_sec, length * frame_sec, float(np.median(hz[run_start:run_start + length]))))
+    return tones
+
+def compute_features(file_path, threshold=THRESHOLD):
+    audio = WavReader(file_path)
+    y, sr = audio.samples(), audio.sample_rate
+    frame_length = max(1, int(sr * FRAME_MS / 1000))
+    frame_sec = frame_length / sr
+    duration = len(y) / sr
+    stats = fused_frame_pass(y, sr, frame_length)
+
+    # Normalization is folded into the thresholds instead of dividing a copy of y
+    peak = float(stats["peak"].max()) if len(stats["peak"]) else 0.0
+    speech = segmentation.intervals_from_levels(stats["peak"], frame_sec, duration, threshold, peak)
+    voiced = segmentation.hysteresis(stats["peak"], threshold * peak, threshold * segmentation.OFF_RATIO * peak) if peak else np.zeros(len(stats["peak"]), bool)
+
+    energy_db = 10 * np.log10(stats["energy"] + 1e-12)
+    tones = detect_tones(stats, frame_sec, voiced)
+    first_tone = tones[0] if tones else (np.nan, 0.0, np.nan)
+    speech_time = float((speech[:, 1] - speech[:, 0]).sum()) if len(speech) else 0.0
+
+    return {
+        "file_path": file_path,
+        "filename": os.path.basename(file_path),
+        "sample_rate": sr,
+        "duration_sec": duration,
+        "initial_silence_sec": speech[0, 0] if len(speech) else 0.0,
+        "first_utterance_sec": speech[0, 1] - speech[0, 0] if len(speech) else 0.0,
+        "speech_alternations": len(speech),
+        "speech_ratio": speech_time / duration if duration else 0.0,
+        "mean_amp": float(stats["mean_abs"].mean() / peak) if peak else 0.0,
+        "max_amp": 1.0 if peak else 0.0,
+        "zcr": float(stats["zero_crossings"].mean() / frame_length) if len(stats["peak"]) else 0.0,
+        "energy_db_mean": float(energy_db.mean()) if len(energy_db) else np.nan,
+        "energy_db_std": float(energy_db.std()) if len(energy_db) else np.nan,
+        "energy_db_p95": float(np.percentile(energy_db, 95)) if len(energy_db) else np.nan,
+        "speech_energy_db": float(energy_db[voiced].mean()) if voiced.any() else np.nan,
+        "spectral_flatness": float(stats["flatness"][voiced].mean()) if voiced.any() else np.nan,
+        "beep_count": len(tones),
+        "beep_start_sec": first_tone[0],
+        "beep_duration_sec": first_tone[1],
+        "beep_freq_hz": first_tone[2],
+    }
+
+def _safe_compute(file_path):
+    try:
+        return compute_features(file_path), None
+    except Exception as e:
+        return None, f"{file_path}: {e}"
+
+class ParquetPartWriter:
+    """
+    Appends rows to a Parquet dataset directory as small part files, each written to a
+    temporary name and renamed, so a crash only loses the rows of the unfinished part.
+    """
+
+    def __init__(self, output_dir, batch_size=256):
+        self.output_dir = output_dir
+        self.batch_size = batch_size
+        self.rows = []
+        self.parts = 0
+        os.makedirs(output_dir, exist_ok=True)
+
+    def append(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        import pandas as pd
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pandas(pd.DataFrame(self.rows), preserve_index=False)
+        name = f"part-{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}.parquet"
+        tmp_path = os.path.join(self.output_dir, "." + name + ".tmp")
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, os.path.join(self.output_dir, name))
+        self.parts += 1
+        self.rows = []
+
+def load_features(output_dir=OUTPUT_DIR, columns=None):
+    """All the finished feature rows of a dataset directory as one DataFrame."""
+    import pandas as pd
+
+    parts = sorted(f for f in os.listdir(output_dir) if f.endswith(".parquet")) if os.path.isdir(output_dir) else []
+    if not parts:
+        return pd.DataFrame(columns=columns)
+    return pd.concat((pd.read_parquet(os.path.join(output_dir, p), columns=columns) for p in parts), ignore_index=True)
+
+def run(file_paths, output_dir=OUTPUT_DIR, workers=None, batch_size=256):
+    done = set(load_features(output_dir, columns=["file_path"])["file_path"])
+    todo = [p for p in file_paths if p not in done]
+    print(f"{len(file_paths)} recordings, {len(done & set(file_paths))} already in {output_dir}/, {len(todo)} to process")
+
+    writer = ParquetPartWriter(output_dir, batch_size)
+    start = time.perf_counter()
+    processed = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        # chunksize amortizes the inter-process overhead on large corpora
+        for features, error in executor.map(_safe_compute, todo, chunksize=16):
+            if error:
+                print(f"[ERROR] {error}")
+                continue
+            writer.append(features)
+            processed += 1
+            if processed % 1000 == 0:
+                print(f"[INFO] {processed}/{len(todo)} recordings ({processed / (time.perf_counter() - start):.1f}/s)")
+    writer.flush()
+    elapsed = time.perf_counter() - start
+    print(f"[OK] Extracted features for {processed} recordings in {elapsed:.1f}s into {writer.parts} new part files")
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel feature extraction into a Parquet dataset")
+    parser.add_argument("--input_dir", required=False, default=INPUT_DIR, help="Name of input folder with the recordings to analyze")
+    parser.add_argument("--output_dir", required=False, default=OUTPUT_DIR, help="Parquet dataset directory")
+    parser.add_argument("--workers", required=False, type=int, default=None, help="Number of worker processes (default: one per CPU)")
+    parser.add_argument("--batch_size", required=False, type=int, default=256, help="Rows per Parquet part file")
+    args = parser.parse_args()
+
+    file_paths = sorted(
+        os.path.join(root, f)
+        for root, _, files in os.walk(args.input_dir)
+        for f in files if f.lower().endswith(".wav")
+    )
+    run(file_paths, args.output_dir, args.workers, args.batch_size)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+import os
+import csv
+import time
+import sqlite3
+import argparse
+import concurrent.futures
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+
+import segmentation
+from wav_io import WavReader
+
+# --- Config ---
+INPUT_DIR = "channel_audio/left"
+INDEX_DB = os.path.join("reports", "greeting_index.db")
+CLUSTERS_CSV = os.path.join("reports", "greeting_clusters.csv")
+CSV_FILE = "recording_urls.csv"
+REDUCED_CSV = "recording_urls_reduced.csv"
+AUDIO_COL = "Audio"
+
+ONSET_SEARCH_SEC = 30         # the greeting is aligned on the first speech within this much audio
+ONSET_THRESHOLD = 0.1          # of the peak; higher than the segmentation default so line noise is not taken for the greeting
+WINDOW_SEC = 8.0              # greeting length fingerprinted from the onset
+FRAME_SEC = 0.064
+TIME_BINS = 32                # 0.25 s per bin: a few frames of misalignment do not change the hash
+BANDS = 16                    # log-spaced between BAND_MIN_HZ and BAND_MAX_HZ (telephone band)
+BAND_MIN_HZ = 200
+BAND_MAX_HZ = 3400
+FLOOR_DB = 30                 # band energies more than this below the loudest are clamped, so line noise in pauses does not count
+BITS = 256                    # signature length
+LSH_BANDS = 64                # bands of BAND_BITS for the lookup table: each bit is in 4 of them, in a different order
+BAND_BITS = 16
+MAX_DISTANCE = 40             # Hamming distance of near-duplicate signatures (about 0.85 cosine)
+SEED = 20240601
+MAX_EXEMPLARS = 16            # members of other clusters a recording is compared to per LSH bucket
+
+PROJECTIONS = np.random.default_rng(SEED).standard_normal((BITS, TIME_BINS * BANDS)).astype(np.float32)
+# 16 disjoint bands only share one with a copy MAX_DISTANCE bits away 2 times out of 3; with
+# every bit in 4 bands of shuffled bits, a lookup finds it about 99% of the time.
+_shuffle = np.random.default_rng(SEED + 1)
+BAND_ORDER = np.concatenate([np.arange(BITS)] + [_shuffle.permutation(BITS) for _ in range(LSH_BANDS * BAND_BITS // BITS - 1)])
+BAND_ORDER = BAND_ORDER.reshape(LSH_BANDS, BAND_BITS)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS recordings (
+    recording TEXT PRIMARY KEY,
+    signature BLOB NOT NULL,
+    onset REAL,
+    size INTEGER,
+    mtime_ns INTEGER,
+    indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS lsh (
+    band INTEGER NOT NULL,
+    value INTEGER NOT NULL,
+    recording TEXT NOT NULL,
+    PRIMARY KEY (band, value, recording)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_lsh_recording ON lsh (recording);
+"""
+
+def band_energies(y, sr):
+    """(TIME_BINS, BANDS) log band energies of y, averaged over 0.25 s bins."""
+    n = max(16, int(sr * FRAME_SEC))
+    frames = len(y) // n
+    out = np.full((TIME_BINS, BANDS), -FLOOR_DB, dtype=np.float32)
+    if frames == 0:
+        return out
+    spectrum = np.abs(np.fft.rfft(y[:frames * n].reshape(frames, n) * np.hanning(n).astype(np.float32), axis=1)) ** 2
+    freqs = np.fft.rfftfreq(n, 1 / sr)
+    edges = np.geomspace(BAND_MIN_HZ, min(BAND_MAX_HZ, sr / 2), BANDS + 1)
+    band_of = np.searchsorted(edges, freqs, side="right") - 1
+    to_bands = (band_of[:, None] == np.arange(BANDS)[None, :]).astype(np.float32)
+    energy = spectrum @ to_bands
+    # Frames into time bins of the fixed-length window
+    bin_of = (np.arange(frames) * FRAME_SEC / WINDOW_SEC * TIME_BINS).astype(int)
+    keep = bin_of < TIME_BINS
+    binned = np.zeros((TIME_BINS, BANDS))
+    np.add.at(binned, bin_of[keep], energy[keep])
+    db = 10 * np.log10(binned + 1e-12)
+    db = np.maximum(db, db.max() - FLOOR_DB)
+    out[:] = db - db.max()
+    return out
+
+def signature_of(features):
+    """BITS-bit SimHash of the band energies: similar greetings get signatures a small Hamming distance apart."""
+    v = features - features.mean(axis=0, keepdims=True)   # per-band mean removal: gain and line colour
+    norm = np.linalg.norm(v)
+    if norm < 1e-6:
+        return bytes(BITS // 8)
+    return np.packbits(PROJECTIONS @ (v.ravel() / norm) > 0).tobytes()
+
+def fingerprint(path):
+    """(signature bytes, onset seconds) of the greeting of a recording."""
+    audio = WavReader(path)
+    sr = audio.sample_rate
+    head = audio.read(0, int(sr * ONSET_SEARCH_SEC))
+    speech = segmentation.segment(head, sr, threshold=ONSET_THRESHOLD) if len(head) else np.zeros((0, 2))
+    onset = float(speech[0, 0]) if len(speech) else 0.0
+    y = audio.read(int(onset * sr), int(sr * WINDOW_SEC))
+    return signature_of(band_energies(y, sr)), onset
+
+def _safe_fingerprint(path):
+    try:
+        signature, onset = fingerprint(path)
+        return path, signature, onset, None
+    except Exception as e:
+        return path, None, None, f"{path}: {e}"
+
+def lsh_values(signature):
+    """The LSH_BANDS integer band values of a signature."""
+    bits = np.unpackbits(np.frombuffer(signature, dtype=np.uint8))
+    return [int.from_bytes(band, "big") for band in np.packbits(bits[BAND_ORDER], axis=1)]
+
+def distance(a, b):
+    return (int.from_bytes(a, "big") ^ int.from_bytes(b, "big")).bit_count()
+
+class UnionFind:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, x):
+        root = self.parent.setdefault(x, x)
+        while root != self.parent[root]:
+            root = self.parent[root]
+        while x != root:
+            self.parent[x], x = root, self.parent[x]
+        return root
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+class GreetingIndex:
+    """
+    On-disk index of greeting fingerprints with locality-sensitive hashing.
+
+    Each signature is stored with its LSH_BANDS band values in a (band, value) keyed table,
+    so a lookup reads the few recordings that share a band with the query instead of
+    scanning the corpus, and then keeps those within max_distance bits. An index stored
+    with other bands is re-banded when opened.
+    """
+
+    def __init__(self, db_path=INDEX_DB):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        bands = self.conn.execute("SELECT MAX(band) + 1 FROM lsh").fetchone()[0]
+        if bands is not None and bands != LSH_BANDS:
+            self.rebuild_lsh()
+
+    def rebuild_lsh(self):
+        print(f"[INFO] Re-banding {len(self)} greeting fingerprints into {LSH_BANDS} LSH bands")
+        with self.conn:
+            self.conn.execute("DELETE FROM lsh")
+            for recording, signature in self.signatures().items():
+                self.conn.executemany("INSERT OR IGNORE INTO lsh VALUES (?, ?, ?)",
+                                      [(band, value, recording) for band, value in enumerate(lsh_values(signature))])
+
+    def close(self):
+        self.conn.close()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM recordings").fetchone()[0]
+
+    def add(self, entries):
+        """Store (recording, signature, onset, size, mtime_ns) entries, replacing older versions."""
+        now = time.time()
+        with self.conn:
+            for recording, signature, onset, size, mtime_ns in entries:
+                self.conn.execute("DELETE FROM lsh WHERE recording = ?", (recording,))
+                self.conn.execute("INSERT OR REPLACE INTO recordings VALUES (?, ?, ?, ?, ?, ?)",
+                                  (recording, signature, onset, size, mtime_ns, now))
+                self.conn.executemany("INSERT OR IGNORE INTO lsh VALUES (?, ?, ?)",
+                                      [(band, value, recording) for band, value in enumerate(lsh_values(signature))])
+
+    def remove(self, recordings):
+        with self.conn:
+            for recording in recordings:
+                self.conn.execute("DELETE FROM lsh WHERE recording = ?", (recording,))
+                self.conn.execute("DELETE FROM recordings WHERE recording = ?", (recording,))
+
+    def versions(self):
+        """{recording: (size, mtime_ns)} of the indexed recordings."""
+        return {r: (size, mtime) for r, size, mtime in self.conn.execute("SELECT recording, size, mtime_ns FROM recordings")}
+
+    def update(self, input_dir=INPUT_DIR, workers=None, prune=True):
+        """Fingerprint the new and changed recordings of input_dir; returns (indexed, unchanged, removed)."""
+        indexed = self.versions()
+        todo, present = [], set()
+        for name in sorted(os.listdir(input_dir)):
+            if not name.lower().endswith(".wav"):
+                continue
+            recording = os.path.splitext(name)[0]
+            present.add(recording)
+            stat = os.stat(os.path.join(input_dir, name))
+            if indexed.get(recording) != (stat.st_size, stat.st_mtime_ns):
+                todo.append((recording, os.path.join(input_dir, name), stat.st_size, stat.st_mtime_ns))
+        removed = [r for r in indexed if r not in present] if prune else []
+        self.remove(removed)
+
+        by_path = {path: (recording, size, mtime) for recording, path, size, mtime in todo}
+        batch = []
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            for path, signature, onset, error in executor.map(_safe_fingerprint, list(by_path), chunksize=16):
+                if error:
+                    print(f"[ERROR] {error}")
+                    continue
+                recording, size, mtime = by_path[path]
+                batch.append((recording, signature, onset, size, mtime))
+                if len(batch) >= 1000:
+                    self.add(batch)
+                    batch = []
+        self.add(batch)
+        return len(todo), len(present) - len(todo), len(removed)
+
+    def signatures(self):
+        return dict(self.conn.execute("SELECT recording, signature FROM recordings"))
+
+    def lookup(self, signature, max_distance=MAX_DISTANCE):
+        """[(distance, recording)] of the indexed greetings within max_distance bits of a signature, nearest first."""
+        values = lsh_values(signature)
+        where = " OR ".join(["(band = ? AND value = ?)"] * LSH_BANDS)
+        params = [p for band, value in enumerate(values) for p in (band, value)]
+        rows = self.conn.execute(
+            f"SELECT recording, signature FROM recordings WHERE recording IN (SELECT recording FROM lsh WHERE {where})",
+            params).fetchall()
+        return sorted((d, r) for r, s in rows if (d := distance(signature, s)) <= max_distance)
+
+    def clusters(self, max_distance=MAX_DISTANCE):
+        """
+        {recording: cluster id} of near-duplicate greetings (single linkage). Recordings are
+        only compared within the LSH buckets they share, and to at most MAX_EXEMPLARS
+        members of other clusters per bucket, so a large cluster of identical greetings
+        costs linear time.
+        """
+        signatures = self.signatures()
+        groups = UnionFind()
+        bucket = {}
+        for band, value, recording in self.conn.execute("SELECT band, value, recording FROM lsh ORDER BY band, value, recording"):
+            bucket.setdefault((band, value), []).append(recording)
+        for members in bucket.values():
+            exemplars = []
+            for recording in members:
+                groups.find(recording)
+                matched = False
+                for exemplar in exemplars:
+                    if groups.find(exemplar) == groups.find(recording):
+                        matched = True
+                        continue
+                    if distance(signatures[recording], signatures[exemplar]) <= max_distance:
+                        groups.union(recording, exemplar)
+                        matched = True
+                if not matched and len(exemplars) < MAX_EXEMPLARS:
+                    exemplars.append(recording)
+        roots = {}
+        return {r: roots.setdefault(groups.find(r), len(roots)) for r in sorted(signatures)}
+
+def representatives(members, signatures, count=1, sample=200):
+    """
+    Up to `count` recordings standing in for a cluster: the medoid (on a sample of the
+    members), then the members farthest from the ones already picked.
+    """
+    pool = members if len(members) <= sample else [members[i] for i in np.linspace(0, len(members) - 1, sample).astype(int)]
+    if len(pool) == 1:
+        return pool[:]
+    dist = np.array([[distance(signatures[a], signatures[b]) for b in pool] for a in pool])
+    picked = [int(dist.sum(axis=1).argmin())]
+    while len(picked) < min(count, len(pool)):
+        nearest = dist[:, picked].min(axis=1)
+        if nearest.max() == 0:
+            break
+        picked.append(int(nearest.argmax()))
+    return [pool[i] for i in picked]
+
+def reduce_corpus(index, max_distance=MAX_DISTANCE, per_cluster=1):
+    """Rows (recording, cluster, cluster_size, representative, weight) for every indexed recording."""
+    signatures = index.signatures()
+    cluster_of = index.clusters(max_distance)
+    members = {}
+    for recording, cluster in cluster_of.items():
+        members.setdefault(cluster, []).append(recording)
+    rows = []
+    for cluster, recordings in members.items():
+        reps = set(representatives(recordings, signatures, per_cluster))
+        # Each representative stands for its share of the cluster in the weighted analytics
+        weight = len(recordings) / len(reps)
+        for recording in recordings:
+            rows.append({
+                "recording": recording,
+                "cluster": cluster,
+                "cluster_size": len(recordings),
+                "representative": int(recording in reps),
+                "weight": weight if recording in reps else 0.0,
+            })
+    return rows
+
+def write_reduced_csv(rows, csv_file=CSV_FILE, out_csv=REDUCED_CSV, column=AUDIO_COL):
+    """The rows of the URL CSV that play a representative, or a recording that was not fingerprinted."""
+    status = {row["recording"]: row["representative"] for row in rows}
+    kept = total = 0
+    with open(csv_file, newline='') as f, open(out_csv, "w", newline='') as out:
+        reader = csv.DictReader(f)
+        writer = csv.DictWriter(out, fieldnames=reader.fieldnames)
+        writer.writeheader()
+        for row in reader:
+            total += 1
+            recording = parse_qs(urlparse(row.get(column) or "").query).get("recording", [None])[0]
+            if status.get(recording, 1):
+                writer.writerow(row)
+                kept += 1
+    return kept, total
+
+def main():
+    parser = argparse.ArgumentParser(description="Greeting fingerprints: index the recordings, cluster near-duplicates and write a reduced test list")
+    parser.add_argument("command", choices=["index", "cluster", "lookup"])
+    parser.add_argument("files", nargs="*", help="Recordings to look up (lookup)")
+    parser.add_argument("--input_dir", required=False, default=INPUT_DIR, help="Folder with the recordings to fingerprint")
+    parser.add_argument("--db", required=False, default=INDEX_DB, help="Fingerprint index")
+    parser.add_argument("--max_distance", required=False, type=int, default=MAX_DISTANCE, help=f"Bits (of {BITS}) two near-duplicate greetings may differ by")
+    parser.add_argument("--per_cluster", required=False, type=int, default=1, help="Representatives kept per cluster")
+    parser.add_argument("--csv", required=False, default=CSV_FILE, help="Recording URLs to reduce")
+    parser.add_argument("--out_csv", required=False, default=REDUCED_CSV, help="Reduced recording URLs")
+    parser.add_argument("--clusters", required=False, default=CLUSTERS_CSV, help="Cluster and weight of every recording")
+    parser.add_argument("--workers", required=False, type=int, default=None, help="Number of worker processes (default: one per CPU)")
+    args = parser.parse_args()
+
+    index = GreetingIndex(args.db)
+    if args.command == "lookup":
+        for path in args.files:
+            signature, onset = fingerprint(path)
+            matches = index.lookup(signature, args.max_distance)
+            print(f"{path} (greeting at {onset:.2f}s): {len(matches)} near-duplicates")
+            for d, recording in matches[:20]:
+                print(f"  {recording}\t{d} bits")
+        index.close()
+        return
+
+    start = time.perf_counter()
+    indexed, unchanged, removed = index.update(args.input_dir, args.workers)
+    print(f"[OK] Indexed {indexed} recordings ({unchanged} unchanged, {removed} removed) in {time.perf_counter() - start:.1f}s, {len(index)} in {args.db}")
+    if args.command == "cluster":
+        rows = reduce_corpus(index, args.max_distance, args.per_cluster)
+        os.makedirs(os.path.dirname(args.clusters) or ".", exist_ok=True)
+        with open(args.clusters, "w", newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=["recording", "cluster", "cluster_size", "representative", "weight"])
+            writer.writeheader()
+            writer.writerows(rows)
+        clusters = len({row["cluster"] for row in rows})
+        print(f"{len(rows)} recordings in {clusters} clusters, {sum(row['representative'] for row in rows)} representatives; saved to {args.clusters}")
+        if os.path.exists(args.csv):
+            kept, total = write_reduced_csv(rows, args.csv, args.out_csv)
+            print(f"Saved {kept} of {total} calls to {args.out_csv}")
+    index.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+import os
+import json
+import time
+import uuid
+import base64
+import sqlite3
+import argparse
+import numpy as np
+import pandas as pd
+from urllib.parse import urlparse, parse_qs
+
+from wav_io import WavReader, ulaw_encode
+from streaming_amd import StreamingAmdPredictor, SAMPLE_RATE, FRAME_MS
+
+# --- Config ---
+CONFIG_FILE = "amd_config.json"
+EVENTS_DB = os.path.join("reports", "call_results.db")
+REPLAY_CSV = os.path.join("reports", "streaming_amd.csv")
+FRAME_BYTES = SAMPLE_RATE * FRAME_MS // 1000
+
+def ulaw_frames(path):
+    """The recording as 20 ms mu-law payloads, as Twilio would stream it."""
+    audio = WavReader(path)
+    if audio.sample_rate == SAMPLE_RATE:
+        y = audio.float32()
+    else:
+        import librosa
+        y, _ = librosa.load(path, sr=SAMPLE_RATE)
+    payload = ulaw_encode(y).tobytes()
+    return [payload[i:i + FRAME_BYTES] for i in range(0, len(payload), FRAME_BYTES)]
+
+def recording_name(audio_url):
+    """Recording file name (without .wav) from a logged audio_url, full URL or bare name."""
+    if not audio_url:
+        return ""
+    return parse_qs(urlparse(audio_url).query).get("recording", [audio_url])[0]
+
+def twilio_verdicts(events_db=EVENTS_DB):
+    """Last AnsweredBy reported by Twilio for every recording in the event store."""
+    if not os.path.exists(events_db):
+        return {}
+    conn = sqlite3.connect(events_db)
+    try:
+        rows = conn.execute(
+            "SELECT audio_url, answered_by FROM call_events WHERE answered_by IS NOT NULL AND answered_by != '' "
+            "AND (callback_source IS NULL OR callback_source != 'media-stream-predictor') ORDER BY id"
+        ).fetchall()
+    finally:
+        conn.close()
+    return {recording_name(url): answered_by for url, answered_by in rows}
+
+def verdict_class(answered_by):
+    if not answered_by:
+        return None
+    if answered_by == "human":
+        return "human"
+    if answered_by.startswith("machine") or answered_by == "fax":
+        return "machine"
+    return "unknown"
+
+def replay_offline(path, config):
+    """Run the predictor in-process, as fast as possible; measures the pure processing cost."""
+    predictor = StreamingAmdPredictor(config)
+    for payload in ulaw_frames(path):
+        if predictor.feed_ulaw(payload):
+            break
+    if predictor.verdict is None:
+        predictor.finish()
+    return predictor.stats()
+
+def replay_stream(path, url, speed=1.0, timeout=10.0):
+    """Stream a recording to a Media Streams endpoint; speed 1.0 is real time, 0 as fast as possible."""
+    import simple_websocket
+
+    stream_sid = "MZ" + uuid.uuid4().hex
+    name = os.path.splitext(os.path.basename(path))[0]
+    frames = ulaw_frames(path)
+    ws = simple_websocket.Client.connect(url)
+    result = {"answered_by": None, "decision_time": None, "decided_after_sec": None, "frames": len(frames)}
+
+    def check_mark(wait=0):
+        message = ws.receive(timeout=wait)
+        if message:
+            data = json.loads(message)
+            if data.get("event") == "mark" and data["mark"]["name"].startswith("amd:"):
+                _, answered_by, decision_time = data["mark"]["name"].split(":")
+                result.update(answered_by=answered_by, decision_time=float(decision_time),
+                              decided_after_sec=time.perf_counter() - started)
+                return True
+        return False
+
+    try:
+        ws.send(json.dumps({"event": "connected", "protocol": "Call", "version": "1.0.0"}))
+        ws.send(json.dumps({
+            "event": "start", "streamSid": stream_sid,
+            "start": {
+                "streamSid": stream_sid, "callSid": "CA" + uuid.uuid4().hex, "tracks": ["inbound"],
+                "customParameters": {"audio": name},
+                "mediaFormat": {"encoding": "audio/x-mulaw", "sampleRate": SAMPLE_RATE, "channels": 1},
+            },
+        }))
+        started = time.perf_counter()
+        for chunk, payload in enumerate(frames, start=1):
+            ws.send(json.dumps({
+                "event": "media", "streamSid": stream_sid,
+                "media": {"track": "inbound", "chunk": str(chunk), "timestamp": str(chunk * FRAME_MS),
+                          "payload": base64.b64encode(payload).decode()},
+            }))
+            if check_mark():
+                break
+            if speed:
+                # Keep the stream on the real-time schedule (scaled by speed)
+                delay = started + chunk * FRAME_MS / 1000 / speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+        if result["answered_by"] is None:
+            ws.send(json.dumps({"event": "stop", "streamSid": stream_sid, "stop": {}}))
+            deadline = time.perf_counter() + timeout
+            while result["answered_by"] is None and time.perf_counter() < deadline:
+                check_mark(wait=0.1)
+    finally:
+        ws.close()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recordings through the streaming AMD predictor")
+    parser.add_argument("--input_dir", required=False, default="channel_audio/left", help="Name of input folder with the recordings to replay")
+    parser.add_argument("--url", required=False, default="ws://localhost:5000/media-stream", help="Media Streams WebSocket endpoint of server.py")
+    parser.add_argument("--speed", required=False, type=float, default=1.0, help="1.0 for real time, 4.0 for 4x, 0 for as fast as possible")
+    parser.add_argument("--offline", action="store_true", help="Run the predictor in-process instead of streaming to the server")
+    parser.add_argument("--config", required=False, default=CONFIG_FILE, help="AMD configuration used by the offline predictor")
+    parser.add_argument("--events_db", required=False, default=EVENTS_DB, help="Event store with the Twilio verdicts to compare against")
+    parser.add_argument("--out", required=False, default=REPLAY_CSV, help="CSV file with one row per recording")
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        config = json.load(f)
+    twilio = twilio_verdicts(args.events_db)
+    wav_files = sorted(f for f in os.listdir(args.input_dir) if f.lower().endswith(".wav"))
+    print(f"Replaying {len(wav_files)} recordings from {args.input_dir}/ ({'offline' if args.offline else args.url})")
+
+    rows = []
+    for wav in wav_files:
+        path = os.path.join(args.input_dir, wav)
+        name = os.path.splitext(wav)[0]
+        try:
+            result = replay_offline(path, config) if args.offline else replay_stream(path, args.url, args.speed)
+        except Exception as e:
+            print(f"[ERROR] {wav}: {e}")
+            continue
+        row = {"recording": name, **result, "twilio_answered_by": twilio.get(name)}
+        row["agrees"] = (verdict_class(row["answered_by"]) == verdict_class(row["twilio_answered_by"])) if row["twilio_answered_by"] else None
+        rows.append(row)
+        decision = f"{row['decision_time']:.2f}s" if row["decision_time"] is not None else "-"
+        print(f"{name}: {row['answered_by']} at {decision} (Twilio: {row['twilio_answered_by'] or '-'})")
+
+    df = pd.DataFrame(rows)
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    df.to_csv(args.out, index=False)
+    if len(df):
+        decided = df["decision_time"].dropna()
+        compared = df["agrees"].dropna()
+        print(f"Median time to decision: {decided.median():.2f}s of audio (p90 {np.percentile(decided, 90):.2f}s)" if len(decided) else "No decisions")
+        if "mean_frame_us" in df:
+            print(f"Processing cost: {df['mean_frame_us'].mean():.1f}us/frame mean, {df['p99_frame_us'].max():.1f}us worst p99")
+        if len(compared):
+            print(f"Agreement with Twilio: {compared.mean():.1%} over {len(compared)} recordings")
+    print(f"Saved results to {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+import os
+import csv
+import time
+import argparse
+import concurrent.futures
+import numpy as np
+
+import segmentation
+from wav_io import WavReader
+
+# --- Config ---
+LEFT_DIR = "channel_audio/left"       # callee
+RIGHT_DIR = "channel_audio/right"     # our side: the <Say>/<Play> of the call
+CALLS_CSV = os.path.join("reports", "overlap_calls.csv")
+INTERVALS_CSV = os.path.join("reports", "overlap_intervals.csv")
+THRESHOLD = 0.03                      # speech threshold, relative to the peak of each channel
+MIN_TALKOVER_SEC = 0.2                # shorter overlaps are backchannel or echo, not talk-over
+
+CALL_COLUMNS = [
+    "recording", "base", "duration_sec", "left_speech_sec", "right_speech_sec",
+    "left_first_speech", "right_first_speech", "overlap_sec", "overlaps", "overlap_ratio",
+    "talkovers_by_left", "talkovers_by_right", "first_talkover_at", "right_starts_during_left",
+    "right_response_gaps", "right_response_gap_mean", "right_response_gap_min",
+    "left_response_gaps", "left_response_gap_mean", "left_response_gap_min",
+]
+# Interval kinds in the per-call tables
+KINDS = ("left", "right", "overlap", "talkover_left", "talkover_right")
+
+def intersect(a, b):
+    """
+    Intersections of two sorted lists of disjoint [start, end) intervals, as (k, 2) times
+    with the (k,) indices of the intervals of a and b they come from. Vectorized: every
+    interval of a is paired with the range of intervals of b it can overlap (searchsorted),
+    so the cost is O((n + m) log(n + m) + k) instead of n * m.
+    """
+    empty = np.zeros((0, 2)), np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    if not len(a) or not len(b):
+        return empty
+    first = np.searchsorted(b[:, 1], a[:, 0], side="right")    # first b ending after a starts
+    last = np.searchsorted(b[:, 0], a[:, 1], side="left")      # b starting before a ends
+    counts = np.maximum(last - first, 0)
+    if not counts.sum():
+        return empty
+    ia = np.repeat(np.arange(len(a)), counts)
+    # Offsets 0..count-1 within each a interval's range of b
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    ib = first[ia] + offsets
+    starts = np.maximum(a[ia, 0], b[ib, 0])
+    ends = np.minimum(a[ia, 1], b[ib, 1])
+    keep = ends > starts
+    return np.column_stack((starts[keep], ends[keep])), ia[keep], ib[keep]
+
+def response_gaps(first, second):
+    """
+    Turn-taking gaps from `first` to `second`: for every interval of second that starts in
+    silence, the time since the last interval of first ended, if first spoke last.
+    """
+    if not len(first) or not len(second):
+        return np.zeros(0)
+    # Last interval of first that ended at or before each start of second
+    before = np.searchsorted(first[:, 1], second[:, 0], side="right") - 1
+    # Last interval of second that ended before each start of second (the previous turn of second)
+    previous = np.concatenate(([-np.inf], second[:-1, 1]))
+    valid = before >= 0
+    first_end = np.where(valid, first[np.clip(before, 0, None), 1], -np.inf)
+    # A turn: first spoke after second's previous interval, and second does not start inside first's speech
+    inside = np.searchsorted(first[:, 0], second[:, 0], side="right") - 1
+    starts_in_speech = (inside >= 0) & (first[np.clip(inside, 0, None), 1] > second[:, 0])
+    turn = valid & (first_end > previous) & ~starts_in_speech
+    return second[turn, 0] - first_end[turn]
+
+def analyze_pair(job):
+    """(call row, {kind: (k, 2) intervals}) of one recording from its left and right channel files."""
+    base, left_path, right_path, threshold, min_talkover = job
+    left_audio, right_audio = WavReader(left_path), WavReader(right_path)
+    if left_audio.sample_rate != right_audio.sample_rate:
+        raise ValueError(f"{base}: channels at {left_audio.sample_rate} and {right_audio.sample_rate} Hz")
+    # Aligned views of the two channels, cut to the shorter one
+    frames = min(left_audio.frames, right_audio.frames)
+    left = segmentation.segment(left_audio.samples()[:frames], left_audio.sample_rate, threshold=threshold)
+    right = segmentation.segment(right_audio.samples()[:frames], right_audio.sample_rate, threshold=threshold)
+    overlap, il, ir = intersect(left, right)
+
+    # The side whose interval started later talked over the other one
+    lengths = overlap[:, 1] - overlap[:, 0]
+    long_enough = lengths >= min_talkover
+    by_left = long_enough & (left[il, 0] > right[ir, 0])
+    by_right = long_enough & (right[ir, 0] >= left[il, 0])
+    right_gaps = response_gaps(left, right)
+    left_gaps = response_gaps(right, left)
+    left_sec = float((left[:, 1] - left[:, 0]).sum())
+    right_sec = float((right[:, 1] - right[:, 0]).sum())
+    talkovers = overlap[long_enough]
+    # The README race: our message starts while the callee is still greeting
+    right_start = right[0, 0] if len(right) else None
+    during = right_start is not None and bool(((left[:, 0] < right_start) & (left[:, 1] > right_start)).any())
+
+    row = {
+        "recording": f"{base}_left",
+        "base": base,
+        "duration_sec": frames / left_audio.sample_rate if left_audio.sample_rate else 0.0,
+        "left_speech_sec": left_sec,
+        "right_speech_sec": right_sec,
+        "left_first_speech": float(left[0, 0]) if len(left) else None,
+        "right_first_speech": float(right_start) if right_start is not None else None,
+        "overlap_sec": float(lengths.sum()),
+        "overlaps": len(overlap),
+        "overlap_ratio": float(lengths.sum() / min(left_sec, right_sec)) if min(left_sec, right_sec) > 0 else 0.0,
+        "talkovers_by_left": int(by_left.sum()),
+        "talkovers_by_right": int(by_right.sum()),
+        "first_talkover_at": float(talkovers[0, 0]) if len(talkovers) else None,
+        "right_starts_during_left": int(during),
+        "right_response_gaps": len(right_gaps),
+        "right_response_gap_mean": float(right_gaps.mean()) if len(right_gaps) else None,
+        "right_response_gap_min": float(right_gaps.min()) if len(right_gaps) else None,
+        "left_response_gaps": len(left_gaps),
+        "left_response_gap_mean": float(left_gaps.mean()) if len(left_gaps) else None,
+        "left_response_gap_min": float(left_gaps.min()) if len(left_gaps) else None,
+    }
+    intervals = {"left": left, "right": right, "overlap": overlap,
+                 "talkover_left": overlap[by_left], "talkover_right": overlap[by_right]}
+    return row, intervals
+
+def _safe_analyze(job):
+    try:
+        row, intervals = analyze_pair(job)
+        return row, intervals, None
+    except Exception as e:
+        return None, None, f"{job[0]}: {e}"
+
+def channel_pairs(left_dir=LEFT_DIR, right_dir=RIGHT_DIR):
+    """[(base, left path, right path)] of the recordings split into both channel folders."""
+    pairs = []
+    for name in sorted(os.listdir(left_dir)):
+        if not name.lower().endswith("_left.wav"):
+            continue
+        base = name[:-len("_left.wav")]
+        right_path = os.path.join(right_dir, f"{base}_right.wav")
+        if os.path.exists(right_path):
+            pairs.append((base, os.path.join(left_dir, name), right_path))
+    return pairs
+
+def run(pairs, calls_csv=CALLS_CSV, intervals_csv=INTERVALS_CSV, threshold=THRESHOLD, min_talkover=MIN_TALKOVER_SEC, workers=None):
+    """Analyze every pair on a process pool, streaming the call rows and interval tables to CSV."""
+    for path in (calls_csv, intervals_csv):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    jobs = [(base, left, right, threshold, min_talkover) for base, left, right in pairs]
+    done = failed = 0
+    with open(calls_csv, "w", newline='') as calls_file, open(intervals_csv, "w", newline='') as intervals_file, \
+            concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        calls = csv.DictWriter(calls_file, fieldnames=CALL_COLUMNS)
+        calls.writeheader()
+        intervals = csv.writer(intervals_file)
+        intervals.writerow(["recording", "kind", "start", "end"])
+        # chunksize amortizes the inter-process overhead on large corpora
+        for row, tables, error in executor.map(_safe_analyze, jobs, chunksize=16):
+            if error:
+                print(f"[ERROR] {error}")
+                failed += 1
+                continue
+            calls.writerow({k: round(v, 3) if isinstance(v, float) else v for k, v in row.items()})
+            for kind in KINDS:
+                intervals.writerows((row["recording"], kind, f"{s:.3f}", f"{e:.3f}") for s, e in tables[kind])
+            done += 1
+    return done, failed
+
+def main():
+    parser = argparse.ArgumentParser(description="Overlap, talk-over and response gaps between the two channels of every call")
+    parser.add_argument("--left_dir", required=False, default=LEFT_DIR, help="Callee channel files (<name>_left.wav)")
+    parser.add_argument("--right_dir", required=False, default=RIGHT_DIR, help="Our channel files (<name>_right.wav)")
+    parser.add_argument("--threshold", required=False, type=float, default=THRESHOLD, help="Speech threshold relative to the peak of each channel")
+    parser.add_argument("--min_talkover", required=False, type=float, default=MIN_TALKOVER_SEC, help="Shortest overlap counted as talk-over (seconds)")
+    parser.add_argument("--calls_csv", required=False, default=CALLS_CSV, help="One row per call")
+    parser.add_argument("--intervals_csv", required=False, default=INTERVALS_CSV, help="Speech, overlap and talk-over intervals of every call")
+    parser.add_argument("--workers", required=False, type=int, default=None, help="Number of worker processes (default: one per CPU)")
+    args = parser.parse_args()
+
+    pairs = channel_pairs(args.left_dir, args.right_dir)
+    print(f"{len(pairs)} recordings with both channels")
+    start = time.perf_counter()
+    done, failed = run(pairs, args.calls_csv, args.intervals_csv, args.threshold, args.min_talkover, args.workers)
+    elapsed = time.perf_counter() - start
+    print(f"[OK] Analyzed {done} calls ({failed} failed) in {elapsed:.1f}s ({done / elapsed if elapsed else 0:.0f} calls/s)")
+    print(f"Saved {args.calls_csv} and {args.intervals_csv}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+import os
+import csv
+import json
+import time
+import glob
+import hashlib
+import sqlite3
+import argparse
+import concurrent.futures
+
+# --- Config ---
+PIPELINE_DB = os.path.join("reports", "pipeline.db")
+TIMING_JSON = os.path.join("reports", "pipeline_timing.json")
+DIRS = {
+    "left": "channel_audio/left",
+    "right": "channel_audio/right",
+    "segments": "artifacts/segments",
+    "features": "artifacts/features",
+    "analysis": "channel_analysis",
+    "waveforms_full": "waveforms_full",
+    "waveforms_59s": "waveforms_59s",
+}
+FEATURES_CSV = "machine_features.csv"
+DEFAULT_PARAMS = {"threshold": 0.03, "silence_gap_min": 0.4, "silence_gap_max": 2.5, "max_duration": 59}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    stage TEXT NOT NULL,
+    item TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    outputs TEXT NOT NULL,
+    seconds REAL,
+    built_at REAL NOT NULL,
+    PRIMARY KEY (stage, item)
+);
+"""
+
+# --- Stage tasks (run in worker processes) ---
+def run_split(inputs, outputs, params):
+    """Left/right channel files of a stereo recording; a mono recording becomes its own left channel."""
+    from wav_io import map_frames
+    from split_audio_channels import write_channel
+    from pathlib import Path
+
+    info, frames = map_frames(inputs["source"]["wav"])
+    channels = (0, 1) if info.channels == 2 else (0, 0)
+    for channel, key in zip(channels, ("left", "right")):
+        write_channel(frames[:, channel], Path(outputs[key]), info)
+
+def run_segment(inputs, outputs, params):
+    from wav_io import WavReader
+    from channel_visualization import find_segments
+
+    audio = WavReader(inputs["split"]["left"])
+    segments = find_segments(audio.samples(), audio.sample_rate, params["threshold"],
+                             params["silence_gap_min"], params["silence_gap_max"])
+    result = {
+        "duration": float(segments["duration"]),
+        "speech": [[float(s), float(e)] for s, e in segments["speech"]],
+        "silence_gaps": [[float(s), float(e)] for s, e in segments["silence_gaps"]],
+        "initial_silence": [float(t) for t in segments["initial_silence"]],
+        "utterance": [float(t) for t in segments["utterance"]],
+        "final_silence": [float(t) for t in segments["final_silence"]],
+    }
+    _write_json(outputs["json"], result)
+
+def run_features(inputs, outputs, params):
+    from audio_feature_extractor import extract_features
+
+    features = {k: float(v) for k, v in extract_features(inputs["source"]["wav"]).items()}
+    _write_json(outputs["json"], features)
+
+def run_plot(inputs, outputs, params):
+    """The channel_visualization PNG, drawn from the segments of the segment stage instead of segmenting again."""
+    import waveform_render
+    from wav_io import WavReader
+
+    with open(inputs["segment"]["json"]) as f:
+        segments = json.load(f)
+    audio = WavReader(inputs["split"]["left"])
+    title = f"AMD-style Analysis of Call\n{os.path.basename(inputs['split']['left'])}"
+    waveform_render.render_waveform(audio.samples(), audio.sample_rate, outputs["png"], title, figsize=(15, 5),
+                                    spans=waveform_render.analysis_spans(segments))
+
+def run_waveforms(inputs, outputs, params):
+    """The waveform_mapping_tool plots: the whole call and its first max_duration seconds."""
+    from waveform_render import render_waveform
+    from wav_io import WavReader
+
+    audio = WavReader(inputs["source"]["wav"])
+    y = audio.samples()
+    render_waveform(y, audio.sample_rate, outputs["full"], "Full Call Waveform", figsize=(14, 4))
+    render_waveform(y, audio.sample_rate, outputs["first"], f"Waveform (First {params['max_duration']}s)",
+                    figsize=(14, 4), max_duration=params["max_duration"])
+
+def _write_json(path, data):
+    tmp_path = path + ".part"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+class Stage:
+    """One step of the per-recording DAG: its upstream stages, the parameters it depends on and its outputs."""
+
+    def __init__(self, name, deps, func, outputs, params=(), version=1):
+        self.name = name
+        self.deps = deps
+        self.func = func
+        self.outputs = outputs
+        self.params = params
+        self.version = version
+
+# Bump a stage's version when its code changes what it writes, to rebuild its artifacts
+STAGES = [
+    Stage("split", ["source"], run_split,
+          lambda name, dirs: {"left": os.path.join(dirs["left"], f"{name}_left.wav"),
+                              "right": os.path.join(dirs["right"], f"{name}_right.wav")}),
+    Stage("segment", ["split"], run_segment,
+          lambda name, dirs: {"json": os.path.join(dirs["segments"], f"{name}.json")},
+          params=("threshold", "silence_gap_min", "silence_gap_max")),
+    Stage("features", ["source"], run_features,
+          lambda name, dirs: {"json": os.path.join(dirs["features"], f"{name}.json")}),
+    Stage("plot", ["split", "segment"], run_plot,
+          lambda name, dirs: {"png": os.path.join(dirs["analysis"], f"analysis_{name}_left.png")}),
+    Stage("waveforms", ["source"], run_waveforms,
+          lambda name, dirs: {"full": os.path.join(dirs["waveforms_full"], f"{name}.png"),
+                              "first": os.path.join(dirs["waveforms_59s"], f"{name}_59s.png")},
+          params=("max_duration",)),
+]
+STAGE_NAMES = [stage.name for stage in STAGES]
+
+def _run_task(job):
+    stage_name, item, inputs, outputs, params = job
+    stage = next(s for s in STAGES if s.name == stage_name)
+    start = time.perf_counter()
+    try:
+        stage.func(inputs, outputs, params)
+        return stage_name, item, time.perf_counter() - start, None
+    except Exception as e:
+        return stage_name, item, time.perf_counter() - start, f"{type(e).__name__}: {e}"
+
+def fingerprint(*parts):
+    return hashlib.sha1(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+# --- Sources ---
+def local_sources(source_dir):
+    """{recording: (wav path, fingerprint)} of a folder; a file is identified by its size and modification time."""
+    sources = {}
+    for path in sorted(glob.glob(os.path.join(source_dir, "*.wav"))):
+        stat = os.stat(path)
+        sources[os.path.splitext(os.path.basename(path))[0]] = (path, f"{stat.st_size}-{stat.st_mtime_ns}")
+    return sources
+
+def downloaded_sources(csv_file):
+    """{recording: (cached wav path, content sha256)} of the URLs of a CSV, fetched through the recording cache."""
+    from recording_cache import RecordingCache, csv_urls, recording_key
+
+    urls = csv_urls(csv_file)
+    paths = RecordingCache().fetch_all(urls)
+    return {recording_key(url): (path, os.path.splitext(os.path.basename(path))[0]) for url, path in paths.items()}
+
+class Pipeline:
+    """
+    Incremental runner of the per-recording DAG source -> split -> segment -> plot,
+    source -> features and source -> waveforms.
+
+    Every artifact is keyed by a fingerprint of its stage (name and version), the parameters
+    it depends on and the fingerprints of its inputs, starting from the content hash (or
+    size and mtime) of the recording. Only artifacts whose fingerprint changed or whose
+    outputs are missing are rebuilt. Ready tasks of every stage and recording share one
+    process pool, so independent stages and files run in parallel.
+    """
+
+    def __init__(self, db_path=PIPELINE_DB, dirs=DIRS, params=None, stages=STAGE_NAMES):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.executescript(SCHEMA)
+        self.dirs = dirs
+        self.params = {**DEFAULT_PARAMS, **(params or {})}
+        # A requested stage brings in the stages it depends on
+        wanted = set(stages)
+        for stage in reversed(STAGES):
+            if stage.name in wanted:
+                wanted.update(d for d in stage.deps if d != "source")
+        self.stages = [stage for stage in STAGES if stage.name in wanted]
+        for path in dirs.values():
+            os.makedirs(path, exist_ok=True)
+
+    def close(self):
+        self.conn.close()
+
+    def plan(self, sources):
+        """{(stage, item): task} for every artifact, each with its fingerprint, inputs, outputs and whether it is stale."""
+        stored = {(stage, item): fp for stage, item, fp in self.conn.execute("SELECT stage, item, fingerprint FROM artifacts")}
+        tasks = {}
+        for item, (path, source_fp) in sources.items():
+            done = {"source": {"fingerprint": source_fp, "outputs": {"wav": path}}}
+            for stage in self.stages:
+                fp = fingerprint(stage.name, stage.version, {p: self.params[p] for p in stage.params},
+                                 [done[d]["fingerprint"] for d in stage.deps])
+                outputs = stage.outputs(item, self.dirs)
+                stale = stored.get((stage.name, item)) != fp or not all(os.path.exists(p) for p in outputs.values())
+                done[stage.name] = {"fingerprint": fp, "outputs": outputs}
+                tasks[(stage.name, item)] = {
+                    "stage": stage, "item": item, "fingerprint": fp, "outputs": outputs, "stale": stale,
+                    "inputs": {d: done[d]["outputs"] for d in stage.deps},
+                    "deps": [(d, item) for d in stage.deps if d != "source"],
+                }
+        return tasks
+
+    def run(self, sources, workers=None, dry_run=False):
+        """Build the stale artifacts; returns {stage: timing}."""
+        tasks = self.plan(sources)
+        timing = {stage.name: {"built": 0, "fresh": 0, "failed": 0, "skipped": 0, "task_seconds": 0.0,
+                               "first_start": None, "last_end": None} for stage in self.stages}
+        for task in tasks.values():
+            if not task["stale"]:
+                timing[task["stage"].name]["fresh"] += 1
+        if dry_run:
+            for (stage, item), task in tasks.items():
+                if task["stale"]:
+                    print(f"[STALE] {stage} {item}")
+            return timing
+
+        # Stale tasks wait for their stale dependencies; a finished task only looks at its own dependents
+        unfinished = {key: sum(1 for d in task["deps"] if tasks[d]["stale"]) for key, task in tasks.items() if task["stale"]}
+        dependents = {}
+        for key in unfinished:
+            for d in tasks[key]["deps"]:
+                dependents.setdefault(d, []).append(key)
+        started_at = {}
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            running = {}
+
+            def submit(key):
+                task = tasks[key]
+                started_at[key] = time.time()
+                first = timing[key[0]]["first_start"]
+                timing[key[0]]["first_start"] = started_at[key] if first is None else min(first, started_at[key])
+                job = (key[0], key[1], task["inputs"], task["outputs"], self.params)
+                running[executor.submit(_run_task, job)] = key
+
+            def skip_dependents(key):
+                stack = list(dependents.get(key, ()))
+                while stack:
+                    dependent = stack.pop()
+                    if unfinished.pop(dependent, None) is not None:
+                        timing[dependent[0]]["skipped"] += 1
+                        stack.extend(dependents.get(dependent, ()))
+
+            for key in [key for key, count in unfinished.items() if count == 0]:
+                submit(key)
+            while running:
+                finished, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in finished:
+                    key = running.pop(future)
+                    unfinished.pop(key, None)
+                    stage_name, item, seconds, error = future.result()
+                    entry = timing[stage_name]
+                    entry["task_seconds"] += seconds
+                    entry["last_end"] = max(entry["last_end"] or 0, time.time())
+                    if error:
+                        entry["failed"] += 1
+                        print(f"[ERROR] {stage_name} {item}: {error}")
+                        skip_dependents(key)
+                        continue
+                    entry["built"] += 1
+                    task = tasks[key]
+                    with self.conn:
+                        self.conn.execute("INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?, ?, ?, ?)",
+                                          (stage_name, item, task["fingerprint"], json.dumps(task["outputs"]), seconds, time.time()))
+                    for dependent in dependents.get(key, ()):
+                        if dependent in unfinished:
+                            unfinished[dependent] -= 1
+                            if unfinished[dependent] == 0:
+                                submit(dependent)
+        return timing
+
+def collect_features(sources, dirs=DIRS, out_csv=FEATURES_CSV, ground_truth=None):
+    """machine_features.csv from the per-recording feature files, labelled from the ground truth file."""
+    from results_analytics import GROUND_TRUTH_CSV, load_ground_truth
+
+    labels = load_ground_truth(ground_truth or GROUND_TRUTH_CSV)
+    rows = []
+    for item in sources:
+        path = os.path.join(dirs["features"], f"{item}.json")
+        if not os.path.exists(path):
+            continue
+        with open(path) as f:
+            row = json.load(f)
+        # Ground truth rows name either the recording or its left channel file
+        rows.append({**row, "filename": f"{item}.wav", "label": labels.get(item, labels.get(f"{item}_left"))})
+    if rows:
+        with open(out_csv, "w", newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+    return len(rows)
+
+def print_timing(timing, wall_seconds):
+    print(f"{'stage':10s} {'built':>6s} {'fresh':>6s} {'failed':>6s} {'skipped':>7s} {'task s':>8s} {'wall s':>8s}")
+    for stage, entry in timing.items():
+        wall = (entry["last_end"] - entry["first_start"]) if entry["first_start"] and entry["last_end"] else 0.0
+        entry["wall_seconds"] = wall
+        print(f"{stage:10s} {entry['built']:6d} {entry['fresh']:6d} {entry['failed']:6d} {entry['skipped']:7d} "
+              f"{entry['task_seconds']:8.2f} {wall:8.2f}")
+    print(f"Total: {wall_seconds:.2f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental pipeline: download, split, segment, features and plots, rebuilding only stale artifacts")
+    parser.add_argument("--csv", required=False, default="recording_urls.csv", help="Recording URLs, fetched through the recording cache")
+    parser.add_argument("--source_dir", required=False, default=None, help="Use the WAVs of this folder instead of downloading the CSV")
+    parser.add_argument("--stages", required=False, default=",".join(STAGE_NAMES), help=f"Comma separated stages ({', '.join(STAGE_NAMES)})")
+    parser.add_argument("--threshold", required=False, type=float, default=DEFAULT_PARAMS["threshold"])
+    parser.add_argument("--silence_gap_min", required=False, type=float, default=DEFAULT_PARAMS["silence_gap_min"])
+    parser.add_argument("--silence_gap_max", required=False, type=float, default=DEFAULT_PARAMS["silence_gap_max"])
+    parser.add_argument("--max_duration", required=False, type=int, default=DEFAULT_PARAMS["max_duration"], help="Seconds of the short waveform plot")
+    parser.add_argument("--ground_truth", required=False, default=None, help="CSV with recording,label columns for the features CSV")
+    parser.add_argument("--workers", required=False, type=int, default=None, help="Worker processes (default: one per CPU)")
+    parser.add_argument("--db", required=False, default=PIPELINE_DB, help="Artifact fingerprints")
+    parser.add_argument("--dry_run", action="store_true", help="Only list the stale artifacts")
+    parser.add_argument("--json", required=False, default=TIMING_JSON, help="Where to write the per-stage timing")
+    args = parser.parse_args()
+
+    stages = args.stages.split(",")
+    unknown = [s for s in stages if s not in STAGE_NAMES]
+    if unknown:
+        raise SystemExit(f"Unknown stages: {', '.join(unknown)}")
+    params = {p: getattr(args, p) for p in DEFAULT_PARAMS}
+
+    start = time.perf_counter()
+    sources = local_sources(args.source_dir) if args.source_dir else downloaded_sources(args.csv)
+    print(f"[INFO] {len(sources)} recordings")
+    pipeline = Pipeline(args.db, params=params, stages=stages)
+    timing = pipeline.run(sources, args.workers, args.dry_run)
+    pipeline.close()
+    if args.dry_run:
+        return
+    if "features" in stages and (timing["features"]["built"] or not os.path.exists(FEATURES_CSV)):
+        count = collect_features(sources, ground_truth=args.ground_truth)
+        print(f"Saved features of {count} recordings to {FEATURES_CSV}")
+    print_timing(timing, time.perf_counter() - start)
+    with open(args.json, "w") as f:
+        json.dump({"params": params, "recordings": len(sources), "stages": timing}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
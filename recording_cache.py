@@ -0,0 +1,270 @@
+import os
+import csv
+import time
+import hashlib
+import sqlite3
+import argparse
+import threading
+from urllib.parse import urlparse, parse_qs
+
+from wav_io import read_wav_info
+
+# --- Config ---
+CACHE_DIR = "recordings_cache"
+BUDGET_BYTES = 5 * 1024 ** 3         # disk used by the cached recordings before LRU eviction
+CSV_FILE = "recording_urls.csv"
+AUDIO_COL = "Audio"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS recordings (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    sample_rate INTEGER,
+    channels INTEGER,
+    fetched_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_recordings_sha256 ON recordings (sha256);
+CREATE INDEX IF NOT EXISTS idx_recordings_last_access ON recordings (last_access);
+"""
+
+def recording_key(url):
+    """
+    Stable name of the recording behind a URL: the `recording` parameter of our own
+    audio.wav URLs, the RE... SID of Twilio recording URLs, else a hash of the URL.
+    """
+    parts = urlparse(url)
+    recording = parse_qs(parts.query).get("recording", [None])[0]
+    if recording:
+        return os.path.basename(recording)
+    name = os.path.splitext(os.path.basename(parts.path))[0]
+    if name.startswith("RE") and "/Recordings/" in parts.path:
+        return name
+    return "url-" + hashlib.sha1(url.encode()).hexdigest()[:16]
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class RecordingCache:
+    """
+    Content-addressed store of the recordings fetched by the scripts.
+
+    Files live under objects/<sha256[:2]>/<sha256>.wav, so identical recordings are stored
+    once whatever their URL. The manifest (SQLite) maps every recording key to its content
+    hash, size, sample rate and channels. Each recording is downloaded once. Later lookups
+    are served from disk, and the least recently used entries are evicted when the cache
+    outgrows its disk budget.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, budget_bytes=BUDGET_BYTES):
+        self.cache_dir = cache_dir
+        self.budget_bytes = budget_bytes
+        self.objects_dir = os.path.join(cache_dir, "objects")
+        self.staging_dir = os.path.join(cache_dir, "staging")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.staging_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(cache_dir, "manifest.db"), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def object_path(self, sha256):
+        return os.path.join(self.objects_dir, sha256[:2], sha256 + ".wav")
+
+    def lookup(self, key):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT key, url, sha256, size, sample_rate, channels, fetched_at, last_access FROM recordings WHERE key = ?",
+                (key,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("key", "url", "sha256", "size", "sample_rate", "channels", "fetched_at", "last_access"), row))
+
+    def _cached_path(self, key):
+        """Path of a complete cached copy of key, touching its LRU timestamp, else None."""
+        entry = self.lookup(key)
+        if entry is None:
+            return None
+        path = self.object_path(entry["sha256"])
+        if not os.path.exists(path) or os.path.getsize(path) != entry["size"]:
+            self._forget(key)
+            return None
+        with self.lock:
+            self.conn.execute("UPDATE recordings SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+        return path
+
+    def _staging_path(self, key):
+        return os.path.join(self.staging_dir, key + ".wav")
+
+    def _ingest(self, key, url, staged):
+        """Move a downloaded file into the object store and record it in the manifest."""
+        sha256 = file_sha256(staged)
+        size = os.path.getsize(staged)
+        try:
+            info = read_wav_info(staged)
+            sample_rate, channels = info.sample_rate, info.channels
+        except Exception:
+            sample_rate = channels = None
+        path = self.object_path(sha256)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            os.remove(staged)
+        else:
+            os.replace(staged, path)
+        if os.path.exists(staged + ".meta.json"):
+            os.remove(staged + ".meta.json")
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO recordings VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, url, sha256, size, sample_rate, channels, now, now))
+            self.conn.commit()
+        return path
+
+    def get(self, url, key=None):
+        """Local path of the recording behind url, downloading it on the first request."""
+        key = key or recording_key(url)
+        path = self._cached_path(key)
+        if path:
+            return path
+        from downloader import download
+        result = download(url, self._staging_path(key), revalidate=False)
+        if result.status == "failed":
+            raise IOError(f"Could not download {url}: {result.error}")
+        path = self._ingest(key, url, result.path)
+        self.evict(keep=[key])
+        return path
+
+    def fetch_all(self, urls, concurrency=8):
+        """{url: local path} for every url that could be fetched; each recording is downloaded at most once."""
+        keys = {url: recording_key(url) for url in urls}
+        paths = {}
+        missing = {}
+        for url, key in keys.items():
+            path = self._cached_path(key)
+            if path:
+                paths[url] = path
+            else:
+                missing.setdefault(key, url)
+        print(f"[INFO] {len(set(keys.values()))} recordings, {len(set(keys.values())) - len(missing)} in {self.cache_dir}/, {len(missing)} to download")
+        if missing:
+            from downloader import download_all
+            results = download_all(((url, self._staging_path(key)) for key, url in missing.items()),
+                                   concurrency=concurrency, revalidate=False)
+            for (key, url), result in zip(missing.items(), results):
+                if result.status != "failed":
+                    self._ingest(key, url, result.path)
+        for url, key in keys.items():
+            if url not in paths:
+                path = self._cached_path(key)
+                if path:
+                    paths[url] = path
+        # The paths handed back must outlive the eviction
+        self.evict(keep=set(keys.values()))
+        return paths
+
+    def _forget(self, key):
+        with self.lock:
+            row = self.conn.execute("SELECT sha256 FROM recordings WHERE key = ?", (key,)).fetchone()
+            self.conn.execute("DELETE FROM recordings WHERE key = ?", (key,))
+            self.conn.commit()
+            if row is None:
+                return
+            shared = self.conn.execute("SELECT 1 FROM recordings WHERE sha256 = ? LIMIT 1", (row[0],)).fetchone()
+        # The object may still be referenced by another key with the same content
+        if shared is None and os.path.exists(self.object_path(row[0])):
+            os.remove(self.object_path(row[0]))
+
+    def total_bytes(self):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT sha256, size FROM recordings)").fetchone()[0]
+
+    def evict(self, budget_bytes=None, keep=()):
+        """Drop the least recently used objects until the cache fits in its budget, never those of the keys in keep."""
+        budget_bytes = self.budget_bytes if budget_bytes is None else budget_bytes
+        total = self.total_bytes()
+        if total <= budget_bytes:
+            return 0
+        keep = list(keep)
+        with self.lock:
+            objects = self.conn.execute(
+                "SELECT sha256, size, MAX(last_access) AS used FROM recordings GROUP BY sha256 ORDER BY used").fetchall()
+            kept = set()
+            for i in range(0, len(keep), 500):
+                chunk = keep[i:i + 500]
+                kept.update(row[0] for row in self.conn.execute(
+                    f"SELECT sha256 FROM recordings WHERE key IN ({', '.join('?' * len(chunk))})", chunk))
+        evicted = 0
+        for sha256, size, _ in objects:
+            if total <= budget_bytes:
+                break
+            if sha256 in kept:
+                continue
+            with self.lock:
+                self.conn.execute("DELETE FROM recordings WHERE sha256 = ?", (sha256,))
+                self.conn.commit()
+            if os.path.exists(self.object_path(sha256)):
+                os.remove(self.object_path(sha256))
+            total -= size
+            evicted += 1
+        print(f"[INFO] Evicted {evicted} recordings from {self.cache_dir}/ ({total / 1e6:.1f} MB left)")
+        if total > budget_bytes:
+            print(f"[WARN] {self.cache_dir}/ is over its budget: the recordings left are in use")
+        return evicted
+
+    def verify(self):
+        """Re-hash every object; entries whose file is missing or corrupt are dropped. Returns the bad keys."""
+        with self.lock:
+            rows = self.conn.execute("SELECT key, sha256, size FROM recordings").fetchall()
+        bad = []
+        checked = {}
+        for key, sha256, size in rows:
+            if sha256 not in checked:
+                path = self.object_path(sha256)
+                checked[sha256] = os.path.exists(path) and os.path.getsize(path) == size and file_sha256(path) == sha256
+            if not checked[sha256]:
+                bad.append(key)
+        for key in bad:
+            self._forget(key)
+        print(f"[OK] Verified {len(rows)} recordings in {self.cache_dir}/, {len(bad)} missing or corrupt")
+        return bad
+
+def csv_urls(csv_file=CSV_FILE, column=AUDIO_COL):
+    with open(csv_file, newline='') as f:
+        return [row[column] for row in csv.DictReader(f) if row.get(column)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Content-addressed cache of the recordings used by the scripts")
+    parser.add_argument("command", choices=["fetch", "verify", "evict", "ls"])
+    parser.add_argument("--csv", required=False, default=CSV_FILE, help="CSV with the recording URLs to fetch")
+    parser.add_argument("--cache_dir", required=False, default=CACHE_DIR)
+    parser.add_argument("--budget_gb", required=False, type=float, default=BUDGET_BYTES / 1024 ** 3, help="Disk budget of the cache")
+    args = parser.parse_args()
+
+    cache = RecordingCache(args.cache_dir, int(args.budget_gb * 1024 ** 3))
+    if args.command == "fetch":
+        cache.fetch_all(csv_urls(args.csv))
+    elif args.command == "verify":
+        cache.verify()
+    elif args.command == "evict":
+        cache.evict()
+    else:
+        rows = cache.conn.execute("SELECT key, size, sample_rate, channels, sha256 FROM recordings ORDER BY key").fetchall()
+        for key, size, sample_rate, channels, sha256 in rows:
+            print(f"{key}\t{size}\t{sample_rate}\t{channels}\t{sha256[:12]}")
+        print(f"{len(rows)} recordings, {cache.total_bytes() / 1e6:.1f} MB")
+    cache.close()
+
+if __name__ == "__main__":
+    main()
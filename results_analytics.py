@@ -0,0 +1,315 @@
+import os
+import time
+import sqlite3
+import argparse
+import numpy as np
+import pandas as pd
+
+# --- Config ---
+REPORTS_DIR = "reports"
+EVENTS_DB = os.path.join(REPORTS_DIR, "call_results.db")
+ANALYTICS_DB = os.path.join(REPORTS_DIR, "analytics.db")
+GROUND_TRUTH_CSV = "ground_truth.csv"       # recording,label with label human or machine
+FEATURES_DIR = "features"
+WEIGHTS_CSV = os.path.join(REPORTS_DIR, "greeting_clusters.csv")   # written by greeting_fingerprint.py
+OVERLAP_CSV = os.path.join(REPORTS_DIR, "overlap_calls.csv")        # written by overlap_analysis.py
+CHUNK_ROWS = 200000
+DECISION_BINS = np.arange(0, 61, 1.0)       # seconds, for the time-to-decision distribution
+
+EVENT_COLUMNS = ["timestamp", "call_sid", "audio_url", "call_status", "answered_by", "callback_source", "variant"]
+CALL_COLUMNS = ["call_sid", "recording", "variant", "first_event_at", "answered_at", "amd_at", "completed_at",
+                "answered_by", "stream_answered_by", "final_status", "events"]
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS calls (
+    call_sid TEXT PRIMARY KEY,
+    recording TEXT,
+    variant TEXT,
+    first_event_at REAL,
+    answered_at REAL,
+    amd_at REAL,
+    completed_at REAL,
+    answered_by TEXT,
+    stream_answered_by TEXT,
+    final_status TEXT,
+    events INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS progress (
+    source TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+def _earliest(column):
+    return f"{column} = MIN(COALESCE(calls.{column}, excluded.{column}), COALESCE(excluded.{column}, calls.{column}))"
+
+# Earlier times win, the first verdict wins, the latest status wins, counts add up
+UPSERT = f"""
+INSERT INTO calls ({", ".join(CALL_COLUMNS)}) VALUES ({", ".join("?" * len(CALL_COLUMNS))})
+ON CONFLICT (call_sid) DO UPDATE SET
+    recording = COALESCE(calls.recording, excluded.recording),
+    variant = COALESCE(calls.variant, excluded.variant),
+    {_earliest("first_event_at")},
+    {_earliest("answered_at")},
+    {_earliest("amd_at")},
+    {_earliest("completed_at")},
+    answered_by = COALESCE(calls.answered_by, excluded.answered_by),
+    stream_answered_by = COALESCE(calls.stream_answered_by, excluded.stream_answered_by),
+    final_status = COALESCE(excluded.final_status, calls.final_status),
+    events = calls.events + excluded.events
+"""
+
+def recording_names(audio_url):
+    """Recording name of every event: the recording parameter of a URL, or the bare name logged by /incoming-call."""
+    audio_url = audio_url.fillna("")
+    from_query = audio_url.str.extract(r"[?&]recording=([^&]+)", expand=False)
+    bare = audio_url.where(~audio_url.str.contains("://", regex=False))
+    return from_query.fillna(bare).replace("", np.nan)
+
+def answer_class(answered_by):
+    """human, machine (machine_* and fax), unknown, or none when AMD gave no answer."""
+    answered_by = answered_by.fillna("").str.lower()
+    return np.select(
+        [answered_by == "human", answered_by.str.startswith("machine") | (answered_by == "fax"), answered_by == ""],
+        ["human", "machine", "none"], default="unknown")
+
+def collapse_events(events):
+    """One row per call for a chunk of events ordered by arrival. The inbound leg rows are skipped."""
+    events = events[(events["callback_source"].fillna("") != "inbound") & events["call_sid"].fillna("").ne("")]
+    events = events.assign(recording=recording_names(events["audio_url"]))
+    by_call = events.groupby("call_sid", sort=False)
+    stream = events["callback_source"] == "media-stream-predictor"
+    amd = events["answered_by"].notna() & (events["answered_by"] != "") & ~stream
+
+    def first_time(mask):
+        return events[mask].groupby("call_sid")["event_time"].min()
+
+    calls = pd.DataFrame({
+        "recording": by_call["recording"].last(),
+        "variant": by_call["variant"].last(),
+        "first_event_at": by_call["event_time"].min(),
+        "answered_at": first_time(events["call_status"] == "in-progress"),
+        "amd_at": first_time(amd),
+        "completed_at": first_time(events["call_status"] == "completed"),
+        "answered_by": events[amd].groupby("call_sid")["answered_by"].first(),
+        "stream_answered_by": events[stream & events["answered_by"].notna()].groupby("call_sid")["answered_by"].first(),
+        "final_status": by_call["call_status"].last(),
+        "events": by_call.size(),
+    })
+    calls.index.name = "call_sid"
+    return calls.reset_index()[CALL_COLUMNS]
+
+def _db_chunks(events_db, last_id, chunk_rows):
+    conn = sqlite3.connect(events_db)
+    try:
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(call_events)")}
+        columns = ", ".join(c if c in existing else f"NULL AS {c}" for c in EVENT_COLUMNS)
+        while True:
+            chunk = pd.read_sql_query(
+                f"SELECT id, {columns}, received_at AS event_time FROM call_events WHERE id > ? ORDER BY id LIMIT ?",
+                conn, params=(last_id, chunk_rows))
+            if chunk.empty:
+                return
+            last_id = int(chunk["id"].iloc[-1])
+            yield chunk, last_id
+    finally:
+        conn.close()
+
+def _csv_chunks(events_csv, offset, chunk_rows):
+    """The legacy call_results.csv, from row `offset` on; the Timestamp column stands in for the arrival time."""
+    reader = pd.read_csv(events_csv, chunksize=chunk_rows, skiprows=range(1, offset + 1), dtype=str)
+    for chunk in reader:
+        for column in EVENT_COLUMNS:
+            if column not in chunk:
+                chunk[column] = None
+        times = pd.to_datetime(chunk["timestamp"], utc=True, errors="coerce", format="mixed")
+        chunk["event_time"] = (times - pd.Timestamp(0, tz="UTC")).dt.total_seconds()
+        offset += len(chunk)
+        yield chunk, offset
+
+class CallAnalytics:
+    """
+    One row per call, kept in SQLite and updated incrementally from the event log.
+
+    update() only reads the events logged since the previous run, in chunks. Each chunk is
+    collapsed with pandas and merged into the per-call rows, so the memory use does not
+    depend on the size of the log, and a re-run on millions of events only costs the new ones.
+    """
+
+    def __init__(self, db_path=ANALYTICS_DB):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def _position(self, source):
+        row = self.conn.execute("SELECT position FROM progress WHERE source = ?", (source,)).fetchone()
+        return row[0] if row else 0
+
+    def update(self, events_path=EVENTS_DB, chunk_rows=CHUNK_ROWS):
+        """Fold the new events of a call_results.db (or legacy .csv) into the per-call rows; returns the number of events read."""
+        source = os.path.abspath(events_path)
+        position = self._position(source)
+        if events_path.endswith(".csv"):
+            with open(events_path) as f:
+                total_rows = sum(1 for _ in f) - 1
+            if total_rows < position:
+                # The CSV was rewritten from scratch, read it again
+                position = 0
+            chunks = _csv_chunks(events_path, position, chunk_rows)
+        else:
+            chunks = _db_chunks(events_path, position, chunk_rows)
+
+        start = time.perf_counter()
+        read = 0
+        for chunk, position in chunks:
+            calls = collapse_events(chunk)
+            rows = calls.astype(object).where(calls.notna(), None).itertuples(index=False, name=None)
+            with self.conn:
+                self.conn.executemany(UPSERT, list(rows))
+                self.conn.execute("INSERT OR REPLACE INTO progress VALUES (?, ?, ?)", (source, position, time.time()))
+            read += len(chunk)
+        print(f"[INFO] {read} new events from {events_path} in {time.perf_counter() - start:.2f}s")
+        return read
+
+    def calls(self):
+        calls = pd.read_sql_query(f"SELECT {', '.join(CALL_COLUMNS)} FROM calls", self.conn)
+        calls["variant"] = calls["variant"].fillna("default")
+        calls["predicted"] = answer_class(calls["answered_by"])
+        calls["stream_predicted"] = np.where(calls["stream_answered_by"].notna(), answer_class(calls["stream_answered_by"]), None)
+        start = calls["answered_at"].fillna(calls["first_event_at"])
+        calls["decision_sec"] = calls["amd_at"] - start
+        calls["call_duration_sec"] = calls["completed_at"] - calls["first_event_at"]
+        return calls
+
+def load_ground_truth(path=GROUND_TRUTH_CSV):
+    """{recording: label} from a recording,label CSV; empty when there is no such file."""
+    if not os.path.exists(path):
+        return {}
+    truth = pd.read_csv(path, dtype=str).dropna(subset=["recording", "label"])
+    return dict(zip(truth["recording"].str.strip(), truth["label"].str.strip().str.lower()))
+
+def load_recording_features(features_dir=FEATURES_DIR):
+    """The feature_engine dataset indexed by recording name (file name without .wav)."""
+    if not os.path.isdir(features_dir):
+        return pd.DataFrame()
+    from feature_engine import load_features
+    features = load_features(features_dir)
+    if features.empty:
+        return features
+    features["recording"] = features["filename"].str.replace(r"\.wav$", "", case=False, regex=True)
+    return features.drop_duplicates("recording", keep="last").set_index("recording").drop(columns=["file_path", "filename"])
+
+def load_weights(path=WEIGHTS_CSV):
+    """{recording: weight} of the cluster representatives of a reduced test list; empty when there is no such file."""
+    if not os.path.exists(path):
+        return {}
+    clusters = pd.read_csv(path, dtype={"recording": str})
+    reps = clusters[clusters["representative"] == 1]
+    return dict(zip(reps["recording"], reps["weight"].astype(float)))
+
+def load_overlap(path=OVERLAP_CSV):
+    """The overlap_analysis.py metrics indexed by recording; empty when there is no such file."""
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    return pd.read_csv(path, dtype={"recording": str}).drop(columns=["base"]).set_index("recording")
+
+def join_calls(calls, truth, features, weights=None, overlap=None):
+    # A call stands for every recording of its greeting cluster; recordings outside the clustering count once
+    calls = calls.assign(truth=calls["recording"].map(truth),
+                         weight=calls["recording"].map(weights or {}).fillna(1.0).astype(float))
+    if not features.empty:
+        calls = calls.join(features.add_prefix("feature_"), on="recording")
+    if overlap is not None and not overlap.empty:
+        calls = calls.join(overlap, on="recording")
+    return calls
+
+def confusion_matrices(calls):
+    """Ground truth x AMD answer, overall and per variant, in long form."""
+    labelled = calls[calls["truth"].notna()]
+    columns = ["variant", "truth", "predicted", "calls", "weighted_calls"]
+    if labelled.empty:
+        return pd.DataFrame(columns=columns)
+    aggregate = dict(calls=("weight", "size"), weighted_calls=("weight", "sum"))
+    per_variant = labelled.groupby(["variant", "truth", "predicted"]).agg(**aggregate).reset_index()
+    overall = labelled.groupby(["truth", "predicted"]).agg(**aggregate).reset_index().assign(variant="all")
+    return pd.concat([overall, per_variant], ignore_index=True)[columns]
+
+def decision_distribution(calls, bins=DECISION_BINS):
+    """Calls per time-to-decision bin and variant."""
+    decided = calls[calls["decision_sec"].notna()]
+    counts = {
+        variant: np.histogram(group["decision_sec"].clip(bins[0], bins[-1]), bins=bins)[0]
+        for variant, group in decided.groupby("variant")
+    }
+    return pd.DataFrame(counts, index=pd.Index(bins[:-1], name="decision_sec_from"))
+
+def compare_configs(calls):
+    """Outcome shares, accuracy against the ground truth and time-to-decision per variant."""
+    rows = []
+    for variant, group in calls.groupby("variant"):
+        decided = group["decision_sec"].dropna()
+        labelled = group[group["truth"].notna()]
+        humans = labelled[labelled["truth"] == "human"]
+        machines = labelled[labelled["truth"] == "machine"]
+        rows.append({
+            "variant": variant,
+            "calls": len(group),
+            "human": (group["predicted"] == "human").mean(),
+            "machine": (group["predicted"] == "machine").mean(),
+            "unknown": (group["predicted"] == "unknown").mean(),
+            "no_answer": (group["predicted"] == "none").mean(),
+            "labelled_calls": len(labelled),
+            "accuracy": (labelled["predicted"] == labelled["truth"]).mean() if len(labelled) else np.nan,
+            "weighted_accuracy": np.average(labelled["predicted"] == labelled["truth"], weights=labelled["weight"]) if len(labelled) else np.nan,
+            # Humans taken for machines are the calls that get dropped
+            "human_as_machine": (humans["predicted"] == "machine").mean() if len(humans) else np.nan,
+            "machine_recall": (machines["predicted"] == "machine").mean() if len(machines) else np.nan,
+            "decision_p50_sec": decided.median() if len(decided) else np.nan,
+            "decision_p90_sec": decided.quantile(0.9) if len(decided) else np.nan,
+            "call_duration_mean_sec": group["call_duration_sec"].mean(),
+        })
+    return pd.DataFrame(rows)
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-call AMD results joined with features and ground truth")
+    parser.add_argument("--events", required=False, default=EVENTS_DB, help="Event log: call_results.db or a legacy call_results.csv")
+    parser.add_argument("--ground_truth", required=False, default=GROUND_TRUTH_CSV, help="CSV with recording,label columns (human or machine)")
+    parser.add_argument("--features_dir", required=False, default=FEATURES_DIR, help="Parquet dataset written by feature_engine.py")
+    parser.add_argument("--weights", required=False, default=WEIGHTS_CSV, help="Greeting clusters of a reduced test list (greeting_fingerprint.py cluster)")
+    parser.add_argument("--overlap", required=False, default=OVERLAP_CSV, help="Per-call channel overlap metrics (overlap_analysis.py)")
+    parser.add_argument("--db", required=False, default=ANALYTICS_DB, help="Incremental per-call state")
+    parser.add_argument("--output_dir", required=False, default=REPORTS_DIR)
+    args = parser.parse_args()
+
+    analytics = CallAnalytics(args.db)
+    analytics.update(args.events)
+    calls = join_calls(analytics.calls(), load_ground_truth(args.ground_truth), load_recording_features(args.features_dir),
+                       load_weights(args.weights), load_overlap(args.overlap))
+    analytics.close()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    outputs = {
+        "call_summary.csv": calls,
+        "confusion_matrix.csv": confusion_matrices(calls),
+        "decision_time_distribution.csv": decision_distribution(calls),
+        "config_comparison.csv": compare_configs(calls),
+    }
+    for name, df in outputs.items():
+        df.to_csv(os.path.join(args.output_dir, name), index=name == "decision_time_distribution.csv")
+
+    print(f"{len(calls)} calls, {calls['truth'].notna().sum()} with a ground truth label")
+    confusion = outputs["confusion_matrix.csv"]
+    overall = confusion[confusion["variant"] == "all"]
+    if len(overall):
+        print(overall.pivot(index="truth", columns="predicted", values="calls").fillna(0).astype(int).to_string())
+    with pd.option_context("display.width", 200, "display.max_columns", 20, "display.float_format", "{:.2f}".format):
+        print(outputs["config_comparison.csv"].to_string(index=False))
+    print(f"Saved {', '.join(outputs)} to {args.output_dir}/")
+
+if __name__ == "__main__":
+    main()
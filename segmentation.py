@@ -0,0 +1,123 @@
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+# --- Defaults ---
+FRAME_MS = 10           # analysis frame length
+OFF_RATIO = 0.5         # speech ends when the frame level drops below threshold * OFF_RATIO
+MIN_SPEECH = 0.05       # shorter bursts are dropped (seconds)
+MIN_SILENCE = 0.1       # shorter pauses are bridged (seconds)
+CHUNK_SECONDS = 60      # audio processed at once, bounds the temporaries on long calls
+
+def frame_view(y, frame_length):
+    """(frames, frame_length) view of y without copying, whatever its stride."""
+    n_frames = len(y) // frame_length
+    stride = y.strides[0]
+    return as_strided(y, shape=(n_frames, frame_length), strides=(frame_length * stride, stride), writeable=False)
+
+def frame_peaks(y, frame_length, chunk_length=None):
+    """Peak absolute amplitude of every frame (the last partial frame included), chunk by chunk."""
+    n_frames = -(-len(y) // frame_length)
+    peaks = np.zeros(n_frames, dtype=np.float32)
+    chunk_length = chunk_length or frame_length * 6000
+    chunk_length -= chunk_length % frame_length
+    for start in range(0, len(y), chunk_length):
+        chunk = y[start:start + chunk_length]
+        frames = frame_view(chunk, frame_length)
+        first = start // frame_length
+        if len(frames):
+            # Negated as float32: -(-32768) does not fit an int16 view of the samples
+            peaks[first:first + len(frames)] = np.maximum(frames.max(axis=1).astype(np.float32), -frames.min(axis=1).astype(np.float32))
+        tail = chunk[len(frames) * frame_length:]
+        if len(tail):
+            peaks[first + len(frames)] = np.abs(tail.astype(np.float32)).max()
+    return peaks
+
+def frame_rms(y, frame_length, chunk_length=None):
+    """Root mean square of every complete frame, chunk by chunk."""
+    n_frames = len(y) // frame_length
+    rms = np.zeros(n_frames, dtype=np.float32)
+    chunk_length = chunk_length or frame_length * 6000
+    chunk_length -= chunk_length % frame_length
+    for start in range(0, n_frames * frame_length, chunk_length):
+        frames = frame_view(y[start:min(start + chunk_length, n_frames * frame_length)], frame_length)
+        first = start // frame_length
+        rms[first:first + len(frames)] = np.sqrt(np.einsum("ij,ij->i", frames, frames, dtype=np.float64) / frame_length)
+    return rms
+
+def hysteresis(levels, on, off):
+    """Frames are voiced from the first level above `on` until the next level below `off`."""
+    state = np.full(len(levels), -1, dtype=np.int8)
+    state[levels > on] = 1
+    state[levels < off] = 0
+    if len(state) and state[0] < 0:
+        state[0] = 0
+    # Carry the last decided state forward over the undecided frames
+    last = np.where(state >= 0, np.arange(len(state)), 0)
+    np.maximum.accumulate(last, out=last)
+    return state[last] == 1
+
+def mask_to_intervals(mask):
+    """(n, 2) [start, end) index pairs of the runs of True in mask."""
+    padded = np.concatenate(([False], mask, [False]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    return edges.reshape(-1, 2)
+
+def apply_min_durations(intervals, min_speech, min_silence):
+    """Bridge pauses shorter than min_silence, then drop segments shorter than min_speech."""
+    if len(intervals) == 0:
+        return intervals
+    keep_break = intervals[1:, 0] - intervals[:-1, 1] >= min_silence
+    starts = intervals[np.concatenate(([True], keep_break)), 0]
+    ends = intervals[np.concatenate((keep_break, [True])), 1]
+    merged = np.column_stack((starts, ends))
+    return merged[merged[:, 1] - merged[:, 0] >= min_speech]
+
+def segment(y, sr, threshold=0.03, off_ratio=OFF_RATIO, frame_ms=FRAME_MS, min_speech=MIN_SPEECH,
+            min_silence=MIN_SILENCE, peak=None, chunk_seconds=CHUNK_SECONDS):
+    """
+    Speech intervals of y as an (n, 2) array of [start, end) times in seconds.
+
+    threshold is relative to the peak amplitude of the recording, like the per-sample
+    `abs_y > threshold` it replaces, but it is applied to frame peaks with hysteresis
+    and minimum speech/silence durations, so noise does not split speech into thousands
+    of micro-segments. y may be a memory-mapped array, including an integer view of the
+    file (the threshold is relative, so no conversion is needed); it is read in chunks.
+    """
+    frame_length = max(1, int(round(sr * frame_ms / 1000)))
+    levels = frame_peaks(y, frame_length, int(sr * chunk_seconds))
+    return intervals_from_levels(levels, frame_length / sr, len(y) / sr, threshold, peak,
+                                 off_ratio, min_speech, min_silence)
+
+def intervals_from_levels(levels, frame_sec, duration, threshold=0.03, peak=None, off_ratio=OFF_RATIO,
+                          min_speech=MIN_SPEECH, min_silence=MIN_SILENCE):
+    """segment() for frame peak levels that were already computed, e.g. in a fused feature pass."""
+    if peak is None:
+        peak = levels.max() if len(levels) else 0.0
+    if peak <= 0:
+        return np.zeros((0, 2))
+    voiced = hysteresis(levels, threshold * peak, threshold * off_ratio * peak)
+    intervals = apply_min_durations(
+        mask_to_intervals(voiced),
+        int(np.ceil(min_speech / frame_sec - 1e-9)),
+        int(np.ceil(min_silence / frame_sec - 1e-9)),
+    )
+    return np.minimum(intervals * frame_sec, duration)
+
+def silence_gaps(intervals, gap_min=0.4, gap_max=2.5):
+    """Pauses between consecutive speech intervals with gap_min < length < gap_max, as (m, 2) times."""
+    gaps = np.column_stack((intervals[:-1, 1], intervals[1:, 0])) if len(intervals) > 1 else np.zeros((0, 2))
+    lengths = gaps[:, 1] - gaps[:, 0]
+    return gaps[(lengths > gap_min) & (lengths < gap_max)]
+
+def describe(intervals, duration, gap_min=0.4, gap_max=2.5):
+    """AMD-style regions of a call: initial silence, utterance, internal silence gaps and final silence."""
+    t1 = intervals[0, 0] if len(intervals) else 0
+    t4 = intervals[-1, 1] if len(intervals) else duration
+    return {
+        "initial_silence": (0, t1),
+        "utterance": (t1, t4),
+        "silence_gaps": [tuple(gap) for gap in silence_gaps(intervals, gap_min, gap_max)],
+        "final_silence": (t4, duration),
+        "speech": intervals,
+        "duration": duration,
+    }
@@ -1,88 +1,139 @@
-from flask import Flask, request, Response, send_file
+from flask import Flask, request, Response, g, jsonify, render_template
+from flask_sock import Sock
 from twilio.twiml.voice_response import VoiceResponse
-import os, threading, subprocess, csv, time
+import os, sys, csv, time, atexit, signal, json, base64, sqlite3
+from datetime import datetime
 from urllib.parse import unquote, urlparse, parse_qs
 from colorama import init, Fore, Style
 import argparse
+from automated_amd_call import CONFIG_FILE, load_config, create_client
+from call_orchestrator import CallOrchestrator
+from experiment_scheduler import ExperimentScheduler, load_spec, print_progress
+from event_store import EventStore, CALL_RESULTS_CSV
+from call_metrics import CallMetrics
+from call_state import open_call_state, CALL_STATE_DB, TTL_SEC
+from audio_library import AudioLibrary, CACHE_BYTES
+from envelope_pyramid import PyramidStore
+from streaming_amd import StreamingAmdPredictor
 
 init(autoreset=True)
 app = Flask(__name__)
+sock = Sock(app)
 
 AUDIO_CSV = "recording_urls.csv"
+REPORTS_DIR = "reports"
+CALL_RESULTS_DB = os.path.join(REPORTS_DIR, "call_results.db")
+
+# Server state, set up by init_server() so importing this module has no side effects
 audio_urls = []
-with open(AUDIO_CSV, newline='') as csvfile:
-    reader = csv.DictReader(csvfile)
-    for row in reader:
-        audio_urls.append(row["Audio"])
-        # audio_urls.pop(0)
+pending_audio_urls = []                  # Queue of remaining audio files to test
+call_state = None                        # call_sid -> audio, callbacks seen and completion (see call_state.py)
+orchestrator = None                      # CallOrchestrator placing the batch
+audio_library = None                     # AudioLibrary serving /audio.wav
+event_store = None                       # EventStore logging every callback
+metrics = None                           # CallMetrics served at /metrics
+envelopes = None                         # PyramidStore behind the waveform viewer
+scheduler = None                         # ExperimentScheduler when running an experiment matrix
+experiment = None                        # name of that experiment
 
-with open("current_audio_url.txt", "w") as f:
-    f.write(audio_urls[0])
+def load_audio_urls(audio_csv=AUDIO_CSV):
+    with open(audio_csv, newline='') as csvfile:
+        return [row["Audio"] for row in csv.DictReader(csvfile)]
 
-pending_audio_urls = audio_urls.copy()   # Queue of remaining audio files to test
-call_audio_assignment = {}               # call_sid -> audio_url mapping
-completed_calls = set()
-audio_queue_lock = threading.Lock()
+def init_server(audio_csv=AUDIO_CSV, audio_dir="channel_audio/left", transcode=True, cache_bytes=CACHE_BYTES,
+                call_state_backend="memory", call_state_ttl=TTL_SEC):
+    global event_store, metrics, audio_library, envelopes, call_state
+    audio_urls[:] = load_audio_urls(audio_csv)
+    pending_audio_urls[:] = audio_urls
+    os.makedirs(REPORTS_DIR, exist_ok=True)
+    print(f"pending_audio_urls: {pending_audio_urls}")
 
-REPORTS_DIR = "reports"
-os.makedirs(REPORTS_DIR, exist_ok=True)
-CALL_RESULTS_CSV = os.path.join(REPORTS_DIR, "call_results.csv")
-print(f"pending_audio_urls: {pending_audio_urls}")
-print(f"call_audio_assignment start: {call_audio_assignment}")
-
-# Write CSV header if file does not exist
-if not os.path.exists(CALL_RESULTS_CSV):
-    with open(CALL_RESULTS_CSV, "w", newline='') as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow([
-            "timestamp", "call_sid", "audio_url", "event_sequence",
-            "call_status", "answered_by", "callback_source"
-        ])
-
-def log_call_event(timestamp, call_sid, audio_url, sequence=None, call_status=None, answered_by=None, callback_source=None):
-    with open(CALL_RESULTS_CSV, "a", newline='') as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow([
-            timestamp,
-            call_sid,
-            audio_url,
-            sequence,
-            call_status,
-            answered_by,
-            callback_source
-        ])
-
-def place_next_call():
-    with audio_queue_lock:
-        if not pending_audio_urls:
-            print(Fore.GREEN + "[INFO] All test calls have been placed and processed." + Style.RESET_ALL)
-            return
-        # Pop next audio URL for testing
-        next_audio_url = pending_audio_urls.pop(0)
-        # Store in shared file for next call
-        with open("current_audio_url.txt", "w") as f:
-            f.write(next_audio_url)
-        print(Fore.BLUE + f"[INFO] Placing call for audio: {next_audio_url}" + Style.RESET_ALL)
-        subprocess.Popen([
-            "python3", "automated_amd_call.py"
-        ])
+    # "sqlite" shares the call state between worker processes; finished calls expire after the TTL
+    call_state = open_call_state(call_state_backend, CALL_STATE_DB, ttl=call_state_ttl)
+    atexit.register(call_state.close)
+
+    # Events are committed in batches by a background writer; flush whatever is queued on shutdown
+    event_store = EventStore(CALL_RESULTS_DB)
+    atexit.register(event_store.close)
+
+    # In-memory call timelines and histograms, served at /metrics
+    metrics = CallMetrics(load_config(CONFIG_FILE))
+    audio_library = AudioLibrary(audio_dir, transcode=transcode, cache_bytes=cache_bytes)
+    envelopes = PyramidStore(audio_dir)
+
+def log_call_event(timestamp, call_sid, audio_url, sequence=None, call_status=None, answered_by=None, callback_source=None, variant=None):
+    event_store.log(
+        timestamp=timestamp,
+        call_sid=call_sid,
+        audio_url=audio_url,
+        event_sequence=sequence,
+        call_status=call_status,
+        answered_by=answered_by,
+        callback_source=callback_source,
+        variant=variant
+    )
+
+def assign_audio(call_sid, audio_url):
+    call_state.assign(call_sid, audio_url)
+
+def call_placed(call_sid, job, placed_at):
+    assign_audio(call_sid, job.audio_url)
+    metrics.call_placed(call_sid, job.audio_url, job.config or orchestrator.config, at=placed_at)
+    if scheduler is not None and "trial" in job.tags:
+        scheduler.placed(job.tags["trial"], call_sid, placed_at)
+
+def batch_done():
+    summary_path = os.path.join(REPORTS_DIR, f"batch_summary_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    summary = metrics.write_summary(summary_path)
+    for config, stats in summary.get("amd_time_to_decision", {}).items():
+        print(Fore.GREEN + f"[INFO] {config}: AMD decision p50 {stats['p50']:.2f}s, p90 {stats['p90']:.2f}s over {stats['count']} calls" + Style.RESET_ALL)
+    print(Fore.GREEN + f"[INFO] Batch summary saved to {summary_path}" + Style.RESET_ALL)
+    if scheduler is not None:
+        trials_path = os.path.join(REPORTS_DIR, f"experiment_{experiment}.csv")
+        scheduler.export_csv(experiment, trials_path)
+        print(Fore.GREEN + f"[INFO] Experiment {experiment}, trials saved to {trials_path}:" + Style.RESET_ALL)
+        print_progress(scheduler, experiment)
+
+def start_experiment(spec_path):
+    """Register the experiment matrix (or pick it up where a previous run stopped); returns its pending calls."""
+    global scheduler, experiment
+    spec = load_spec(spec_path)
+    scheduler = ExperimentScheduler()
+    experiment = spec["name"]
+    variants = scheduler.create(spec, audio_urls, load_config(CONFIG_FILE))
+    requeued = scheduler.resume(experiment)
+    jobs = scheduler.pending_jobs(experiment)
+    print(Fore.BLUE + f"[INFO] Experiment {experiment}: {len(variants)} variants, {len(jobs)} calls to place ({requeued} requeued from an interrupted run)" + Style.RESET_ALL)
+    return jobs
+
+def start_batch(max_in_flight=1, cps=1.0, jobs=None, tagged_inbound=False):
+    global orchestrator
+    orchestrator = CallOrchestrator(
+        create_client(), load_config(CONFIG_FILE),
+        max_in_flight=max_in_flight, cps=cps, on_placed=call_placed, on_done=batch_done, call_state=call_state,
+        tagged_inbound=tagged_inbound
+    )
+    orchestrator.submit(pending_audio_urls if jobs is None else jobs)
+    pending_audio_urls.clear()
+    print(Fore.BLUE + f"[INFO] Starting batch: {len(orchestrator.pending)} calls, {orchestrator.max_in_flight} in flight, {cps} calls/s" + Style.RESET_ALL)
+    orchestrator.start()
+
+def place_next_call(call_sid):
+    # Frees the slot of the completed call; the orchestrator places the next one
+    if orchestrator is not None:
+        orchestrator.call_finished(call_sid)
 
 @app.route("/incoming-call", methods=["GET", "POST"])
 def incoming_call():
     call_sid = request.values.get("CallSid", "")
 
     # Map the call_sid to its audio on first request (if not already)
-    with audio_queue_lock:
-        if call_sid not in call_audio_assignment:
-            # Use the most recently assigned audio file
-            try:
-                with open("current_audio_url.txt") as f:
-                    audio_url = f.read().strip()
-                call_audio_assignment[call_sid] = audio_url
-            except Exception:
-                audio_url = ""
-        else:
-            audio_url = call_audio_assignment[call_sid]
+    audio_url = call_state.audio_for(call_sid)
+    if audio_url is None:
+        # Only the local stand-in passes the audio; a real inbound leg gets the oldest call awaiting
+        # its leg, from the call state so it works whichever worker process answers
+        audio_url = call_state.claim_inbound(request.args.get("audio", ""))
+        assign_audio(call_sid, audio_url)
 
     twiml = f"""<?xml version="1.0" encoding="UTF-8"?>
 <Response>
@@ -140,7 +191,13 @@ def handle_webhook():
     timestamp = parsed_data.get("Timestamp", time.strftime('%Y-%m-%d %H:%M:%S'))
 
     # Find the audio URL that was served for this call, or empty string if not found
-    audio_url = call_audio_assignment.get(call_sid, "")
+    audio_url = request.args.get("audio") or call_state.audio_for(call_sid) or ""
+    variant = request.args.get("variant")
+    # Twilio retries a callback it got no answer to; a retried SequenceNumber is only acknowledged
+    if not call_state.first_callback(call_sid, callback_source, sequence):
+        print(f"{Style.DIM}[SID:{call_sid}] [Seq:{sequence}] duplicate {callback_source} callback ignored{Style.RESET_ALL}")
+        return str(VoiceResponse())
+    trial = request.args.get("trial", type=int)
     # Log the event (always, for all progress events)
     log_call_event(
         timestamp=timestamp,
@@ -149,8 +206,15 @@ def handle_webhook():
         sequence=sequence,
         call_status=call_status,
         answered_by=answered_by,
-        callback_source=callback_source
+        callback_source=callback_source,
+        variant=variant
     )
+    metrics.callback(call_sid, call_status, answered_by, callback_source)
+    if scheduler is not None and trial is not None:
+        if answered_by:
+            scheduler.answered(trial, answered_by)
+        if call_status == "completed":
+            scheduler.completed(trial)
 
     if answered_by:
             print(f"  >>>  AnsweredBy: {color_amd(answered_by)}")
@@ -161,27 +225,242 @@ def handle_webhook():
             f"{Fore.WHITE}[SID:{call_sid}] [Seq:{sequence}] {Style.RESET_ALL}"
             f"Status: {color_status(call_status)}", end=""
         )
-        if call_status == "completed" and call_sid not in completed_calls:
-            completed_calls.add(call_sid)
-            # Only launch next call if there are more to place
-            place_next_call()
+        # Exactly one worker claims the completion and advances the queue
+        if call_status == "completed" and call_state.complete(call_sid):
+            place_next_call(call_sid)
 
     return str(VoiceResponse())
 
+@sock.route("/media-stream")
+def media_stream(ws):
+    """
+    Twilio Media Streams endpoint: predicts human/machine from the base64 mu-law frames
+    of the call as they arrive and reports the verdict as soon as it is known.
+    """
+    config = load_config(CONFIG_FILE)
+    predictor = None
+    stream_sid = call_sid = audio_url = None
+
+    def report():
+        stats = predictor.stats()
+        metrics.stream_verdict(call_sid, stats["answered_by"], stats["decision_time"])
+        log_call_event(
+            timestamp=time.strftime('%Y-%m-%d %H:%M:%S'),
+            call_sid=call_sid,
+            audio_url=audio_url,
+            answered_by=stats["answered_by"],
+            callback_source="media-stream-predictor"
+        )
+        print(
+            f"[STREAM] [SID:{call_sid}] Predicted: {color_amd(stats['answered_by'])}{Style.RESET_ALL} "
+            f"at {stats['decision_time']:.2f}s of audio ({stats['frames']} frames, "
+            f"{stats['mean_frame_us']:.1f}us/frame mean, {stats['p99_frame_us']:.1f}us p99)"
+        )
+        # A mark is the only message a bidirectional stream accepts that can carry the verdict
+        ws.send(json.dumps({
+            "event": "mark",
+            "streamSid": stream_sid,
+            "mark": {"name": f"amd:{stats['answered_by']}:{stats['decision_time']:.2f}"},
+        }))
+
+    while True:
+        message = ws.receive()
+        if message is None:
+            break
+        data = json.loads(message)
+        event = data.get("event")
+        if event == "start":
+            start = data.get("start", {})
+            stream_sid = data.get("streamSid") or start.get("streamSid")
+            call_sid = start.get("callSid")
+            audio_url = start.get("customParameters", {}).get("audio") or call_state.audio_for(call_sid) or ""
+            predictor = StreamingAmdPredictor(config)
+        elif event == "media" and predictor is not None:
+            if predictor.feed_ulaw(base64.b64decode(data["media"]["payload"])):
+                report()
+        elif event == "stop":
+            if predictor is not None and predictor.verdict is None:
+                predictor.finish()
+                report()
+            break
+
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_handler_time(response):
+    # The media stream handler lives as long as its call, it is not a webhook
+    if request.endpoint not in (None, "media_stream", "prometheus_metrics"):
+        metrics.observe_handler(request.endpoint, time.perf_counter() - g.request_started)
+    return response
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
 @app.route('/audio.wav', methods=['GET', 'POST'])
 def get_audio():
+    started = time.perf_counter()
     recording_sid = request.args.get("recording", type=str)
-    # Path to the audio file
-    audio_path = f"{audio_dir}/{recording_sid}.wav"
+    entry, hit = audio_library.get(recording_sid)
+    if entry is None:
+        print(Fore.RED + f"[AUDIO] {recording_sid}: not found in {audio_library.audio_dir}" + Style.RESET_ALL)
+        return Response("Recording not found", status=404, mimetype="text/plain")
 
-    # send_file automatically sets correct headers
-    return send_file(audio_path, mimetype="audio/wav")
-    # use mimetype="audio/wav" for .wav files, etc.
+    # Validators and byte ranges let Twilio revalidate or resume instead of fetching the whole file again
+    response = Response(entry.data, mimetype="audio/wav")
+    response.set_etag(entry.etag)
+    response.last_modified = entry.last_modified
+    response.cache_control.public = True
+    response.cache_control.max_age = 3600
+    response = response.make_conditional(request, accept_ranges=True, complete_length=len(entry.data))
+    print(
+        f"[AUDIO] {recording_sid}: {response.status_code} {0 if response.status_code == 304 else response.content_length} bytes "
+        f"({'cached' if hit else 'loaded'}) in {(time.perf_counter() - started) * 1000:.1f}ms"
+    )
+    return response
 
-if __name__ == "__main__":
-    print("Minimal Twilio AMD Server running (serving TwiML <Play> for /incoming-call)")
+def _event_rows(recording):
+    """(call_sid, call_status, answered_by, callback_source, variant, time) of the callbacks of calls that played `recording`."""
+    def played(audio_url):
+        return parse_qs(urlparse(audio_url or "").query).get("recording", [None])[0] == recording
+
+    if event_store is not None and os.path.exists(event_store.db_path):
+        conn = sqlite3.connect(event_store.db_path)
+        try:
+            rows = conn.execute(
+                "SELECT call_sid, call_status, answered_by, callback_source, variant, received_at, audio_url FROM call_events "
+                "WHERE audio_url LIKE ? ORDER BY id", (f"%recording={recording}%",)).fetchall()
+        finally:
+            conn.close()
+        return [row[:6] for row in rows if played(row[6])]
+    # Legacy reports/call_results.csv, timed by its Timestamp column
+    if not os.path.exists(CALL_RESULTS_CSV):
+        return []
+    rows = []
+    with open(CALL_RESULTS_CSV, newline='') as f:
+        for row in csv.DictReader(f):
+            if not played(row.get("audio_url")):
+                continue
+            try:
+                at = datetime.fromisoformat(row["timestamp"].replace("Z", "+00:00")).timestamp()
+            except (KeyError, ValueError):
+                continue
+            rows.append((row.get("call_sid"), row.get("call_status"), row.get("answered_by"),
+                         row.get("callback_source"), row.get("variant"), at))
+    return rows
+
+def recording_timelines(recording):
+    """
+    Every call that played `recording`, with its callbacks in seconds from the answer,
+    which is when the recording starts playing.
+    """
+    calls = {}
+    for call_sid, call_status, answered_by, callback_source, variant, at in _event_rows(recording):
+        calls.setdefault(call_sid, {"call_sid": call_sid, "variant": variant, "events": []})["events"].append(
+            (float(at), call_status, answered_by, callback_source))
+    timelines = []
+    for call in calls.values():
+        answered = [at for at, status, _, _ in call["events"] if status == "in-progress"]
+        start = min(answered) if answered else min(at for at, _, _, _ in call["events"])
+        call["events"] = [
+            {"t": round(at - start, 3), "status": status, "answered_by": answered_by, "source": source}
+            for at, status, answered_by, source in sorted(call["events"], key=lambda e: e[0])
+        ]
+        timelines.append(call)
+    return timelines
+
+@app.route("/viewer", methods=["GET"])
+def waveform_viewer():
+    return render_template("viewer.html", recording=request.args.get("recording", ""))
+
+@app.route("/envelope", methods=["GET"])
+def envelope_recordings():
+    return jsonify(envelopes.recordings())
+
+@app.route("/envelope/<recording>", methods=["GET"])
+def envelope_info(recording):
+    pyramid = envelopes.get(recording)
+    if pyramid is None:
+        return Response("Recording not found", status=404, mimetype="text/plain")
+    return jsonify(recording=recording, version=pyramid.version, segments=pyramid.speech_segments(),
+                   calls=recording_timelines(recording), **pyramid.info())
+
+@app.route("/envelope/<recording>/<int:level>/<int:index>", methods=["GET"])
+def envelope_tile(recording, level, index):
+    pyramid = envelopes.get(recording)
+    if pyramid is None:
+        return Response("Recording not found", status=404, mimetype="text/plain")
+    try:
+        tile = pyramid.tile(level, index)
+    except ValueError as e:
+        return Response(str(e), status=404, mimetype="text/plain")
+    # Interleaved little-endian int16 min/max pairs; immutable until the recording changes
+    response = Response(tile.astype("<i2").tobytes(), mimetype="application/octet-stream")
+    response.set_etag(f"{pyramid.version}-{level}-{index}")
+    response.cache_control.public = True
+    response.cache_control.max_age = 86400
+    return response.make_conditional(request)
+
+def server_start_token():
+    """
+    Identifies this server start, shared by its worker processes: $BATCH_TOKEN when the launcher
+    sets one, else the pid and start time of the parent (the WSGI master), so a restarted master
+    that gets the same pid (e.g. PID 1 in a container) is still a new start.
+    """
+    token = os.environ.get("BATCH_TOKEN")
+    if token:
+        return token
+    ppid = os.getppid()
+    try:
+        with open(f"/proc/{ppid}/stat") as f:
+            # Field 22 is the start time in clock ticks since boot; the process name may contain spaces
+            started = f.read().rsplit(")", 1)[1].split()[19]
+    except (OSError, IndexError):
+        started = "0"
+    return f"{ppid}:{started}"
+
+def create_app(audio_dir="channel_audio/left", call_state_backend="sqlite", batch=True, max_in_flight=1, cps=1.0, tagged_inbound=False):
+    """
+    The app for a multi-process WSGI server, e.g. gunicorn -w 4 'server:create_app()'.
+
+    Every worker shares the SQLite call state, and only the worker that claims the batch
+    of this server start places its calls; the others serve the callbacks. Inbound legs are
+    matched to their calls through the call state too, so any worker can answer them.
+    """
+    init_server(AUDIO_CSV, audio_dir, call_state_backend=call_state_backend)
+    # The claim is never released: a worker respawned later in the same start must not place the batch again
+    if batch and call_state.claim(f"batch:{server_start_token()}", owner=str(os.getpid())):
+        start_batch(max_in_flight=max_in_flight, cps=cps, tagged_inbound=tagged_inbound)
+    return app
+
+def main():
     parser = argparse.ArgumentParser(description="Batch analyzer with parameters")
     parser.add_argument("--audio_dir", required=False, default="channel_audio/left", help="Name of input folder with the recordings to analyze")
+    parser.add_argument("--max_in_flight", required=False, type=int, default=1, help="Maximum number of test calls open at the same time")
+    parser.add_argument("--cps", required=False, type=float, default=1.0, help="Maximum number of calls created per second")
+    parser.add_argument("--tagged_inbound", action="store_true", help="The inbound legs pass their audio on /incoming-call (twilio_fake.py --inbound_audio); needed for --max_in_flight above 1")
+    parser.add_argument("--no_batch", action="store_true", help="Only serve webhooks, do not place the calls of recording_urls.csv")
+    parser.add_argument("--experiment", required=False, default=None, help="Experiment JSON with the AMD variants to run over every recording (resumes an interrupted run)")
+    parser.add_argument("--no_transcode", action="store_true", help="Serve the recordings as they are instead of 8 kHz mu-law copies")
+    parser.add_argument("--pretranscode", action="store_true", help="Transcode the whole audio_dir before placing calls instead of on first fetch")
+    parser.add_argument("--call_state", required=False, default="memory", choices=["memory", "sqlite"], help="Where the per-call state lives; sqlite is shared with other server processes")
+    parser.add_argument("--call_state_ttl", required=False, type=float, default=TTL_SEC, help="Seconds a finished call is remembered")
+    parser.add_argument("--audio_cache_mb", required=False, type=int, default=CACHE_BYTES // 2**20, help="Memory for the most requested recordings")
     args = parser.parse_args()
-    audio_dir = args.audio_dir
+    print("Minimal Twilio AMD Server running (serving TwiML <Play> for /incoming-call)")
+    init_server(AUDIO_CSV, args.audio_dir, transcode=not args.no_transcode, cache_bytes=args.audio_cache_mb * 2**20,
+                call_state_backend=args.call_state, call_state_ttl=args.call_state_ttl)
+    if args.pretranscode:
+        audio_library.transcode_all()
+    # Exit cleanly on SIGTERM too, so the atexit handlers flush the event store
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    if args.experiment:
+        start_batch(max_in_flight=args.max_in_flight, cps=args.cps, jobs=start_experiment(args.experiment), tagged_inbound=args.tagged_inbound)
+    elif not args.no_batch:
+        start_batch(max_in_flight=args.max_in_flight, cps=args.cps, tagged_inbound=args.tagged_inbound)
     app.run(host='0.0.0.0', port=5000, debug=False)
+
+if __name__ == "__main__":
+    main()
@@ -1,45 +1,81 @@
 import os
-from pydub import AudioSegment
+import argparse
+import concurrent.futures
 from pathlib import Path
 
+from wav_io import map_frames, wav_header, write_wav_stream
+
 # --- Config ---
 SOURCE_DIR = Path("recordings")  # or specify your repo folder
 OUTPUT_DIR_LEFT = Path("channel_audio/left")
 OUTPUT_DIR_RIGHT = Path("channel_audio/right")
-OUTPUT_DIR_LEFT.mkdir(exist_ok=True)
-OUTPUT_DIR_RIGHT.mkdir(exist_ok=True)
+OUTPUT_DIR_LEFT.mkdir(parents=True, exist_ok=True)
+OUTPUT_DIR_RIGHT.mkdir(parents=True, exist_ok=True)
 
 # --- Process All WAV Files ---
-def split_channels_in_repo():
+def split_channels_in_repo(workers=None, force=False):
+    wav_paths = []
     for root, _, files in os.walk(SOURCE_DIR):
         for file in files:
             if file.lower().endswith(".wav"):
-                wav_path = Path(root) / file
-                process_wav(wav_path)
+                wav_paths.append(Path(root) / file)
+    # Files are independent, spread them across processes
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(process_wav, wav_paths, [force] * len(wav_paths), chunksize=8))
+
+def is_up_to_date(source_path, output_path, expected_size):
+    """An output is current if it has the expected size and is not older than its source."""
+    try:
+        out_stat = output_path.stat()
+    except FileNotFoundError:
+        return False
+    return out_stat.st_size == expected_size and out_stat.st_mtime >= source_path.stat().st_mtime
+
+def write_channel(samples, output_path, info):
+    # Stream into a temporary file so an interrupted run never leaves a truncated output
+    tmp_path = output_path.with_name(output_path.name + ".part")
+    with open(tmp_path, "wb") as f:
+        write_wav_stream(f, samples, info.format_tag, info.sample_rate, info.bits_per_sample)
+    os.replace(tmp_path, output_path)
 
 # --- Split Stereo WAV File ---
-def process_wav(wav_path):
+def process_wav(wav_path, force=False):
+    wav_path = Path(wav_path)
     try:
-        audio = AudioSegment.from_wav(wav_path)
-        if audio.channels != 2:
+        info, frames = map_frames(wav_path)
+        if info.channels != 2:
             print(f"[SKIP] {wav_path} is not stereo.")
             return
 
         base_name = wav_path.stem
-        left_channel = audio.split_to_mono()[0]
-        right_channel = audio.split_to_mono()[1]
-
         left_path = OUTPUT_DIR_LEFT / f"{base_name}_left.wav"
         right_path = OUTPUT_DIR_RIGHT / f"{base_name}_right.wav"
 
-        left_channel.export(left_path, format="wav")
-        right_channel.export(right_path, format="wav")
+        data_size = info.frames * info.sample_width
+        expected_size = len(wav_header(info.format_tag, 1, info.sample_rate, info.bits_per_sample, data_size)) + data_size + data_size % 2
+        written = []
+        # frames[:, 0] and frames[:, 1] are strided views into the mapped file, nothing is copied up front
+        for channel, out_path in ((0, left_path), (1, right_path)):
+            if not force and is_up_to_date(wav_path, out_path, expected_size):
+                continue
+            write_channel(frames[:, channel], out_path, info)
+            written.append(out_path)
 
-        print(f"[OK] Split {wav_path} -> {left_path}, {right_path}")
+        if written:
+            print(f"[OK] Split {wav_path} -> {left_path}, {right_path}")
+        else:
+            print(f"[SKIP] {wav_path} is up to date.")
 
     except Exception as e:
         print(f"[ERROR] Could not process {wav_path}: {e}")
 
 # --- Run ---
+def main():
+    parser = argparse.ArgumentParser(description="Split stereo recordings into left and right channel files")
+    parser.add_argument("--workers", required=False, type=int, default=None, help="Number of worker processes (default: one per CPU)")
+    parser.add_argument("--force", action="store_true", help="Rewrite outputs even if they are up to date")
+    args = parser.parse_args()
+    split_channels_in_repo(workers=args.workers, force=args.force)
+
 if __name__ == "__main__":
-    split_channels_in_repo()
+    main()
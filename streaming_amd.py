@@ -0,0 +1,133 @@
+import time
+import numpy as np
+
+from wav_io import ulaw_decode
+
+# --- Config ---
+SAMPLE_RATE = 8000            # Media Streams audio is 8 kHz mu-law
+FRAME_MS = 20                 # one Media Streams chunk
+ON_DB = 15                    # speech starts this far above the noise floor
+OFF_DB = 9                    # and ends when the level drops below floor + OFF_DB
+MIN_LEVEL_DB = -50            # never call anything quieter than this speech
+MIN_SPEECH_MS = 60            # consecutive loud audio needed to count as speech
+NOISE_RISE_DB = 0.05          # per frame, so the floor follows slow changes in the line noise
+INITIAL_FLOOR_DB = -45        # upper bound of the first noise floor estimate, so a call that starts with speech is heard
+
+class StreamingAmdPredictor:
+    """
+    Incremental speech/silence tracking over the 8 kHz frames of a call, applying the
+    AMD timing rules of an amd_config.json as the audio arrives.
+
+    A verdict is emitted at the earliest point the rules allow: `human` once a short
+    utterance is followed by MachineDetectionSpeechEndThreshold of silence, `machine_start`
+    as soon as speech has lasted MachineDetectionSpeechThreshold, `unknown` on the
+    silence timeout or the overall timeout. The audio time of the decision and the
+    processing cost of every frame are recorded.
+    """
+
+    def __init__(self, config=None, sample_rate=SAMPLE_RATE, frame_ms=FRAME_MS):
+        config = config or {}
+        self.speech_threshold = config.get("MachineDetectionSpeechThreshold", 2400) / 1000
+        self.speech_end_threshold = config.get("MachineDetectionSpeechEndThreshold", 1200) / 1000
+        self.silence_timeout = config.get("MachineDetectionSilenceTimeout", 5000) / 1000
+        self.timeout = config.get("MachineDetectionTimeout", 30)
+        self.frame_length = int(sample_rate * frame_ms / 1000)
+        self.frame_sec = self.frame_length / sample_rate
+        self.min_speech_frames = max(1, int(MIN_SPEECH_MS / frame_ms))
+
+        self.pending = np.zeros(0, dtype=np.float32)
+        self.t = 0.0                   # audio seconds processed
+        self.noise_floor = None
+        self.speaking = False
+        self.loud_frames = 0
+        self.first_speech = None
+        self.last_speech_end = None
+        self.verdict = None
+        self.decision_time = None
+        self.frame_costs_ns = []
+        self.started = None
+        self.decided_after = None      # wall-clock seconds from the first frame to the verdict
+
+    def feed_ulaw(self, payload):
+        return self.feed(ulaw_decode(payload))
+
+    def feed(self, samples):
+        """Process new samples; returns the verdict if this call produced it, else None."""
+        if self.verdict is not None:
+            # Nothing left to decide, the rest of the call is not analyzed
+            return None
+        if self.started is None:
+            self.started = time.perf_counter()
+        if len(self.pending):
+            samples = np.concatenate((self.pending, samples))
+        n_frames = len(samples) // self.frame_length
+        for i in range(n_frames):
+            self._process_frame(samples[i * self.frame_length:(i + 1) * self.frame_length])
+            if self.verdict is not None:
+                self.pending = samples[:0]
+                return self.verdict
+        self.pending = samples[n_frames * self.frame_length:]
+        return None
+
+    def finish(self):
+        """End of stream: the line stays silent until the rules decide."""
+        silence = np.zeros(self.frame_length, dtype=np.float32)
+        while self.verdict is None:
+            self.feed(silence)
+        return self.verdict
+
+    def _process_frame(self, frame):
+        start = time.perf_counter_ns()
+        level = 10 * np.log10(np.dot(frame, frame) / len(frame) + 1e-10)
+
+        # Voice activity with hysteresis around an adaptive noise floor
+        if self.noise_floor is None:
+            self.noise_floor = min(level, INITIAL_FLOOR_DB)
+        if self.speaking:
+            loud = level > max(self.noise_floor + OFF_DB, MIN_LEVEL_DB - (ON_DB - OFF_DB))
+        else:
+            loud = level > max(self.noise_floor + ON_DB, MIN_LEVEL_DB)
+            if level < self.noise_floor:
+                self.noise_floor = level
+            else:
+                self.noise_floor += NOISE_RISE_DB
+        self.loud_frames = self.loud_frames + 1 if loud else 0
+        self.speaking = loud and (self.speaking or self.loud_frames >= self.min_speech_frames)
+
+        self.t += self.frame_sec
+        self._apply_rules()
+        self.frame_costs_ns.append(time.perf_counter_ns() - start)
+
+    def _apply_rules(self):
+        t = self.t
+        if self.speaking:
+            if self.first_speech is None:
+                self.first_speech = t - self.loud_frames * self.frame_sec
+            self.last_speech_end = t
+            if t - self.first_speech >= self.speech_threshold:
+                self._decide("machine_start")
+        elif self.first_speech is None:
+            if t >= self.silence_timeout:
+                self._decide("unknown")
+        elif t - self.last_speech_end >= self.speech_end_threshold:
+            # The utterance ended before reaching the speech threshold
+            self._decide("human")
+        if self.verdict is None and t >= self.timeout:
+            self._decide("unknown")
+
+    def _decide(self, verdict):
+        self.verdict = verdict
+        self.decision_time = self.t
+        self.decided_after = time.perf_counter() - self.started
+
+    def stats(self):
+        costs = np.asarray(self.frame_costs_ns, dtype=np.float64) / 1000
+        return {
+            "answered_by": self.verdict,
+            "decision_time": self.decision_time,
+            "decided_after_sec": self.decided_after,
+            "first_speech": self.first_speech,
+            "frames": len(costs),
+            "mean_frame_us": float(costs.mean()) if len(costs) else 0.0,
+            "p99_frame_us": float(np.percentile(costs, 99)) if len(costs) else 0.0,
+        }
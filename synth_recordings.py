@@ -0,0 +1,164 @@
+import os
+import csv
+import json
+import argparse
+import numpy as np
+
+from wav_io import WAVE_FORMAT_PCM, wav_header
+
+# --- Config ---
+OUTPUT_DIR = "recordings"
+LAYOUT_FILE = "synthetic_layout.json"     # written next to the recordings
+SAMPLE_RATE = 8000
+CHUNK_SEC = 60                            # recordings are synthesized and written a minute at a time
+KINDS = ("human", "voicemail", "beep", "noise")
+LABELS = {"human": "human", "voicemail": "machine", "beep": "machine", "noise": "unknown"}
+NOISE_LEVEL = 0.001                       # noise floor (about -60 dBFS), under the segmentation thresholds
+SPEECH_LEVEL = 0.4
+BEEP_FREQ = 1000.0
+BEEP_SEC = 0.5
+
+def make_layout(kind, duration, rng):
+    """
+    Events of one recording as (start, end, type, f0) tuples, type being speech or beep.
+
+    human: a short "hello" after the pickup, a pause, then back-and-forth conversation turns.
+    voicemail: a long greeting with short pauses between phrases, a beep, then silence.
+    beep: a beep right after the pickup. noise: only the noise floor.
+    """
+    events = []
+    if kind == "human":
+        start = rng.uniform(0.3, 1.0)
+        events.append((start, start + rng.uniform(0.5, 1.0), "speech", rng.uniform(110, 220)))
+        t = events[-1][1] + rng.uniform(1.5, 3.0)
+        while t < duration:
+            end = t + rng.uniform(0.8, 4.0)
+            events.append((t, end, "speech", rng.uniform(110, 220)))
+            t = end + rng.uniform(0.6, 3.0)
+    elif kind == "voicemail":
+        t = rng.uniform(0.3, 0.8)
+        greeting_end = min(duration - BEEP_SEC - 0.5, t + rng.uniform(6.0, 15.0))
+        f0 = rng.uniform(110, 220)
+        while t < greeting_end:
+            end = min(greeting_end, t + rng.uniform(1.0, 3.0))
+            events.append((t, end, "speech", f0))
+            t = end + rng.uniform(0.15, 0.35)
+        beep = greeting_end + rng.uniform(0.3, 0.6)
+        events.append((beep, beep + BEEP_SEC, "beep", BEEP_FREQ))
+    elif kind == "beep":
+        beep = rng.uniform(0.3, 1.0)
+        events.append((beep, beep + BEEP_SEC, "beep", BEEP_FREQ))
+    return [(s, min(e, duration), typ, f) for s, e, typ, f in events if s < duration]
+
+def speech_like(t, start, f0):
+    """Voiced, syllable-modulated harmonic signal over the absolute times t (seconds)."""
+    local = t - start
+    phase = 2 * np.pi * f0 * local + 3.0 * np.sin(2 * np.pi * 5.0 * local)   # slow pitch drift
+    voice = sum(np.sin(k * phase) / k for k in range(1, 6))
+    syllables = np.sin(np.pi * 4.0 * local) ** 2                                 # ~4 syllables per second
+    return SPEECH_LEVEL * 0.6 * voice * (0.25 + 0.75 * syllables)
+
+def synthesize(events, start_frame, frames, sr, rng):
+    """float32 samples of frames [start_frame, start_frame + frames) of a recording."""
+    t = (start_frame + np.arange(frames)) / sr
+    y = rng.normal(0.0, NOISE_LEVEL, frames)
+    t0, t1 = t[0] if frames else 0.0, (start_frame + frames) / sr
+    for start, end, typ, f in events:
+        if end <= t0 or start >= t1:
+            continue
+        i = max(0, int(np.ceil((start - t0) * sr)))
+        j = min(frames, int(np.ceil((end - t0) * sr)))
+        if typ == "speech":
+            y[i:j] += speech_like(t[i:j], start, f)
+        else:
+            y[i:j] += 0.5 * np.sin(2 * np.pi * f * (t[i:j] - start))
+    return np.clip(y, -1.0, 1.0).astype(np.float32)
+
+def write_recording(path, channel_events, duration, sr=SAMPLE_RATE, seed=0):
+    """Stream a 16-bit PCM WAV with one channel per event list, CHUNK_SEC at a time."""
+    channels = len(channel_events)
+    total = int(round(duration * sr))
+    data_size = total * channels * 2
+    rngs = [np.random.default_rng([seed, c]) for c in range(channels)]
+    tmp_path = path + ".part"
+    with open(tmp_path, "wb") as f:
+        f.write(wav_header(WAVE_FORMAT_PCM, channels, sr, 16, data_size))
+        chunk = CHUNK_SEC * sr
+        for start in range(0, total, chunk):
+            frames = min(chunk, total - start)
+            block = np.empty((frames, channels), dtype="<i2")
+            for c, events in enumerate(channel_events):
+                block[:, c] = np.round(synthesize(events, start, frames, sr, rngs[c]) * 32767).astype(np.int16)
+            block.tofile(f)
+    os.replace(tmp_path, path)
+
+def generate(name, kind, duration, output_dir=OUTPUT_DIR, stereo=True, seed=0, sr=SAMPLE_RATE):
+    """
+    Write <output_dir>/<name>.wav and return its layout. The callee is on the left channel;
+    in stereo files the right channel carries the outbound message played after the pickup.
+    """
+    rng = np.random.default_rng(seed)
+    events = make_layout(kind, duration, rng)
+    channel_events = [events]
+    if stereo:
+        start = rng.uniform(0.2, 0.5)
+        channel_events.append([(start, min(duration, start + rng.uniform(3.0, 6.0)), "speech", rng.uniform(110, 220))])
+    path = os.path.join(output_dir, f"{name}.wav")
+    write_recording(path, channel_events, duration, sr, seed)
+    return {
+        "recording": name,
+        "kind": kind,
+        "label": LABELS[kind],
+        "duration_sec": duration,
+        "channels": len(channel_events),
+        "speech": [[round(s, 4), round(e, 4)] for s, e, typ, _ in events if typ == "speech"],
+        "beeps": [[round(s, 4), round(e, 4)] for s, e, typ, _ in events if typ == "beep"],
+    }
+
+def parse_duration(spec):
+    """Seconds as a number or a min:max range to draw from."""
+    low, _, high = str(spec).partition(":")
+    return float(low), float(high or low)
+
+def generate_corpus(count, output_dir=OUTPUT_DIR, kinds=KINDS, duration="10:30", stereo=True, seed=0, prefix="synth"):
+    os.makedirs(output_dir, exist_ok=True)
+    low, high = parse_duration(duration)
+    rng = np.random.default_rng(seed)
+    layouts = []
+    for i in range(count):
+        kind = kinds[i % len(kinds)]
+        name = f"{prefix}_{kind}_{i:05d}"
+        layouts.append(generate(name, kind, float(rng.uniform(low, high)), output_dir, stereo, seed + i))
+    with open(os.path.join(output_dir, LAYOUT_FILE), "w") as f:
+        json.dump(layouts, f, indent=1)
+    return layouts
+
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic 8 kHz call recordings with a known speech/silence layout")
+    parser.add_argument("--count", required=False, type=int, default=20, help="Number of recordings")
+    parser.add_argument("--output_dir", required=False, default=OUTPUT_DIR, help="Where to write the WAVs and synthetic_layout.json")
+    parser.add_argument("--kinds", required=False, default=",".join(KINDS), help=f"Comma separated recording kinds, cycled ({', '.join(KINDS)})")
+    parser.add_argument("--duration", required=False, default="10:30", help="Seconds per recording, or a min:max range (3600 for hour-long calls)")
+    parser.add_argument("--mono", action="store_true", help="Write mono recordings instead of dual-channel calls")
+    parser.add_argument("--seed", required=False, type=int, default=0)
+    parser.add_argument("--ground_truth", required=False, default=None, help="Also write recording,label rows to this CSV")
+    args = parser.parse_args()
+
+    kinds = args.kinds.split(",")
+    unknown = [k for k in kinds if k not in KINDS]
+    if unknown:
+        raise SystemExit(f"Unknown kinds: {', '.join(unknown)}")
+    layouts = generate_corpus(args.count, args.output_dir, kinds, args.duration, not args.mono, args.seed)
+    total = sum(layout["duration_sec"] for layout in layouts)
+    print(f"Wrote {len(layouts)} recordings ({total / 60:.1f} minutes) to {args.output_dir}/")
+    if args.ground_truth:
+        with open(args.ground_truth, "w", newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(["recording", "label"])
+            for layout in layouts:
+                suffix = "_left" if layout["channels"] == 2 else ""
+                writer.writerow([layout["recording"] + suffix, layout["label"]])
+        print(f"Saved labels to {args.ground_truth}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import os
+import argparse
+
+# numpy, pandas and the modules using them are imported when training, so `--help` starts fast
+
+# --- Config ---
+FEATURES_CSV = "machine_features.csv"     # written by audio_feature_extractor.py
+FOLDS = 5
+
+def load_training_data(features_csv=FEATURES_CSV, features_dir=None, ground_truth=None):
+    """
+    Labelled feature rows: the audio_feature_extractor CSV when it exists, else the
+    feature_engine dataset. Labels only come from the ground truth file; recordings it does
+    not have are left out, so no row is trained on a made-up label (the legacy CSV's own
+    label column is "machine" for every row). features_dir and ground_truth default to
+    those of results_analytics.
+    """
+    import pandas as pd
+    from amd_classifier import FEATURES, LABELS
+    from results_analytics import GROUND_TRUTH_CSV, FEATURES_DIR, load_ground_truth
+
+    features_dir = features_dir or FEATURES_DIR
+    ground_truth = ground_truth or GROUND_TRUTH_CSV
+    truth = load_ground_truth(ground_truth)
+    if features_csv and os.path.exists(features_csv):
+        data = pd.read_csv(features_csv)
+    else:
+        from feature_engine import load_features
+        data = load_features(features_dir)
+    if data.empty:
+        raise SystemExit(f"No features found in {features_csv} or {features_dir}/")
+    recording = data["filename"].str.replace(r"\.wav$", "", case=False, regex=True)
+    data = data.assign(label=recording.map(truth))
+    labelled = data["label"].isin(LABELS)
+    if not labelled.all():
+        print(f"Leaving out {int((~labelled).sum())} recordings without a human/machine label in {ground_truth}")
+    data = data[labelled]
+    missing = [f for f in FEATURES if f not in data]
+    if missing:
+        raise SystemExit(f"Features missing from the dataset: {', '.join(missing)}")
+    return data
+
+def cross_validate(X, y, folds=FOLDS, l2=1.0, seed=0):
+    """Accuracy of each of `folds` held-out folds (stratified by label)."""
+    import numpy as np
+    from amd_classifier import FEATURES, train
+
+    rng = np.random.default_rng(seed)
+    fold_of = np.empty(len(y), dtype=int)
+    for label in (0, 1):
+        index = np.flatnonzero(y == label)
+        fold_of[rng.permutation(index)] = np.arange(len(index)) % folds
+    scores = []
+    for fold in range(folds):
+        test = fold_of == fold
+        if test.all() or not test.any() or len(np.unique(y[~test])) < 2:
+            continue
+        model = train(X[~test], y[~test], FEATURES, l2)
+        scores.append(float(((model.predict_proba(X[test]) >= 0.5) == y[test]).mean()))
+    return scores
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the NumPy human/machine classifier on labelled recording features")
+    parser.add_argument("--features", required=False, default=FEATURES_CSV, help="Feature CSV from audio_feature_extractor.py")
+    parser.add_argument("--features_dir", required=False, default=None, help="Parquet dataset from feature_engine.py, used when the CSV does not exist (default: features)")
+    parser.add_argument("--ground_truth", required=False, default=None, help="CSV with recording,label columns (default: ground_truth.csv)")
+    parser.add_argument("--l2", required=False, type=float, default=1.0, help="L2 regularization strength")
+    parser.add_argument("--out", required=False, default=None, help="Where to save the model (default: models/amd_classifier.npz)")
+    args = parser.parse_args()
+
+    import numpy as np
+    import pandas as pd
+    from amd_classifier import FEATURES, LABELS, MODEL_FILE, train
+
+    data = load_training_data(args.features, args.features_dir, args.ground_truth)
+    X = data[FEATURES].to_numpy(dtype=np.float64)
+    y = (data["label"] == LABELS[1]).to_numpy().astype(np.float64)
+    counts = data["label"].value_counts().to_dict()
+    print(f"Training on {len(data)} labelled recordings ({', '.join(f'{k}: {v}' for k, v in counts.items())})")
+    if len(np.unique(y)) < 2:
+        raise SystemExit("Both human and machine recordings are needed to train")
+
+    scores = cross_validate(X, y, min(FOLDS, int(min(y.sum(), len(y) - y.sum()))), args.l2)
+    if scores:
+        print(f"Cross-validated accuracy: {np.mean(scores):.3f} (+/- {np.std(scores):.3f} over {len(scores)} folds)")
+
+    model = train(X, y, FEATURES, args.l2)
+    predicted = model.predict(X)
+    print(pd.crosstab(data["label"].to_numpy(), predicted, rownames=["truth"], colnames=["predicted"]).to_string())
+    for name, weight in sorted(zip(model.features, model.weights), key=lambda item: -abs(item[1])):
+        print(f"  {name:22s} {weight:+.3f}")
+
+    # np.savez appends .npz to any other name
+    out = args.out or MODEL_FILE
+    out = out if out.endswith(".npz") else out + ".npz"
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    model.save(out)
+    print(f"Saved model to {out} ({os.path.getsize(out)} bytes)")
+
+if __name__ == "__main__":
+    main()
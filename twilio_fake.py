@@ -0,0 +1,267 @@
+import re
+import time
+import uuid
+import json
+import random
+import sqlite3
+import argparse
+import threading
+import concurrent.futures
+import numpy as np
+import requests
+from flask import Flask, request, jsonify
+from urllib.parse import urlparse, urlunparse, parse_qs, urlencode
+
+from recording_cache import csv_urls
+
+# --- Config ---
+ANSWERED_BY = ["human", "machine_start", "machine_end_beep", "machine_end_silence", "machine_end_other", "unknown"]
+PLAY_RE = re.compile(r"<Play>(.*?)</Play>", re.S)
+
+def new_sid(prefix="CA"):
+    return prefix + uuid.uuid4().hex
+
+def retarget(url, target):
+    """Send a callback URL configured for the public (ngrok) domain to the local server instead."""
+    parts = urlparse(url)
+    base = urlparse(target)
+    return urlunparse(parts._replace(scheme=base.scheme, netloc=base.netloc))
+
+class LoadStats:
+    """Webhook latencies, errors and call_sid -> audio mapping checks, shared by all call threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}      # event name -> list of seconds
+        self.errors = 0
+        self.mapping_ok = 0
+        self.mapping_bad = []
+        self.calls = 0
+        self.started = time.perf_counter()
+
+    def record(self, event, latency, ok):
+        with self.lock:
+            self.latencies.setdefault(event, []).append(latency)
+            if not ok:
+                self.errors += 1
+
+    def record_mapping(self, call_sid, expected, served):
+        with self.lock:
+            self.calls += 1
+            if expected == served:
+                self.mapping_ok += 1
+            else:
+                self.mapping_bad.append((call_sid, expected, served))
+
+    def report(self):
+        with self.lock:
+            elapsed = time.perf_counter() - self.started
+            all_latencies = np.concatenate([np.asarray(v) for v in self.latencies.values()]) if self.latencies else np.zeros(0)
+            summary = {
+                "calls": self.calls,
+                "webhooks": int(all_latencies.size),
+                "elapsed_sec": round(elapsed, 3),
+                "throughput_per_sec": round(all_latencies.size / elapsed, 2) if elapsed else 0.0,
+                "errors": self.errors,
+                "mapping_ok": self.mapping_ok,
+                "mapping_bad": len(self.mapping_bad),
+                "latency_ms": {},
+            }
+            for event, values in sorted(self.latencies.items()) + [("all", all_latencies)]:
+                values = np.asarray(values) * 1000
+                if values.size:
+                    summary["latency_ms"][event] = {
+                        "count": int(values.size),
+                        "p50": round(float(np.percentile(values, 50)), 2),
+                        "p99": round(float(np.percentile(values, 99)), 2),
+                        "max": round(float(values.max()), 2),
+                    }
+            return summary
+
+class CallSimulator:
+    """
+    Plays the Twilio side of a test call against server.py: the inbound leg fetches
+    /incoming-call, then the outbound leg sends its status and AMD callbacks with
+    configurable jitter, out-of-order delivery and duplicates.
+
+    Like real Twilio, the inbound leg carries no audio parameter unless inbound_audio is set,
+    so the mapping check measures how the server matches inbound legs to their calls.
+    """
+
+    def __init__(self, target, jitter=0.05, reorder=0.0, duplicate=0.0, inbound_audio=False,
+                 concurrency=32, seed=None):
+        self.target = target.rstrip("/")
+        self.jitter = jitter
+        self.reorder = reorder
+        self.duplicate = duplicate
+        self.inbound_audio = inbound_audio
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=concurrency)
+        self.stats = LoadStats()
+        self.futures = []
+
+    def submit(self, call_sid, audio_url, status_callback=None, amd_callback=None):
+        status_callback = retarget(status_callback, self.target) if status_callback else f"{self.target}/webhook?{urlencode({'audio': audio_url})}"
+        amd_callback = retarget(amd_callback, self.target) if amd_callback else status_callback
+        future = self.executor.submit(self._run_call, call_sid, audio_url, status_callback, amd_callback)
+        self.futures.append(future)
+        return future
+
+    def wait(self):
+        for future in concurrent.futures.as_completed(self.futures):
+            future.result()
+
+    def _uniform(self, low, high):
+        with self.random_lock:
+            return self.random.uniform(low, high)
+
+    def _chance(self, p):
+        with self.random_lock:
+            return self.random.random() < p
+
+    def _post(self, event, url, data):
+        start = time.perf_counter()
+        try:
+            resp = self.session.post(url, data=data, timeout=30)
+            ok = resp.ok
+            body = resp.text
+        except requests.RequestException:
+            ok, body = False, ""
+        self.stats.record(event, time.perf_counter() - start, ok)
+        return body
+
+    def _events(self, call_sid):
+        with self.random_lock:
+            answered_by = self.random.choice(ANSWERED_BY)
+        progress = {"CallSid": call_sid, "CallbackSource": "call-progress-events"}
+        events = [
+            ("initiated", {**progress, "CallStatus": "initiated", "SequenceNumber": "0"}),
+            ("ringing", {**progress, "CallStatus": "ringing", "SequenceNumber": "1"}),
+            ("answered", {**progress, "CallStatus": "in-progress", "SequenceNumber": "2"}),
+            ("amd", {"CallSid": call_sid, "AnsweredBy": answered_by, "MachineDetectionDuration": "2400"}),
+            ("completed", {**progress, "CallStatus": "completed", "SequenceNumber": "3"}),
+        ]
+        # Out-of-order delivery: swap neighbouring callbacks
+        for i in range(len(events) - 1):
+            if self._chance(self.reorder):
+                events[i], events[i + 1] = events[i + 1], events[i]
+        # Duplicate delivery: resend a callback right after the original
+        delivered = []
+        for event in events:
+            delivered.append(event)
+            if self._chance(self.duplicate):
+                delivered.append(event)
+        return delivered
+
+    def _run_call(self, call_sid, audio_url, status_callback, amd_callback):
+        incoming_url = f"{self.target}/incoming-call"
+        if self.inbound_audio:
+            incoming_url += "?" + urlencode({"audio": audio_url})
+        answered = False
+        for name, data in self._events(call_sid):
+            time.sleep(self._uniform(0, self.jitter))
+            if name == "answered" and not answered:
+                answered = True
+                # The inbound leg is a separate call with its own sid
+                twiml = self._post("incoming-call", incoming_url, {"CallSid": new_sid()})
+                match = PLAY_RE.search(twiml)
+                self.stats.record_mapping(call_sid, audio_url, match.group(1).strip() if match else "")
+            url = amd_callback if name == "amd" else status_callback
+            data = {**data, "Timestamp": time.strftime('%a, %d %b %Y %H:%M:%S +0000', time.gmtime())}
+            self._post(name, url, data)
+
+def check_event_log(db_path, expected):
+    """Compare the audio_url logged for every webhook event with the audio each call was given."""
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute(
+            "SELECT call_sid, audio_url FROM call_events WHERE callback_source IS NULL OR callback_source != 'inbound'"
+        ).fetchall()
+    finally:
+        conn.close()
+    bad = [(sid, url) for sid, url in rows if sid in expected and url != expected[sid]]
+    return {"logged_events": sum(1 for sid, _ in rows if sid in expected), "logged_mismatches": len(bad)}
+
+# --- Fake REST API ---
+def create_fake_api(simulator, expected, expected_lock):
+    app = Flask(__name__)
+
+    @app.route("/2010-04-01/Accounts/<account_sid>/Calls.json", methods=["POST"])
+    def create_call(account_sid):
+        call_sid = new_sid()
+        status_callback = request.form.get("StatusCallback")
+        amd_callback = request.form.get("AsyncAmdStatusCallback") or status_callback
+        audio_url = parse_qs(urlparse(status_callback or "").query).get("audio", [""])[0]
+        with expected_lock:
+            expected[call_sid] = audio_url
+        simulator.submit(call_sid, audio_url, status_callback, amd_callback)
+        return jsonify({
+            "sid": call_sid,
+            "account_sid": account_sid,
+            "to": request.form.get("To"),
+            "from": request.form.get("From"),
+            "status": "queued",
+            "uri": f"/2010-04-01/Accounts/{account_sid}/Calls/{call_sid}.json",
+        }), 201
+
+    @app.route("/stats", methods=["GET"])
+    def stats():
+        return jsonify(simulator.stats.report())
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Twilio stand-in and webhook load test for server.py")
+    parser.add_argument("mode", choices=["serve", "loadtest"], help="serve: fake REST API driven by the server's orchestrator; loadtest: generate calls directly")
+    parser.add_argument("--target", required=False, default="http://localhost:5000", help="Base URL of server.py")
+    parser.add_argument("--port", required=False, type=int, default=5005, help="Port of the fake REST API (serve mode)")
+    parser.add_argument("--calls", required=False, type=int, default=200, help="Number of calls to generate (loadtest mode)")
+    parser.add_argument("--cps", required=False, type=float, default=0, help="Calls started per second, 0 for as fast as possible (loadtest mode)")
+    parser.add_argument("--concurrency", required=False, type=int, default=32, help="Calls simulated at the same time")
+    parser.add_argument("--jitter", required=False, type=float, default=0.05, help="Maximum random delay before each callback, in seconds")
+    parser.add_argument("--reorder", required=False, type=float, default=0.0, help="Probability of swapping two neighbouring callbacks")
+    parser.add_argument("--duplicate", required=False, type=float, default=0.0, help="Probability of delivering a callback twice")
+    parser.add_argument("--inbound_audio", action="store_true", help="Pass the audio on /incoming-call, which real Twilio never does (start the server with --tagged_inbound)")
+    parser.add_argument("--audio_csv", required=False, default="recording_urls.csv", help="Recordings assigned to generated calls (loadtest mode)")
+    parser.add_argument("--events_db", required=False, default=None, help="Also check the call_sid -> audio mapping logged in this event database")
+    parser.add_argument("--seed", required=False, type=int, default=None)
+    args = parser.parse_args()
+
+    simulator = CallSimulator(
+        args.target, jitter=args.jitter, reorder=args.reorder, duplicate=args.duplicate,
+        inbound_audio=args.inbound_audio, concurrency=args.concurrency, seed=args.seed
+    )
+    expected = {}
+    expected_lock = threading.Lock()
+
+    if args.mode == "serve":
+        print(f"Fake Twilio REST API on port {args.port}, driving callbacks to {args.target}")
+        print(f"Start the server with TWILIO_API_BASE=http://localhost:{args.port}; GET /stats for the running report")
+        try:
+            create_fake_api(simulator, expected, expected_lock).run(host="0.0.0.0", port=args.port, threaded=True)
+        finally:
+            simulator.wait()
+    else:
+        audio_urls = csv_urls(args.audio_csv)
+        if not audio_urls:
+            raise SystemExit(f"No Audio URLs in {args.audio_csv}")
+        for i in range(args.calls):
+            call_sid = new_sid()
+            expected[call_sid] = audio_urls[i % len(audio_urls)]
+            simulator.submit(call_sid, expected[call_sid])
+            if args.cps:
+                time.sleep(1 / args.cps)
+        simulator.wait()
+
+    summary = simulator.stats.report()
+    if args.events_db:
+        summary.update(check_event_log(args.events_db, expected))
+    print(json.dumps(summary, indent=2))
+
+if __name__ == "__main__":
+    main()
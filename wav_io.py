@@ -0,0 +1,268 @@
+import struct
+import numpy as np
+
+# --- WAV format tags ---
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_MULAW = 0x0007
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+class WavInfo:
+    """Layout of a RIFF/WAVE file: format of the samples and position of the data chunk."""
+
+    def __init__(self, format_tag, channels, sample_rate, bits_per_sample, data_offset, data_size):
+        self.format_tag = format_tag
+        self.channels = channels
+        self.sample_rate = sample_rate
+        self.bits_per_sample = bits_per_sample
+        self.data_offset = data_offset
+        self.data_size = data_size
+
+    @property
+    def sample_width(self):
+        return self.bits_per_sample // 8
+
+    @property
+    def block_align(self):
+        return self.channels * self.sample_width
+
+    @property
+    def frames(self):
+        return self.data_size // self.block_align
+
+    @property
+    def duration(self):
+        return self.frames / self.sample_rate
+
+    def __repr__(self):
+        return (f"WavInfo(format_tag={self.format_tag}, channels={self.channels}, sample_rate={self.sample_rate}, "
+                f"bits_per_sample={self.bits_per_sample}, frames={self.frames})")
+
+def read_wav_info(path):
+    """Parse the RIFF chunks of a WAV file without reading the audio data."""
+    with open(path, "rb") as f:
+        riff, _, wave = struct.unpack("<4sI4s", f.read(12))
+        if riff not in (b"RIFF", b"RF64") or wave != b"WAVE":
+            raise ValueError(f"{path} is not a RIFF/WAVE file")
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError(f"{path} has no data chunk")
+            chunk_id, chunk_size = struct.unpack("<4sI", header)
+            if chunk_id == b"fmt ":
+                body = f.read(chunk_size)
+                format_tag, channels, sample_rate, _, _, bits = struct.unpack("<HHIIHH", body[:16])
+                if format_tag == WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                    # The real format is in the first two bytes of the SubFormat GUID
+                    format_tag = struct.unpack("<H", body[24:26])[0]
+                fmt = (format_tag, channels, sample_rate, bits)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    raise ValueError(f"{path} has a data chunk before its fmt chunk")
+                data_offset = f.tell()
+                # Files that were still being written can report a larger size than they have
+                file_size = f.seek(0, 2)
+                data_size = min(chunk_size, file_size - data_offset)
+                return WavInfo(*fmt, data_offset=data_offset, data_size=data_size)
+            else:
+                f.seek(chunk_size, 1)
+            if chunk_size % 2:
+                f.seek(1, 1)
+
+def map_frames(path, info=None):
+    """
+    Memory-map the data chunk as a (frames, channels, sample_width) uint8 array.
+
+    Indexing a channel gives a strided view of its raw sample bytes, whatever the
+    sample format (including 24-bit PCM), without reading or copying the file.
+    """
+    info = info or read_wav_info(path)
+    if info.frames == 0:
+        return info, np.zeros((0, info.channels, info.sample_width), dtype=np.uint8)
+    raw = np.memmap(path, dtype=np.uint8, mode="r", offset=info.data_offset, shape=(info.frames * info.block_align,))
+    return info, raw.reshape(info.frames, info.channels, info.sample_width)
+
+def wav_header(format_tag, channels, sample_rate, bits_per_sample, data_size):
+    """Canonical WAV header: 44 bytes for PCM, plus a fact chunk for the other formats."""
+    block_align = channels * bits_per_sample // 8
+    fmt = struct.pack("<HHIIHH", format_tag, channels, sample_rate, sample_rate * block_align, block_align, bits_per_sample)
+    chunks = b"fmt " + struct.pack("<I", len(fmt)) + fmt
+    if format_tag != WAVE_FORMAT_PCM:
+        chunks += b"fact" + struct.pack("<II", 4, data_size // block_align)
+    padding = data_size % 2
+    return b"RIFF" + struct.pack("<I", 4 + len(chunks) + 8 + data_size + padding) + b"WAVE" + chunks + b"data" + struct.pack("<I", data_size)
+
+def write_wav_stream(f, samples, format_tag, sample_rate, bits_per_sample, chunk_frames=1 << 18):
+    """
+    Write a mono WAV from an array of raw samples, chunk by chunk.
+
+    samples is either a 1-D typed array or a (frames, sample_width) uint8 view such as
+    a channel of map_frames(); only one chunk is made contiguous in memory at a time.
+    """
+    width = bits_per_sample // 8
+    frames = len(samples)
+    data_size = frames * width
+    header = wav_header(format_tag, 1, sample_rate, bits_per_sample, data_size)
+    f.write(header)
+    for start in range(0, frames, chunk_frames):
+        np.ascontiguousarray(samples[start:start + chunk_frames]).tofile(f)
+    if data_size % 2:
+        f.write(b"\x00")
+    return len(header) + data_size + data_size % 2
+
+# --- G.711 mu-law ---
+def _ulaw_decode_table():
+    u = ~np.arange(256, dtype=np.int32) & 0xFF
+    exponent = (u >> 4) & 0x07
+    mantissa = u & 0x0F
+    magnitude = (((mantissa << 3) + 0x84) << exponent) - 0x84
+    return np.where(u & 0x80, -magnitude, magnitude).astype(np.float32) / 32768
+
+ULAW_TABLE = _ulaw_decode_table()
+
+def ulaw_decode(data):
+    """mu-law bytes (or uint8 array) to float32 samples in [-1, 1]."""
+    return ULAW_TABLE[np.frombuffer(data, dtype=np.uint8) if isinstance(data, (bytes, bytearray)) else data]
+
+def ulaw_encode(y):
+    """float32 samples in [-1, 1] to mu-law uint8 (G.711, 14-bit reference algorithm)."""
+    x = np.clip(np.asarray(y, dtype=np.float32) * 32768, -32768, 32767).astype(np.int32) >> 2
+    negative = x < 0
+    magnitude = np.minimum(np.where(negative, -x, x), 8159) + 0x21
+    segment = np.maximum(np.floor(np.log2(magnitude)).astype(np.int32) - 5, 0)
+    value = np.where(segment > 7, 0x7F, (segment << 4) | ((magnitude >> (segment + 1)) & 0x0F))
+    return (value ^ np.where(negative, 0x7F, 0xFF)).astype(np.uint8)
+
+# --- Shared loader ---
+CHUNK_FRAMES = 1 << 20        # frames converted to float32 at a time
+
+# Formats whose samples numpy can view in place, by (format tag, bits per sample)
+VIEW_DTYPES = {
+    (WAVE_FORMAT_PCM, 8): np.dtype(np.uint8),
+    (WAVE_FORMAT_PCM, 16): np.dtype("<i2"),
+    (WAVE_FORMAT_PCM, 32): np.dtype("<i4"),
+    (WAVE_FORMAT_IEEE_FLOAT, 32): np.dtype("<f4"),
+    (WAVE_FORMAT_IEEE_FLOAT, 64): np.dtype("<f8"),
+    (WAVE_FORMAT_MULAW, 8): np.dtype(np.uint8),
+}
+
+def sample_scale(y):
+    """Factor turning the samples of y into [-1, 1] amplitudes: 1/32768 for int16, 1 for floats."""
+    if y.dtype.kind == "i":
+        return 1.0 / (1 << (8 * y.dtype.itemsize - 1))
+    return 1.0
+
+class WavReader:
+    """
+    Memory-mapped WAV for the analysis scripts.
+
+    Channels are exposed as typed views of the mapped file, float32 conversion happens chunk
+    by chunk as the samples are read, and peak/RMS come from a chunked pass, so a recording is
+    never copied whole just to be normalized.
+    """
+
+    def __init__(self, path, info=None):
+        self.path = path
+        self.info, self.raw = map_frames(path, info)
+
+    @property
+    def sample_rate(self):
+        return self.info.sample_rate
+
+    @property
+    def channels(self):
+        return self.info.channels
+
+    @property
+    def frames(self):
+        return self.info.frames
+
+    @property
+    def duration(self):
+        return self.info.duration
+
+    def view(self, channel=0):
+        """Samples of one channel as a strided view of the file, or None for formats numpy cannot view (24-bit PCM)."""
+        dtype = VIEW_DTYPES.get((self.info.format_tag, self.info.bits_per_sample))
+        if dtype is None:
+            return None
+        return self.raw[:, channel, :].view(dtype)[:, 0]
+
+    def _decode(self, raw):
+        """(n, sample_width) raw bytes of one channel to float32 in [-1, 1]."""
+        tag, bits = self.info.format_tag, self.info.bits_per_sample
+        if (tag, bits) == (WAVE_FORMAT_MULAW, 8):
+            return ULAW_TABLE[raw[:, 0]]
+        if (tag, bits) == (WAVE_FORMAT_PCM, 8):
+            return (raw[:, 0].astype(np.float32) - 128) / 128
+        if (tag, bits) == (WAVE_FORMAT_PCM, 24):
+            x = raw[:, 0].astype(np.int32) | (raw[:, 1].astype(np.int32) << 8) | (raw[:, 2].astype(np.int32) << 16)
+            return ((x ^ 0x800000) - 0x800000).astype(np.float32) / (1 << 23)
+        if (tag, bits) not in VIEW_DTYPES:
+            raise ValueError(f"{self.path}: unsupported WAV format {tag} with {bits} bits per sample")
+        y = raw.view(VIEW_DTYPES[(tag, bits)])[:, 0]
+        return y.astype(np.float32) * np.float32(sample_scale(y))
+
+    def chunks(self, channel=None, chunk_frames=CHUNK_FRAMES):
+        """float32 blocks of one channel, or of the mean of all the channels when channel is None."""
+        for start in range(0, self.frames, chunk_frames):
+            yield self.read(start, chunk_frames, channel)
+
+    def read(self, start, frames, channel=None):
+        """float32 samples [start, start + frames) of one channel, or of the mix when channel is None."""
+        block = self.raw[max(0, start):max(0, start + frames)]
+        if channel is None and self.channels > 1:
+            mix = self._decode(block[:, 0])
+            for c in range(1, self.channels):
+                mix += self._decode(block[:, c])
+            return mix / np.float32(self.channels)
+        return self._decode(block[:, channel or 0])
+
+    def float32(self, channel=None):
+        """The whole channel (or the mix) as one float32 array, filled chunk by chunk."""
+        out = np.empty(self.frames, dtype=np.float32)
+        start = 0
+        for chunk in self.chunks(channel):
+            out[start:start + len(chunk)] = chunk
+            start += len(chunk)
+        return out
+
+    def samples(self, channel=None):
+        """
+        Mono samples for the analysis functions: a view of the file when it is mono (or a
+        channel is given) 16/32-bit PCM or float, otherwise float32 converted chunk by chunk.
+        Integer views are in file units; sample_scale() gives the factor to [-1, 1].
+        """
+        if channel is None and self.channels == 1:
+            channel = 0
+        if channel is not None:
+            y = self.view(channel)
+            if y is not None and y.dtype.kind in "if":
+                return y
+        return self.float32(channel)
+
+    def stats(self, channel=None):
+        """Peak, mean absolute amplitude, RMS and zero-crossing rate in [-1, 1] units, in one chunked pass."""
+        peak = abs_sum = square_sum = 0.0
+        crossings = 0
+        previous = None
+        for chunk in self.chunks(channel):
+            if not len(chunk):
+                continue
+            magnitude = np.abs(chunk)
+            peak = max(peak, float(magnitude.max()))
+            abs_sum += float(magnitude.sum(dtype=np.float64))
+            square_sum += float(np.dot(chunk, chunk))
+            negative = np.signbit(chunk)
+            crossings += int(np.count_nonzero(negative[1:] != negative[:-1]))
+            if previous is not None and previous != negative[0]:
+                crossings += 1
+            previous = negative[-1]
+        n = self.frames
+        return {
+            "peak": peak,
+            "mean_abs": abs_sum / n if n else 0.0,
+            "rms": float(np.sqrt(square_sum / n)) if n else 0.0,
+            "zcr": crossings / (n - 1) if n > 1 else 0.0,
+        }
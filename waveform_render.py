@@ -0,0 +1,126 @@
+import os
+import concurrent.futures
+import numpy as np
+
+import segmentation
+from wav_io import sample_scale
+
+# --- Config ---
+DPI = 100
+COLUMNS_PER_PIXEL = 2     # envelope resolution relative to the width of the axes
+
+def minmax_envelope(y, sr, n_columns):
+    """
+    Reduce y to the min and max of n_columns equal slices, interleaved as a (t, v) polyline.
+
+    Drawn as a line, the envelope paints the same vertical strokes as plotting every
+    sample, with 2 * n_columns points instead of len(y). Integer views of a WAV file are
+    drawn in [-1, 1] units; only the envelope is scaled, not y.
+    """
+    scale = sample_scale(y)
+    if len(y) <= 2 * n_columns:
+        return np.arange(len(y)) / sr, np.asarray(y, dtype=np.float32) * np.float32(scale)
+    column = -(-len(y) // n_columns)
+    frames = segmentation.frame_view(y, column)
+    mins = frames.min(axis=1)
+    maxs = frames.max(axis=1)
+    tail = y[len(frames) * column:]
+    if len(tail):
+        mins = np.append(mins, tail.min())
+        maxs = np.append(maxs, tail.max())
+    starts = np.arange(len(mins)) * column / sr
+    t = np.repeat(starts, 2)
+    v = np.empty(2 * len(mins), dtype=np.float32)
+    v[0::2] = mins
+    v[1::2] = maxs
+    if scale != 1.0:
+        v *= np.float32(scale)
+    return t, v
+
+class WaveformRenderer:
+    """
+    One Agg figure reused for every PNG of the same size, instead of a new pyplot figure each time.
+
+    The figure size, axes and labels never change, so the tight layout is computed once here
+    (on [-1, 1] amplitudes and a 10-minute time axis) instead of on every render.
+    """
+
+    def __init__(self, figsize, dpi=DPI):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        self.figure = Figure(figsize=figsize, dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.ax = self.figure.add_subplot()
+        self.line, = self.ax.plot([], [], color="gray", linewidth=0.8)
+        self.spans = []
+        self.ax.set(xlim=(0, 600), ylim=(-1, 1), xlabel="Time (seconds)", ylabel="Amplitude", title="Waveform")
+        self.figure.tight_layout()
+        # Since matplotlib 3.6 tight_layout() leaves a placeholder layout engine, which makes every
+        # savefig() draw the figure twice; the subplot parameters it set are kept without it
+        if hasattr(self.figure, "set_layout_engine"):
+            self.figure.set_layout_engine(None)
+        self.ax.set_autoscale_on(True)
+        self.columns = int(self.ax.get_position().width * figsize[0] * dpi * COLUMNS_PER_PIXEL)
+
+    def render(self, y, sr, output_path, title, spans=(), xlabel="Time (seconds)", ylabel="Amplitude"):
+        for artist in self.spans:
+            artist.remove()
+        self.spans = [self.ax.axvspan(**span) for span in spans]
+
+        t, v = minmax_envelope(y, sr, self.columns)
+        self.line.set_data(t, v)
+        self.ax.relim()
+        self.ax.autoscale_view()
+        self.ax.set_xlabel(xlabel)
+        self.ax.set_ylabel(ylabel)
+        self.ax.set_title(title)
+        legend = self.ax.get_legend()
+        if legend:
+            legend.remove()
+        if any(span.get("label") for span in spans):
+            self.ax.legend(loc="upper right")
+        self.figure.savefig(output_path)
+
+def analysis_spans(segments):
+    """axvspan arguments for the AMD regions returned by segmentation.describe()."""
+    t0, t1 = segments["initial_silence"]
+    t4, t5 = segments["final_silence"]
+    spans = [
+        dict(xmin=t0, xmax=t1, color='green', alpha=0.2, label='Initial Silence'),
+        dict(xmin=t1, xmax=t4, color='orange', alpha=0.15, label='Utterance'),
+    ]
+    for idx, (gap_start, gap_end) in enumerate(segments["silence_gaps"]):
+        spans.append(dict(xmin=gap_start, xmax=gap_end, color='blue', alpha=0.2, label='Silence Gap' if idx == 0 else ""))
+    spans.append(dict(xmin=t4, xmax=t5, color='blue', alpha=0.1, label='Final Silence'))
+    return spans
+
+_renderers = {}
+
+def get_renderer(figsize):
+    """Renderer cached per process and figure size."""
+    figsize = tuple(figsize)
+    if figsize not in _renderers:
+        _renderers[figsize] = WaveformRenderer(figsize)
+    return _renderers[figsize]
+
+def render_waveform(y, sr, output_path, title, figsize=(14, 4), spans=(), max_duration=None):
+    if max_duration:
+        y = y[:int(min(len(y), sr * max_duration))]
+    get_renderer(figsize).render(y, sr, output_path, title, spans)
+
+def _call(job):
+    func, args = job
+    try:
+        return func(*args)
+    except Exception as e:
+        print(f"[ERROR] {func.__name__}{args}: {e}")
+
+def run_parallel(func, arg_tuples, workers=None):
+    """Run func(*args) for every tuple on a process pool; each worker keeps its own renderers."""
+    jobs = [(func, tuple(args)) for args in arg_tuples]
+    if workers == 1 or len(jobs) <= 1:
+        return [_call(job) for job in jobs]
+    workers = workers or os.cpu_count()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_call, jobs, chunksize=max(1, len(jobs) // (workers * 4))))